@@ -2,20 +2,37 @@ import uuid
 from coinbase.rest import RESTClient
 from coinbase.rest.types.orders_types import Order, CreateOrderResponse
 from coinbase.rest.types.product_types import GetProductResponse
-from typing import Tuple, List, Union
+from typing import Optional, Tuple, List, Union
 import datetime
 import asyncio
 import logging
 
 from autotrade.settings.secrets import get_api_key, get_secret_key
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL, get_coinbase_api_base_url
+from autotrade.broker.rest_client import AsyncRESTClient
 from autotrade.types.broker_error import BrokerError, existing_order_error, insufficient_funds_error, insufficient_product_error, request_error
+from autotrade.utils.clock import Clock, Timer, wall_clock
 
 class APIBroker():
     
-    def __init__(self, product: str):
+    def __init__(self, product: str, clock: Clock = wall_clock, poll_interval: float = 1.0, client: Optional[RESTClient] = None, pool_size: int = 4, request_timeout: float = 10.0):
+        """
+        The active order is polled every poll_interval seconds while there is one, and checked
+        straight away when it is placed and when its good till date runs out. With no order
+        open nothing runs.
+
+        Requests go through an AsyncRESTClient, so placing, checking and cancelling orders never
+        blocks the event loop. client defaults to a RESTClient for the configured API.
+        """
         self.product = product
-        self.client = RESTClient(get_api_key(), get_secret_key(), base_url=get_coinbase_api_base_url())
+        self.clock = clock
+        self.poll_interval = poll_interval
+        # set once start() runs
+        self.order_changed: Optional[asyncio.Event] = None
+        self.timeout_timer: Optional[Timer] = None
+        self.client = client or RESTClient(get_api_key(), get_secret_key(), base_url=get_coinbase_api_base_url())
+        self.rest = AsyncRESTClient(self.client, pool_size, request_timeout)
+        self.order_lock = asyncio.Lock()
         self.account_id = None
         self.balance = 0.0
         self.cash_account_id = None
@@ -27,36 +44,58 @@ class APIBroker():
         await self._order_check_loop()
 
     async def _order_check_loop(self):
+        self.order_changed = asyncio.Event()
         while True:
             if self.active_order:
-                self.check_current_order()
-            asyncio.sleep(1)
+                try:
+                    await asyncio.wait_for(self.order_changed.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self.order_changed.wait()
+            self.order_changed.clear()
 
-    def get_product_details(self) -> GetProductResponse:
-        resp = self.client.get_product(self.product)
-
-        return resp
-
-    def check_current_order(self):
-                order, err = self.get_order(self.active_order)
+            if self.active_order:
+                await self.check_current_order()
+
+    def _wake(self):
+        if self.order_changed is not None:
+            self.order_changed.set()
+
+    def _set_active_order(self, order_id: Union[str, None], expires_at: Optional[datetime.datetime] = None):
+        if self.timeout_timer is not None:
+            self.timeout_timer.cancel()
+            self.timeout_timer = None
+        self.active_order = order_id
+        if order_id and expires_at:
+            # the exchange cancels the order at its end time, look at it then rather than up to a poll later
+            self.timeout_timer = self.clock.call_at(expires_at, self._wake)
+        self._wake()
+
+    async def get_product_details(self) -> Tuple[Union[GetProductResponse,None], Union[BrokerError,None]]:
+        return await self.rest.request("get_product", self.product)
+
+    async def check_current_order(self):
+                order, err = await self.get_order(self.active_order)
                 if err:
                     return
                 if not order:
                     return
                 if order.status == 'FILLED':
                     logging.info(f"Order {self.active_order} is {order.status} side:{order.side} size:{order.filled_size} price:{order.average_filled_price}")
-                    self.active_order = None
-                    self.update_balances()
+                    self._set_active_order(None)
+                    await self.update_balances()
                     return
                 if order.status == 'CANCELED':
                     logging.info(f"Order {self.active_order} is {order.status} side:{order.side}")
-                    self.active_order = None
-                    self.update_balances()
+                    self._set_active_order(None)
+                    await self.update_balances()
                     return
                 
                 logging.info(f"Order {self.active_order} is {order.status} side:{order.side}")
                 
     def init_accounts(self):
+        # runs once at start up, before the event loop has anything else to do
         resp = self.client.get_accounts(limit=100)
         for account in resp.accounts:
             if account.currency == self.product.split('-')[0]:
@@ -71,119 +110,134 @@ class APIBroker():
         if not self.cash_account_id:
             raise Exception(f"Failed to find account for {self.product.split('-')[1]}")
 
-    def get_balance(self, account_id: str)-> Tuple[Union[float,None], Union[BrokerError,None]]:
-        resp = self.client.get_account(account_id)
+    async def get_balance(self, account_id: str)-> Tuple[Union[float,None], Union[BrokerError,None]]:
+        resp, err = await self.rest.request("get_account", account_id)
+        if err:
+            return None, err
 
-        if resp.account:
-            return float(resp.account.available_balance.value), None
+        if getattr(resp, "account", None):
+            return float(resp.account.available_balance.get('value')), None
         
         return None, request_error(f"Failed to get balance for account {account_id}")
 
-    def update_balances(self) -> Union[str,None]: 
-        balance, err = self.get_balance(self.account_id)
+    async def update_balances(self) -> Union[BrokerError,None]: 
+        # both accounts are fetched at once
+        (balance, err), (cash_balance, cash_err) = await asyncio.gather(self.get_balance(self.account_id), self.get_balance(self.cash_account_id))
         if err:
             return err
+        if cash_err:
+            return cash_err
         self.balance = balance
-
-        cash_balance, err = self.get_balance(self.cash_account_id)
-        if err:
-            return err
         self.cash_balance = cash_balance
 
-    def create_market_order(self, volume: str, cost: str) -> Tuple[Union[str,None], Union[str,None], Union[BrokerError,None]]:
-        side = None
-
-        if self.active_order:
-            return None, None, existing_order_error(self.active_order)
-        
-        if float(volume) > 0:
-            side = ORDER_BUY
-        else:
-            side = ORDER_SELL   
-
-        resp: CreateOrderResponse = None
-        client_order_id=uuid.uuid4().hex
-
-        if side == ORDER_BUY:
-            if float(cost) > self.cash_balance:
-                return None, None, insufficient_funds_error(self.product, volume, cost)
-            resp = self.client.market_order(client_order_id=client_order_id, product_id=self.product, side=side, quote_size=cost)
-        else:
-            if float(volume) > self.balance:
-                return None, None, insufficient_product_error(self.product, volume)
-            resp = self.client.market_order(client_order_id=client_order_id, product_id=self.product, side=side, base_size=volume)
-
-        if resp.success:
-            self.active_order = resp.success_response.get('order_id')
-            return client_order_id, self.active_order, None
-        
-        if resp.failure_reason:
-            return None, None, request_error( f"Failed to create order: {resp.failure_reason}")
-        
-        if resp.error_response:
-            return None, None, request_error(f"Error creating order: {resp.error_response.error} {resp.error_response.error_details}")
-
+    async def create_market_order(self, volume: str, cost: str) -> Tuple[Union[str,None], Union[str,None], Union[BrokerError,None]]:
+        async with self.order_lock:
+            side = None
 
-    def create_limit_order(self, volume: str, limit_price: str, timeout_sec: int) -> Tuple[Union[str,None], Union[str,None], Union[BrokerError,None]]:
-        side = None
+            if self.active_order:
+                return None, None, existing_order_error(self.active_order)
+            
+            if float(volume) > 0:
+                side = ORDER_BUY
+            else:
+                side = ORDER_SELL   
+
+            resp: CreateOrderResponse = None
+            client_order_id=uuid.uuid4().hex
+
+            if side == ORDER_BUY:
+                if float(cost) > self.cash_balance:
+                    return None, None, insufficient_funds_error(self.product, volume, cost, self.cash_balance)
+                resp, err = await self.rest.request("market_order", client_order_id=client_order_id, product_id=self.product, side=side, quote_size=cost)
+            else:
+                if float(volume) > self.balance:
+                    return None, None, insufficient_product_error(self.product, volume, self.balance)
+                resp, err = await self.rest.request("market_order", client_order_id=client_order_id, product_id=self.product, side=side, base_size=volume)
+
+            if err:
+                return None, None, err
+
+            return self._handle_create_response(client_order_id, resp)
+
+    async def create_limit_order(self, volume: str, limit_price: str, timeout_sec: int) -> Tuple[Union[str,None], Union[str,None], Union[BrokerError,None]]:
+        async with self.order_lock:
+            side = None
 
-        if self.active_order:
-            return None, None, existing_order_error(self.active_order)
-        
-        if float(volume) > 0:
-            side = ORDER_BUY
-        else:
-            side = ORDER_SELL
-
-        client_order_id = uuid.uuid4().hex
-        cancel_time = datetime.datetime.now() + datetime.timedelta(seconds=timeout_sec)
-        cancel_time_str = cancel_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-        if side == ORDER_BUY:
-            if float(limit_price) * float(volume) > self.cash_balance:
-                return None, None, insufficient_funds_error(self.product, volume, limit_price)
-        else:
-            if float(volume) > self.balance:
-                return None, None, insufficient_product_error(self.product, volume)
-
-        resp : CreateOrderResponse = self.client.limit_order_gtd(client_order_id=client_order_id, product_id=self.product, side=side, limit_price=limit_price, base_size=volume, end_time=cancel_time_str)
-
-        if resp.success:
-            self.active_order = resp.success_response.get('order_id')
+            if self.active_order:
+                return None, None, existing_order_error(self.active_order)
+            
+            if float(volume) > 0:
+                side = ORDER_BUY
+            else:
+                side = ORDER_SELL
+
+            client_order_id = uuid.uuid4().hex
+            cancel_time = self.clock.now() + datetime.timedelta(seconds=timeout_sec)
+            cancel_time_str = cancel_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+            if side == ORDER_BUY:
+                if float(limit_price) * float(volume) > self.cash_balance:
+                    return None, None, insufficient_funds_error(self.product, volume, limit_price, self.cash_balance)
+            else:
+                if float(volume) > self.balance:
+                    return None, None, insufficient_product_error(self.product, volume, self.balance)
+
+            resp, err = await self.rest.request("limit_order_gtd", client_order_id=client_order_id, product_id=self.product, side=side, limit_price=limit_price, base_size=volume, end_time=cancel_time_str)
+            if err:
+                return None, None, err
+
+            return self._handle_create_response(client_order_id, resp, cancel_time)
+
+    def _handle_create_response(self, client_order_id: str, resp: CreateOrderResponse, expires_at: Optional[datetime.datetime] = None) -> Tuple[Union[str,None], Union[str,None], Union[BrokerError,None]]:
+        if getattr(resp, "success", False):
+            self._set_active_order(resp.success_response.get('order_id'), expires_at)
             return client_order_id, self.active_order, None
         
-        if resp.failure_reason:
+        if getattr(resp, "failure_reason", None):
             return None, None, request_error(f"Failed to create order: {resp.failure_reason}")
         
-        if resp.error_response:
-            return None, None, request_error(f"Error creating order: {resp.error_response.error} {resp.error_response.error_details}")
-        
-    def list_orders(self) -> List[Order]:
-        return self.client.list_orders()
+        if getattr(resp, "error_response", None):
+            return None, None, request_error(f"Error creating order: {resp.error_response}")
 
+        return None, None, request_error("Failed to create order")
+        
+    async def list_orders(self) -> Tuple[Union[List[Order],None], Union[BrokerError,None]]:
+        resp, err = await self.rest.request("list_orders")
+        if err:
+            return None, err
+        return resp.orders, None
 
-    def get_order(self, order_id: str) -> Tuple[Union[Order,None], Union[BrokerError,None]]:
-        resp = self.client.get_order(order_id)
+    async def get_order(self, order_id: str) -> Tuple[Union[Order,None], Union[BrokerError,None]]:
+        resp, err = await self.rest.request("get_order", order_id)
+        if err:
+            return None, err
 
-        if resp.order:
-            return resp.order
+        if getattr(resp, "order", None):
+            return resp.order, None
 
         return None, request_error(f"Failed to get order")
     
     
-    def cancel_order(self, order_id: str) -> Union[BrokerError,None]:
-        resp = self.client.cancel_orders([order_id])
+    async def cancel_order(self, order_id: str) -> Union[BrokerError,None]:
+        resp, err = await self.rest.request("cancel_orders", [order_id])
+        if err:
+            return err
 
         # were cancelling a single order so we should only get one response
         result = resp.results[0]
 
         if result.success:
-            self.active_order = None
+            self._set_active_order(None)
             return None
         
-        if result.failure_reason:
-            return request_error(f"Failed to cancel order: {result.failure_reason}")
+        return request_error(f"Failed to cancel order: {getattr(result, 'failure_reason', None)}")
         
-    def cancel_current_order(self) -> Union[BrokerError,None]:
-        if self.active_order:
-            return self.cancel_order(self.active_order)
+    async def cancel_current_order(self) -> Union[BrokerError,None]:
+        async with self.order_lock:
+            if self.active_order:
+                return await self.cancel_order(self.active_order)
+
+    def close(self):
+        if self.timeout_timer is not None:
+            self.timeout_timer.cancel()
+        self.rest.close()
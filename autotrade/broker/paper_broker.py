@@ -1,220 +1,452 @@
 import logging
 import asyncio
+import itertools
+import math
 import uuid
-from typing import Dict, Tuple, Union, List
-from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple, Union, List, Mapping
+from datetime import timedelta
+from functools import partial
 
 from autotrade.metrics.metrics import Metrics
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL
 from autotrade.types.broker_error import BrokerError, existing_order_error, insufficient_funds_error, insufficient_product_error, request_error
 from autotrade.events.events import Events
 from autotrade.events.event_types import EventType
+from autotrade.types.order_book import LevelWatch, OrderBookSide, OrderBookSideView, OrderBookView
 from autotrade.types.pending_order import PendingOrder, OrderType
 from autotrade.types.order_metrics import PriceMetrics
+from autotrade.utils.clock import Clock, Timer, wall_clock
+
+def side_view(levels: Mapping[float, float]) -> OrderBookSideView:
+    """Price ordered view of one side of the book, plain price -> volume dicts are sorted into a ladder."""
+    if isinstance(levels, OrderBookSideView):
+        return levels
+    side = OrderBookSide()
+    for price, volume in (levels or {}).items():
+        side.update(price, volume)
+    return OrderBookSideView(side)
+
+class FillState():
+    """Simulation state of one order that the PendingOrder itself does not carry."""
+    __slots__ = ("queue_ahead",)
+
+    def __init__(self):
+        # estimated volume queued in front of the order at its own price level
+        self.queue_ahead = 0.0
+
+class QueueLevel():
+    """A price level on our side of the book where limit orders of ours are queued."""
+    __slots__ = ("volume", "order_ids")
+
+    def __init__(self, volume: float):
+        # the level's volume when last looked at
+        self.volume = volume
+        # in time priority
+        self.order_ids: List[str] = []
 
 class PaperBroker():
 
-    def __init__(self, product: str, balance: float, events: Events):
+    def __init__(self, product: str, balance: float, events: Events, clock: Clock = wall_clock, max_open_orders: int = 1):
+        """
+        Simulated exchange for many open orders. Resting limit orders are indexed by price per
+        side, so a book update only re-checks the orders it made marketable, buys priced at or
+        above the best ask and sells at or below the best bid. Market orders are retried on every
+        update until they fill. Every order has a timer on the clock that cancels it exactly at
+        its timeout_at, so nothing polls for expiries.
+
+        Orders fill incrementally. Crossing an opposite level only takes the volume there that
+        none of our orders has taken since the feed last updated the level. A limit order also
+        joins the queue at its own price level behind the volume already there, drops in that
+        level's volume on later updates first use up the queue ahead and what is left traded
+        with us at the limit price. A book update costs O(marketable orders + price levels we
+        are queued at).
+
+        Finished orders are settled, and ORDER_FILLED / ORDER_CANCELLED triggered, as soon as
+        they finish. A fill that leaves the order open triggers ORDER_PARTIALLY_FILLED, the
+        balances only change when the order is settled. More than max_open_orders at once gets
+        an existing_order_error.
+        """
         self.product = product
         self.curr_price = 0
         self.balance = 0
         self.cash_balance = balance
-        self.buys = {}
-        self.sells = {}
-        self.active_order=None
+        self.buys = side_view({})
+        self.sells = side_view({})
+        self.max_open_orders = max_open_orders
+        # open orders, and finished ones waiting to be settled, by order id in creation order
+        self.orders: Dict[str, PendingOrder] = {}
+        # unfilled limit orders as (price, sequence, order id), ascending
+        self.resting_buys: List[Tuple[float, int, str]] = []
+        self.resting_sells: List[Tuple[float, int, str]] = []
+        self.resting_keys: Dict[str, Tuple[float, int, str]] = {}
+        self.market_orders: Dict[str, PendingOrder] = {}
+        self.fill_states: Dict[str, FillState] = {}
+        # (side, price) of the levels our limit orders are queued at, our watch on each side of
+        # the book reports which of them changed so an update only looks at those
+        self.queue_levels: Dict[Tuple[str, float], QueueLevel] = {}
+        self.level_watches: Dict[str, LevelWatch] = {ORDER_BUY: self.buys.subscribe(), ORDER_SELL: self.sells.subscribe()}
+        # generation of the live book we last matched against
+        self.book_generation: Optional[int] = None
+        self.changed_levels: Set[Tuple[str, float]] = set()
+        # volume our orders took from each (side, price) level since the feed last updated it,
+        # shared by every order as the feed does not know we took it
+        self.taken: Dict[Tuple[str, float], float] = {}
+        # timeout timers of open orders by order id
+        self.timers: Dict[str, Timer] = {}
+        self.finished: Deque[str] = deque()
+        # set once start() runs, in synchronous mode the engine calls check_current_order itself
+        self.settle_needed: Optional[asyncio.Event] = None
+        self.sequence = itertools.count()
+        # cash and product set aside for open limit orders
+        self.reserved_cash = 0
+        self.reserved_product = 0
         self.events = events
+        self.clock = clock
         self.price_lock = asyncio.Lock()
         self.order_lock = asyncio.Lock()
 
-    async def start(self):
-        await self._order_check_loop()
+    @property
+    def active_order(self) -> Optional[PendingOrder]:
+        """The oldest open or not yet settled order, None if there is none."""
+        return next(iter(self.orders.values()), None)
 
-    async def _order_check_loop(self):
+    async def start(self):
+        # timeouts fire from the clock, this only wakes up when an order has finished
+        self.settle_needed = asyncio.Event()
         while True:
-            if self.active_order:
-                await self.check_current_order()
-            await asyncio.sleep(1)
+            await self.settle_needed.wait()
+            self.settle_needed.clear()
+            await self.check_current_order()
 
     async def check_current_order(self):
         async with self.order_lock:
             async with self.price_lock:
-                if not self.active_order:
-                    return
-                
-                self.try_to_fill_order()
-                
-                if self.active_order.timeout_at < datetime.now() and self.active_order.status != "CANCELLED" and self.active_order.status != "FILLED":
-                    self.active_order.status = "CANCELLED"
-                    logging.info(f"Order {self.active_order} is cancelled due to timeout")
-
-                if self.active_order.status == 'FILLED':
-                    filled_volume = self.active_order.filled_size
-                    avg_filled_price = self.active_order.avg_filled_price
-                    side = self.active_order.side
-                    self.balance += filled_volume if side == ORDER_BUY else -1 * filled_volume
-                    self.cash_balance -= filled_volume * avg_filled_price if side == ORDER_BUY else -1 * filled_volume * avg_filled_price 
-
-                    self.events.trigger_event(EventType.ORDER_FILLED, self.active_order.model_dump())
-                    self.active_order = None
-                    return
-                if self.active_order.status == 'CANCELLED':
-                    filled_volume = self.active_order.filled_size
-                    avg_filled_price = self.active_order.avg_filled_price
-                    side = self.active_order.side
-                    self.balance += filled_volume if side == ORDER_BUY else -1 * filled_volume
-                    self.cash_balance -= filled_volume * avg_filled_price if side == ORDER_BUY else -1 * filled_volume * avg_filled_price
-
-                    self.events.trigger_event(EventType.ORDER_CANCELLED, self.active_order.model_dump())
-                    self.active_order = None
+                if not self.orders:
                     return
 
+                self.match_orders()
+                self.settle_orders()
 
     async def update_price(self, price_metrics: PriceMetrics):
         async with self.price_lock:
             self.curr_price = price_metrics.price
 
-    async def update_order_book(self, values: Dict[str,Dict[float, str]]):
+    async def update_order_book(self, values: Mapping[str, Mapping[float, float]]):
+        # values is normally an OrderBookView, its sides are live read-only views of the book
         async with self.order_lock:
-            self.buys = values.get("buys")
-            self.sells = values.get("sells")
-
-            if self.active_order:
-                if self.active_order.status == "FILLED":
-                    return
-                
-                if self.active_order.timeout_at < datetime.now() and self.active_order.status != "CANCELLED" and self.active_order.status != "FILLED":
-                    logging.info(f"Order {self.active_order} is cancelled due to timeout")
-                    self.active_order.status = "CANCELLED"
+            if isinstance(values, OrderBookView):
+                if values.book.generation == self.book_generation:
+                    # views read the live book, a stale one arriving after we matched the book's
+                    # current generation has nothing new
                     return
+                self.book_generation = values.book.generation
+            self.buys = self._switch_side(ORDER_BUY, self.buys, side_view(values.get("buys")))
+            self.sells = self._switch_side(ORDER_SELL, self.sells, side_view(values.get("sells")))
+            # run even with no open orders, so the taken volume of levels the feed updated is dropped
+            self.match_orders()
+
+    def match_orders(self) -> None:
+        """Try to fill the market orders and the limit orders the current book makes marketable."""
+        self._collect_changes()
+
+        if self.resting_buys and self.sells:
+            start = bisect_left(self.resting_buys, (self.sells.min_price(),))
+            # highest bid first, then time priority, as they share the volume on offer
+            for _, _, order_id in sorted(self.resting_buys[start:], key=lambda key: (-key[0], key[1])):
+                self.try_to_fill_order(self.orders[order_id])
+
+        if self.resting_sells and self.buys:
+            end = bisect_right(self.resting_sells, (self.buys.max_price(), math.inf))
+            for _, _, order_id in self.resting_sells[:end]:
+                self.try_to_fill_order(self.orders[order_id])
+
+        for order in list(self.market_orders.values()):
+            self.try_to_fill_order(order)
+
+        self.match_queues()
+
+    def _switch_side(self, side: str, current: OrderBookSideView, new: OrderBookSideView) -> OrderBookSideView:
+        """Move our watch over when a side is replaced rather than updated, levels whose volume differs count as changed."""
+        if new is current:
+            return current
+        old = self.level_watches[side]
+        watch = new.subscribe()
+        watch.watched = old.watched
+        watch.changed = old.changed
+        watch.changed.update(price for price in watch.watched if current.get(price, 0) != new.get(price, 0))
+        old.close()
+        self.level_watches[side] = watch
+        return new
+
+    def _collect_changes(self) -> None:
+        """Pick up the levels the feed updated, its new volume there replaces what we had taken."""
+        for side, watch in self.level_watches.items():
+            for price in watch.take_changed():
+                key = (side, price)
+                if self.taken.pop(key, None) is not None:
+                    watch.unwatch(price)
+                self.changed_levels.add(key)
+
+    def _take(self, side: str, price: float, volume: float) -> None:
+        """Record volume one of our orders took from a level, until the feed next updates it."""
+        key = (side, price)
+        if key not in self.taken:
+            self.level_watches[side].watch(price)
+        self.taken[key] = self.taken.get(key, 0) + volume
+
+    def match_queues(self) -> None:
+        """Fill queued limit orders from the volume that left their price level since the last update."""
+        changed = self.changed_levels
+        self.changed_levels = set()
+
+        # sets of str keys iterate in a per process order, sorting keeps replays deterministic
+        for key in sorted(changed):
+            level = self.queue_levels.get(key)
+            if level is None:
+                continue
+            side, price = key
+            volume = (self.buys if side == ORDER_BUY else self.sells).get(price, 0)
+            traded = level.volume - volume
+            level.volume = volume
+            if traded <= 0:
+                # volume joining the level queues behind us
+                continue
+
+            for order_id in list(level.order_ids):
+                order = self.orders[order_id]
+                state = self.fill_states[order_id]
+                if self.is_marketable(order):
+                    # crossing orders are filled against the other side
+                    continue
 
-                self.try_to_fill_order()
+                consumed = min(traded, state.queue_ahead)
+                state.queue_ahead -= consumed
+                if traded - consumed <= 0:
+                    continue
 
-    def try_to_fill_order(self) -> None:
-        if not self.active_order:
-            return
-        
-        if self.active_order.status == "FILLED":
-            return
-        if self.active_order.filled_size > 0:
+                fill = min(traded - consumed, order.volume - order.filled_size)
+                self.fill(order, price, fill)
+                logging.debug(f"Order {order} filled {fill} from its queue at {price}")
+                # our own earlier orders take the traded volume before later ones
+                traded -= fill
+                if order.status == "FILLED":
+                    self._unindex(order)
+                    self._finish(order_id)
+
+    def is_marketable(self, order: PendingOrder) -> bool:
+        if order.side == ORDER_BUY:
+            return bool(self.sells) and self.sells.min_price() <= order.price
+        return bool(self.buys) and self.buys.max_price() >= order.price
+
+    def fill(self, order: PendingOrder, price: float, volume: float) -> None:
+        filled_size = order.filled_size + volume
+        order.avg_filled_price = ((order.avg_filled_price * order.filled_size) + (price * volume)) / filled_size
+        order.filled_size = filled_size
+        if filled_size >= order.volume:
+            order.status = "FILLED"
             return
-        
-        if self.active_order.order_type == OrderType.MARKET:
-            self.try_to_fill_market_order()
-        elif self.active_order.order_type == OrderType.LIMIT:
-            self.try_to_fill_limit_order()
+        self.events.trigger_event(EventType.ORDER_PARTIALLY_FILLED, order.snapshot())
 
+    def expire_order(self, order_id: str) -> None:
+        """Timer callback, cancels the order at its timeout_at."""
+        self.timers.pop(order_id, None)
+        order = self.orders.get(order_id)
+        if order is None or order.status == "CANCELLED" or order.status == "FILLED":
+            return
 
+        order.status = "CANCELLED"
+        logging.info(f"Order {order} is cancelled due to timeout")
+        self._unindex(order)
+        self._finish(order_id)
+
+    def _finish(self, order_id: str) -> None:
+        """Queue a filled or cancelled order to be settled."""
+        self.finished.append(order_id)
+        if self.settle_needed is not None:
+            self.settle_needed.set()
+
+    def settle_orders(self) -> None:
+        """Book the fills of finished orders into the balances and let everyone know."""
+        while self.finished:
+            order = self.orders.pop(self.finished.popleft(), None)
+            if order is None:
+                # cancelled with cancel_order before it was settled
+                continue
+
+            self._release(order)
+            filled_volume = order.filled_size
+            avg_filled_price = order.avg_filled_price
+            side = order.side
+            self.balance += filled_volume if side == ORDER_BUY else -1 * filled_volume
+            self.cash_balance -= filled_volume * avg_filled_price if side == ORDER_BUY else -1 * filled_volume * avg_filled_price
+
+            if order.status == "FILLED":
+                self.events.trigger_event(EventType.ORDER_FILLED, order.snapshot())
+            else:
+                self.events.trigger_event(EventType.ORDER_CANCELLED, order.snapshot())
 
-    def try_to_fill_market_order(self) -> None:
-        order_volume = self.active_order.volume
-        order_side = self.active_order.side
-        volume_filled = self.active_order.filled_size
-        avg_price = self.active_order.avg_filled_price
+    def try_to_fill_order(self, order: PendingOrder) -> None:
+        if order.status == "FILLED" or order.status == "CANCELLED":
+            return
 
-        logging.debug(f"Trying to fill market order {self.active_order} with volume {order_volume} and price {self.curr_price}")
+        if order.order_type == OrderType.MARKET:
+            self.try_to_fill_market_order(order)
+        elif order.order_type == OrderType.LIMIT:
+            self.try_to_fill_limit_order(order)
 
+        if order.status == "FILLED":
+            self._unindex(order)
+            self._finish(order.order_id)
 
-        orders = self.sells if order_side == ORDER_BUY else self.buys
-        prices = list(orders.keys())
+    def try_to_fill_market_order(self, order: PendingOrder) -> None:
+        logging.debug(f"Trying to fill market order {order} with volume {order.volume} and price {self.curr_price}")
 
-        if order_side == ORDER_SELL:
-            prices.sort(reverse=True)
+        orders = self.sells if order.side == ORDER_BUY else self.buys
+        book_side = ORDER_SELL if order.side == ORDER_BUY else ORDER_BUY
+        # best price first, the levels are already in price order
+        prices = iter(orders) if order.side == ORDER_BUY else reversed(orders)
 
-        if not orders:
-            return 0, 0, False
         for p in prices:
-
-            if order_side == ORDER_BUY:
+            if order.side == ORDER_BUY:
                 if p < self.curr_price * 0.95:
                     continue
                 if p > self.curr_price:
-                    continue
+                    break
 
-            delta_volume = min(order_volume - volume_filled, orders[p])
-            
-            avg_price = ((avg_price * volume_filled) + (p * delta_volume)) / (volume_filled + delta_volume)
-            volume_filled += delta_volume
-            if volume_filled >= order_volume:
-                self.active_order.status = "FILLED"
-                self.active_order.filled_size= volume_filled
-                self.active_order.avg_filled_price = avg_price
-                return
-            
-        if volume_filled > 0:
-            self.active_order.filled_size = volume_filled
-            self.active_order.avg_filled_price = avg_price
-            return
-
-
-    def try_to_fill_limit_order(self) -> None:
-        order_volume =  self.active_order.volume
-        order_price = self.active_order.price 
-        order_side = self.active_order.side
-        volume_filled = self.active_order.filled_size
-        avg_price = self.active_order.avg_filled_price
+            available = orders[p] - self.taken.get((book_side, p), 0)
+            if available <= 0:
+                continue
 
-        if self.active_order.status == "FILLED":
-            return
-        
-        if self.active_order.filled_size > 0:
-            return
-
-
-        logging.debug(f"Trying to fill order {self.active_order} with volume {order_volume} and price {order_price}")
-
-        orders = self.sells if order_side == ORDER_BUY else self.buys
-        prices = list(orders.keys())
+            delta_volume = min(order.volume - order.filled_size, available)
+            self._take(book_side, p, delta_volume)
+            self.fill(order, p, delta_volume)
+            if order.status == "FILLED":
+                return
 
-        if order_side == ORDER_SELL:
-            prices.sort(reverse=True)
+    def try_to_fill_limit_order(self, order: PendingOrder) -> None:
+        logging.debug(f"Trying to fill order {order} with volume {order.volume} and price {order.price}")
 
+        orders = self.sells if order.side == ORDER_BUY else self.buys
+        book_side = ORDER_SELL if order.side == ORDER_BUY else ORDER_BUY
+        # best price first, stops at the first level past the limit
+        prices = iter(orders) if order.side == ORDER_BUY else reversed(orders)
 
-        if not orders:
-            return 0, 0, False
         for p in prices:
-            if order_side == ORDER_BUY:
-                if p > order_price:
-                    return avg_price, volume_filled, False
+            if order.side == ORDER_BUY:
+                if p > order.price:
+                    break
             else:
-                if p < order_price:
-                    return avg_price, volume_filled, False
-                
-            delta_volume = min(order_volume - volume_filled, orders[p])
-            
-            avg_price = ((avg_price * volume_filled) + (p * delta_volume)) / (volume_filled + delta_volume)
-            volume_filled += delta_volume
-            if volume_filled >= order_volume:
-                self.active_order.status = "FILLED"
-                self.active_order.filled_size= volume_filled
-                self.active_order.avg_filled_price = avg_price
-                logging.debug(f"Order {self.active_order} is filled")
+                if p < order.price:
+                    break
+
+            available = orders[p] - self.taken.get((book_side, p), 0)
+            if available <= 0:
+                continue
+
+            delta_volume = min(order.volume - order.filled_size, available)
+            self._take(book_side, p, delta_volume)
+            self.fill(order, p, delta_volume)
+            if order.status == "FILLED":
+                logging.debug(f"Order {order} is filled")
                 return
-            
-        if volume_filled > 0:
-            self.active_order.filled_size = volume_filled
-            self.active_order.avg_filled_price = avg_price
-            logging.debug(f"Order {self.active_order} is partially filled")
+
+        if order.filled_size > 0:
+            logging.debug(f"Order {order} is partially filled")
+
+    def _open(self, order: PendingOrder) -> None:
+        sequence = next(self.sequence)
+        self.orders[order.order_id] = order
+        self.fill_states[order.order_id] = FillState()
+        self.timers[order.order_id] = self.clock.call_at(order.timeout_at, partial(self.expire_order, order.order_id))
+
+        if order.order_type == OrderType.MARKET:
+            self.market_orders[order.order_id] = order
+        else:
+            key = (order.price, sequence, order.order_id)
+            self.resting_keys[order.order_id] = key
+            insort(self.resting_buys if order.side == ORDER_BUY else self.resting_sells, key)
+            if order.side == ORDER_BUY:
+                self.reserved_cash += order.volume * order.price
+            else:
+                self.reserved_product += order.volume
+
+        self._collect_changes()
+        self.try_to_fill_order(order)
+
+        if order.order_type == OrderType.LIMIT and order.status != "FILLED":
+            self._join_queue(order)
+
+    def _join_queue(self, order: PendingOrder) -> None:
+        """Queue the order at its price level behind the volume already resting there."""
+        own_side = self.buys if order.side == ORDER_BUY else self.sells
+        volume = own_side.get(order.price, 0)
+        level = self.queue_levels.get((order.side, order.price))
+        if level is None:
+            level = self.queue_levels[(order.side, order.price)] = QueueLevel(volume)
+            self.level_watches[order.side].watch(order.price)
+        level.order_ids.append(order.order_id)
+        self.fill_states[order.order_id].queue_ahead = volume
+
+    def _unindex(self, order: PendingOrder) -> None:
+        """Stop matching the order."""
+        self.market_orders.pop(order.order_id, None)
+        self.fill_states.pop(order.order_id, None)
+        timer = self.timers.pop(order.order_id, None)
+        if timer is not None:
+            timer.cancel()
+        level = self.queue_levels.get((order.side, order.price))
+        if level is not None and order.order_id in level.order_ids:
+            level.order_ids.remove(order.order_id)
+            if not level.order_ids:
+                del self.queue_levels[(order.side, order.price)]
+                self.level_watches[order.side].unwatch(order.price)
+
+        key = self.resting_keys.pop(order.order_id, None)
+        if key is None:
             return
+        resting = self.resting_buys if order.side == ORDER_BUY else self.resting_sells
+        del resting[bisect_left(resting, key)]
+
+    def _release(self, order: PendingOrder) -> None:
+        """Give back what the order set aside."""
+        if order.order_type != OrderType.LIMIT:
+            return
+        if order.side == ORDER_BUY:
+            self.reserved_cash -= order.volume * order.price
+        else:
+            self.reserved_product -= order.volume
+        if not self.orders:
+            self.reserved_cash = 0
+            self.reserved_product = 0
+
+    def _remove(self, order_id: str) -> None:
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return
+        self._unindex(order)
+        self._release(order)
 
     async def create_market_order(self, volume: str, confidence: float, timeout_sec: int) -> Tuple[Union[PendingOrder, None], Union[BrokerError,None]]:
         async with self.order_lock:
             side = None
 
-            if self.active_order:
+            if len(self.orders) >= self.max_open_orders:
                 return None, existing_order_error(self.active_order)
 
             if float(volume) * self.curr_price > self.cash_balance and side == ORDER_BUY:
                 return None, insufficient_funds_error(self.product, volume, self.curr_price, self.cash_balance)
-            
+
             if float(volume) > self.balance and side == ORDER_SELL:
                 return None, insufficient_product_error(self.product, volume, self.balance)
-            
+
             if float(volume) > 0:
                 side = ORDER_BUY
             else:
                 side = ORDER_SELL
 
-            timeout_at = datetime.now() + timedelta(seconds=timeout_sec)
+            timeout_at = self.clock.now() + timedelta(seconds=timeout_sec)
             id_suffix = str(uuid.uuid4())[:8]
 
             new_order = PendingOrder(
@@ -229,35 +461,34 @@ class PaperBroker():
                 confidence=confidence
             )
 
-            self.active_order = new_order   
+            logging.debug(f"Created market order {new_order}")
+            logging.info(f"Order Created: {new_order.order_id} - {new_order.side} {new_order.volume} @ {new_order.price}")
 
-            logging.debug(f"Created market order {self.active_order}")
-            logging.info(f"Order Created: {self.active_order.order_id} - {self.active_order.side} {self.active_order.volume} @ {self.active_order.price}")
-
-            self.try_to_fill_order()
+            self._open(new_order)
 
             return new_order, None
-    
+
     async def create_limit_order(self, volume: str, limit_price: str, confidence: float, timeout_sec: int) -> Tuple[Union[PendingOrder, None], Union[BrokerError,None]]:
         async with self.order_lock:
             side = None
 
-            if self.active_order:
+            if len(self.orders) >= self.max_open_orders:
                 return None, existing_order_error(self.active_order)
-            
+
             if float(volume) > 0:
                 side = ORDER_BUY
             else:
                 side = ORDER_SELL
-            
-            if float(volume) * float(limit_price) > self.cash_balance and side == ORDER_BUY:
-                return None, insufficient_funds_error(self.product, float(volume), float(limit_price), self.cash_balance)
 
-            if float(volume) * -1 > self.balance  and side == ORDER_SELL:
-                return None, insufficient_product_error(self.product, volume, self.balance)
+            # cash and product already set aside for other open orders is not available
+            if float(volume) * float(limit_price) > self.cash_balance - self.reserved_cash and side == ORDER_BUY:
+                return None, insufficient_funds_error(self.product, float(volume), float(limit_price), self.cash_balance - self.reserved_cash)
+
+            if float(volume) * -1 > self.balance - self.reserved_product and side == ORDER_SELL:
+                return None, insufficient_product_error(self.product, volume, self.balance - self.reserved_product)
 
 
-            timeout_at = datetime.now() + timedelta(seconds=timeout_sec)
+            timeout_at = self.clock.now() + timedelta(seconds=timeout_sec)
             id_suffix = str(uuid.uuid4())[:8]
 
             new_order = PendingOrder(
@@ -272,28 +503,21 @@ class PaperBroker():
                 confidence=confidence
             )
 
-            self.active_order = new_order   
-
-            logging.info(f"Created limit order {self.active_order}")
+            logging.info(f"Created limit order {new_order}")
 
-            self.try_to_fill_order()
+            self._open(new_order)
 
             return new_order, None
 
     def cancel_order(self, order_id: str) -> Union[BrokerError, None]:
-        """
-        Paper broker assumes we dont make multiple orders at the same time
-        so we can just cancel the current order
-        """
-        if not self.active_order:
-            return None
-        self.active_order = None
+        """Drop the order without settling it."""
+        self._remove(order_id)
         return None
-    
+
     async def cancel_current_order(self) -> Union[BrokerError, None]:
+        """Drop every open order without settling them."""
         async with self.order_lock:
-            if not self.active_order:
-                return None
-            self.active_order = None
+            for order_id in list(self.orders):
+                self._remove(order_id)
             return None
-    
\ No newline at end of file
+
@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Optional, Tuple
+
+from coinbase.rest import RESTClient
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from autotrade.types.broker_error import BrokerError, request_error
+
+
+class AsyncRESTClient:
+
+    def __init__(self, client: RESTClient, pool_size: int = 4, request_timeout: float = 10.0):
+        """
+        Runs the blocking coinbase RESTClient calls on a small thread pool, so an HTTP round trip
+        never holds up the event loop that handles market data.
+
+        The client's requests session keeps up to pool_size connections alive, one per worker,
+        so calls after the first skip the TCP and TLS handshakes. Every request gives up after
+        request_timeout seconds.
+        """
+        client.timeout = request_timeout
+        client.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="coinbase-rest")
+
+    async def request(self, method: str, *args, **kwargs) -> Tuple[Any, Optional[BrokerError]]:
+        """Call a RESTClient method by name on the pool, failed and timed out requests come back as a request error."""
+        call = partial(getattr(self.client, method), *args, **kwargs)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call), None
+        except RequestException as e:
+            return None, request_error(f"Request {method} failed: {e}")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.client.session.close()
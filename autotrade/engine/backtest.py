@@ -0,0 +1,113 @@
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Union
+
+from autotrade.broker.paper_broker import PaperBroker
+from autotrade.events.event_types import EventType
+from autotrade.events.events import CONCURRENT, DispatchPolicy, Events
+from autotrade.metrics.exporter.prometheus import PrometheusExporter
+from autotrade.metrics.metrics import Metrics, MetricsManager
+from autotrade.providers.backtesting_provider import BacktestDataset, BacktestingProvider
+from autotrade.providers.mapped_dataset import MappedDataset
+from autotrade.settings.config import ConfigGetter
+from autotrade.trader.trader import Trader
+from autotrade.types.market_data import L2Update, TickerUpdate
+from autotrade.utils.clock import SimulatedClock
+
+
+def add_trading_handlers(events: Events, broker: PaperBroker, trader: Trader, market_data: DispatchPolicy = CONCURRENT, order_state: DispatchPolicy = CONCURRENT):
+    """
+    Wire the broker and trader to the events. market_data is the dispatch policy of the price,
+    order and order book updates and order_state that of fills, partial fills and cancels.
+    """
+    events.add_handler("update_price", EventType.PRICE_UPDATE, broker.update_price, market_data)
+    events.add_handler("handle_price_update", EventType.PRICE_UPDATE, trader.handle_price_update, market_data)
+    events.add_handler("handle_order_update", EventType.ORDER_UPDATE, trader.handle_order_update, market_data)
+    events.add_handler("handle_order_book_update", EventType.ORDER_BOOK_UPDATE, broker.update_order_book, market_data)
+    events.add_handler("handle_filled_order", EventType.ORDER_FILLED, trader.handle_order_filled, order_state)
+    events.add_handler("handle_partially_filled_order", EventType.ORDER_PARTIALLY_FILLED, trader.handle_order_partially_filled, order_state)
+    events.add_handler("handle_canceled_order", EventType.ORDER_CANCELLED, trader.handle_order_cancelled, order_state)
+
+
+async def run_update(metrics: Union[Metrics, MetricsManager], events: Events, broker: PaperBroker):
+    """Synchronous mode: push an update already given to the metrics all the way through before the next is replayed."""
+    await metrics.drain()
+    await events.drain()
+    # fills and cancels are checked per update rather than on the broker's own timer
+    await broker.check_current_order()
+    await events.drain()
+
+
+class BacktestResult(NamedTuple):
+    profit: float
+    position: float
+    fills: int
+    cancels: int
+    updates: int
+    wall_time: float
+
+
+class Backtest:
+    """
+    A single headless backtest run through the synchronous pipeline: no plotter, no file
+    exporters and no polling consumers, just provider -> metrics -> events -> trader / broker
+    one update at a time.
+
+    PrometheusExporter registers its metrics globally, so a process can only create one and
+    it has to be passed in when running several backtests in the same process.
+    """
+
+    def __init__(
+        self,
+        product: str,
+        config_getter: ConfigGetter,
+        metrics_exporter: PrometheusExporter,
+        start_time: datetime,
+        end_time: Optional[datetime],
+        folder_path: str,
+        dataset: Optional[Union[BacktestDataset, MappedDataset]] = None,
+        interval: timedelta = timedelta(seconds=0.5),
+        balance: float = 1000,
+    ):
+        self.product = product
+        self.clock = SimulatedClock()
+        self.events = Events(synchronous=True)
+        self.metrics = Metrics(product, metrics_exporter, self.events, self.clock, synchronous=True, config_getter=config_getter)
+        self.provider = BacktestingProvider(start_time=start_time, end_time=end_time, interval=interval, real_time_factor=None, folder_path=folder_path, on_message=None, clock=self.clock, dataset=dataset)
+        self.broker = PaperBroker(product, balance, self.events, self.clock)
+        self.trader = Trader(product, self.broker, self.metrics, config_getter)
+        self.fills = 0
+        self.cancels = 0
+        self.updates = 0
+
+        add_trading_handlers(self.events, self.broker, self.trader)
+        self.events.add_handler("count_filled_order", EventType.ORDER_FILLED, self._count_fill)
+        self.events.add_handler("count_canceled_order", EventType.ORDER_CANCELLED, self._count_cancel)
+
+    async def _count_fill(self, _):
+        self.fills += 1
+
+    async def _count_cancel(self, _):
+        self.cancels += 1
+
+    async def process_event(self, event: Union[TickerUpdate, L2Update]):
+        self.updates += 1
+        if isinstance(event, L2Update):
+            self.metrics.update_order(event, event.time, 0)
+        else:
+            self.metrics.update_market_price(event.price, event.time, 0)
+
+        await run_update(self.metrics, self.events, self.broker)
+
+    async def run(self) -> BacktestResult:
+        started = time.perf_counter()
+        await self.provider.replay(self.process_event)
+
+        return BacktestResult(
+            profit=self.trader.PositionTracker.total_profit,
+            position=self.trader.PositionTracker.position,
+            fills=self.fills,
+            cancels=self.cancels,
+            updates=self.updates,
+            wall_time=time.perf_counter() - started,
+        )
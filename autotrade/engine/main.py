@@ -3,11 +3,13 @@ import asyncio
 from  datetime import datetime, timezone, timedelta
 import json
 import threading
+from typing import Optional, Union
 
+from autotrade.engine.backtest import add_trading_handlers, run_update
 from autotrade.providers.backtesting_provider import BacktestingProvider
 from autotrade.providers.coinbase_provider import CoinbaseProvider
 from autotrade.metrics.metrics import MetricsManager
-from autotrade.events.events import Events
+from autotrade.events.events import Events, LATEST, SERIAL
 from autotrade.exporter.exporter import Exporter
 from autotrade.exporter.connectors.localfile_connector import LocalFileConnector
 from autotrade.exporter.exporter_manager import exporter_manager
@@ -16,29 +18,43 @@ from autotrade.settings.contants import get_export_bucket
 from autotrade.trader.trader import Trader
 from autotrade.broker.paper_broker import PaperBroker
 from autotrade.events.event_types import EventType
+from autotrade.types.market_data import L2Update, TickerUpdate
+from autotrade.utils.clock import SimulatedClock
 
 class Engine():
 
-    def __init__(self, product: str):
+    def __init__(self, product: str, synchronous: bool = False):
+        """
+        With synchronous set the backtest is driven one update at a time through metrics,
+        events, the trader and the broker with no queues or sleeps in between, so a run
+        is as fast as the handlers allow and always processes updates in the same order.
+        """
         self.loop = asyncio.get_event_loop()
         self.product = product
-        self.event_handler = Events()
-        self.metrics = MetricsManager(product, self.event_handler, True)
+        self.synchronous = synchronous
+        # the backtest replays in simulated time, live trading would use the wall clock
+        self.clock = SimulatedClock()
+        self.event_handler = Events(synchronous)
+        self.metrics = MetricsManager(product, self.event_handler, True, self.clock, synchronous, config)
         # self.provider = CoinbaseProvider(product, self.on_message)
-        self.provider = BacktestingProvider(start_time=datetime(2025, 7,12, 17, 00, 00, tzinfo=timezone.utc), end_time=datetime(2025, 12, 11, 15, 00, 00, tzinfo=timezone.utc), interval=timedelta(seconds=0.5), real_time_factor=20.0, folder_path="./exported_data",  on_message=self.on_message)
-        self.broker = PaperBroker(product,1000, self.event_handler)
+        self.provider = BacktestingProvider(start_time=datetime(2025, 7,12, 17, 00, 00, tzinfo=timezone.utc), end_time=datetime(2025, 12, 11, 15, 00, 00, tzinfo=timezone.utc), interval=timedelta(seconds=0.5), real_time_factor=None if synchronous else 20.0, folder_path="./exported_data",  on_message=self.on_message, on_event=self.on_event, clock=self.clock)
+        self.broker = PaperBroker(product,1000, self.event_handler, self.clock)
         self.trader = Trader(product, self.broker, self.metrics.metrics, config)
+        # the event loop thread's main task, cancelled on shutdown
+        self.loop_task: Optional[asyncio.Task] = None
+        self.async_loop: Optional[asyncio.AbstractEventLoop] = None
 
     def setup(self):
         exporter_manager.add_exporter("orders", Exporter("orders", 40000, timedelta(hours=1), LocalFileConnector("/Users/samradage/repos/autotrade/exported_data")))
         exporter_manager.add_exporter("market_price", Exporter("market_price", 20000, timedelta(hours=1), LocalFileConnector("/Users/samradage/repos/autotrade/exported_data")))
 
-        self.event_handler.add_handler("update_price", EventType.PRICE_UPDATE, self.broker.update_price)
-        self.event_handler.add_handler("handle_price_update", EventType.PRICE_UPDATE, self.trader.handle_price_update)
-        self.event_handler.add_handler("handle_order_update", EventType.ORDER_UPDATE, self.trader.handle_order_update)
-        self.event_handler.add_handler("handle_order_book_update", EventType.ORDER_BOOK_UPDATE, self.broker.update_order_book)
-        self.event_handler.add_handler("handle_filled_order", EventType.ORDER_FILLED, self.trader.handle_order_filled)
-        self.event_handler.add_handler("handle_canceled_order", EventType.ORDER_CANCELLED, self.trader.handle_order_cancelled)
+        # the trader only acts on the newest metrics, stale ones are dropped before they are queued
+        coalesced_events = self.metrics.metrics_exporter.counter_coalesced_events
+        for event_type in (EventType.PRICE_UPDATE, EventType.ORDER_UPDATE):
+            self.event_handler.coalesce(event_type, coalesced_events.labels(self.product, event_type.value))
+
+        # market data handlers only need the newest value, fills and cancels must each be handled in order
+        add_trading_handlers(self.event_handler, self.broker, self.trader, LATEST, SERIAL)
         pass
 
     def on_message(self, message: str):
@@ -79,15 +95,56 @@ class Engine():
         if is_snapshot:
             logging.debug("snapshot done")
 
+    def on_event(self, event: Union[TickerUpdate, L2Update]):
+        """Handle an already decoded update from a provider that delivers them directly."""
+        recieved = datetime.now().microsecond
+
+        if isinstance(event, L2Update):
+            if event.is_snapshot:
+                logging.debug("snapshot")
+            self.metrics.update_order(event, event.time, recieved)
+            self.metrics.update_recieved_messages("l2_data", 1)
+        elif isinstance(event, TickerUpdate):
+            self.metrics.update_market_price(event.price, event.time, recieved)
+            self.metrics.update_recieved_messages("ticker", 1)
+        else:
+            logging.error(f"unknown event {event}")
+
+    async def process_event(self, event: Union[TickerUpdate, L2Update]):
+        """Synchronous mode: push one update all the way through before the next is replayed."""
+        self.on_event(event)
+        await run_update(self.metrics, self.event_handler, self.broker)
+
+    async def run_backtest(self):
+        await self.provider.replay(self.process_event)
+
     async def start(self):
         self.metrics.start_metrics_exporter()
         async def async_gather():
+            self.async_loop = asyncio.get_running_loop()
+            self.loop_task = asyncio.current_task()
+            if self.synchronous:
+                await asyncio.gather(self.metrics.start_plotter_async(), self.run_backtest(), exporter_manager.start(), config.start())
+                return
             await asyncio.gather(self.metrics.start(), self.metrics.start_plotter_async(), self.provider.start(), exporter_manager.start(), self.event_handler.start(), self.broker.start(), config.start())
         def async_tasks():
-            asyncio.run(async_gather())
+            try:
+                asyncio.run(async_gather())
+            except asyncio.CancelledError:
+                pass
     
         async_thread = threading.Thread(target=async_tasks)
         async_thread.daemon = True
         async_thread.start()
 
-        self.metrics.start_plotter()
+        try:
+            self.metrics.start_plotter()
+        finally:
+            self.shutdown(async_thread)
+
+    def shutdown(self, async_thread: threading.Thread):
+        """Stop the event loop thread, then export the exporters' partial buffers and wait for the uploads."""
+        if self.loop_task is not None:
+            self.async_loop.call_soon_threadsafe(self.loop_task.cancel)
+        async_thread.join(timeout=10)
+        exporter_manager.close()
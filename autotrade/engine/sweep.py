@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from autotrade.engine.backtest import Backtest, BacktestResult
+from autotrade.metrics.exporter.prometheus import PrometheusExporter
+from autotrade.providers.mapped_dataset import MappedDataset
+from autotrade.settings.config import Config, StaticConfig
+from autotrade.settings.contants import get_product
+
+
+class SweepRun(NamedTuple):
+    params: Dict[str, Any]
+    result: BacktestResult
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the values in grid, e.g. {"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]."""
+    unknown = set(grid) - set(Config.model_fields)
+    if unknown:
+        raise ValueError(f"unknown config fields {sorted(unknown)}")
+
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# state of a sweep worker process, set once by _init_worker
+_worker_dataset: Optional[MappedDataset] = None
+_worker_exporter: Optional[PrometheusExporter] = None
+
+
+def _init_worker(dataset: MappedDataset, quiet: bool):
+    global _worker_dataset, _worker_exporter
+    _worker_dataset = dataset
+    # prometheus metrics are registered globally so each process can only have one exporter
+    _worker_exporter = PrometheusExporter(store_history=False)
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+        logging.disable(logging.INFO)
+
+
+async def _backtest(product: str, config_getter: StaticConfig, start_time: datetime, end_time: Optional[datetime]) -> BacktestResult:
+    # built on the running loop, on python 3.9 the locks and events the metrics and broker create
+    # look up the current loop, and a worker has none left after its first asyncio.run
+    backtest = Backtest(
+        product,
+        config_getter,
+        _worker_exporter,
+        start_time,
+        end_time,
+        _worker_dataset.folder_path,
+        dataset=_worker_dataset,
+    )
+    return await backtest.run()
+
+
+def _run_config(product: str, base: Config, params: Dict[str, Any], start_time: datetime, end_time: Optional[datetime]) -> SweepRun:
+    return SweepRun(params, asyncio.run(_backtest(product, StaticConfig.with_overrides(base, **params), start_time, end_time)))
+
+
+def run_sweep(
+    grid: Dict[str, List[Any]],
+    folder_path: str,
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+    product: Optional[str] = None,
+    base: Optional[Config] = None,
+    workers: Optional[int] = None,
+    cache_path: Optional[str] = None,
+    quiet: bool = True,
+) -> List[SweepRun]:
+    """
+    Backtest every combination in grid in parallel, one worker process per core by default.
+    The exported data is parsed once into a memory mapped column cache (cache_path, by default
+    .backtest_cache inside folder_path) that every worker maps read only, so the workers share
+    a single copy of it. Runs are returned in grid order.
+    """
+    configs = expand_grid(grid)
+    product = product or get_product()
+    base = base or Config()
+    dataset = MappedDataset.build(folder_path, start_time, cache_path or os.path.join(folder_path, ".backtest_cache"))
+
+    runs: List[Optional[SweepRun]] = [None] * len(configs)
+    # spawned rather than forked workers, a forked worker would inherit any prometheus metrics
+    # already registered in this process and fail to create its own exporter
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context, initializer=_init_worker, initargs=(dataset, quiet)) as pool:
+        futures = {pool.submit(_run_config, product, base, params, start_time, end_time): i for i, params in enumerate(configs)}
+        for future in as_completed(futures):
+            runs[futures[future]] = future.result()
+
+    return runs
+
+
+def format_runs(runs: List[SweepRun]) -> str:
+    """One row per run with its parameters, PnL, fill counts and wall time."""
+    names = list(runs[0].params) if runs else []
+    header = names + ["profit", "position", "fills", "cancels", "updates", "wall_time_s"]
+    rows = [
+        [str(run.params[name]) for name in names] + [
+            f"{run.result.profit:.4f}",
+            f"{run.result.position:.8f}",
+            str(run.result.fills),
+            str(run.result.cancels),
+            str(run.result.updates),
+            f"{run.result.wall_time:.2f}",
+        ]
+        for run in runs
+    ]
+
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(row, widths)) for row in [header] + rows]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest every combination of a grid of config values in parallel")
+    parser.add_argument("grid", type=str, help='JSON object of config field to list of values, e.g. {"imbalance_threshold": [0.2, 0.3]}')
+    parser.add_argument("--folder", type=str, default="./exported_data", help="folder with the exported market_price / orders files")
+    parser.add_argument("--start", type=str, required=True, help="ISO start time of the backtest")
+    parser.add_argument("--end", type=str, default=None, help="ISO end time of the backtest, runs to the end of the data when omitted")
+    parser.add_argument("--config", type=str, default=None, help="config file the grid values override")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to one per core")
+    parser.add_argument("--cache", type=str, default=None, help="folder for the parsed column cache, defaults to .backtest_cache inside --folder")
+    args = parser.parse_args()
+
+    def parse_time(value: str) -> datetime:
+        parsed = datetime.fromisoformat(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+    base = Config()
+    if args.config:
+        with open(args.config, "r") as f:
+            base = Config.model_validate_json(f.read())
+
+    started = time.perf_counter()
+    runs = run_sweep(
+        json.loads(args.grid),
+        args.folder,
+        parse_time(args.start),
+        parse_time(args.end) if args.end else None,
+        base=base,
+        workers=args.workers,
+        cache_path=args.cache,
+    )
+    print(format_runs(runs))
+    print(f"{len(runs)} runs in {time.perf_counter() - started:.2f}s")
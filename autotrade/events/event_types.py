@@ -7,8 +7,22 @@ class EventType(Enum):
     ORDER_BOOK_UPDATE = "order_book_update"
     PRICE_UPDATE = "price_update"
     ORDER_FILLED = "order_filled"
+    ORDER_PARTIALLY_FILLED = "order_partially_filled"
     ORDER_CANCELLED = "order_cancelled"
 
+# lower runs first, order state goes ahead of market data so positions never lag a data burst
+HIGH_PRIORITY = 0
+NORMAL_PRIORITY = 1
+
+EVENT_PRIORITIES = {
+    EventType.ORDER_FILLED: HIGH_PRIORITY,
+    EventType.ORDER_PARTIALLY_FILLED: HIGH_PRIORITY,
+    EventType.ORDER_CANCELLED: HIGH_PRIORITY,
+    EventType.ORDER_UPDATE: NORMAL_PRIORITY,
+    EventType.ORDER_BOOK_UPDATE: NORMAL_PRIORITY,
+    EventType.PRICE_UPDATE: NORMAL_PRIORITY,
+}
+
 class Event:
     def __init__(self, event_type: EventType, value):
         self.event_type = event_type
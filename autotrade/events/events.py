@@ -1,21 +1,83 @@
 import asyncio
-from typing import Dict
+import itertools
+from collections import deque
+from typing import Deque, Dict, Mapping, NamedTuple, Optional, Set
 import logging
 from datetime import datetime
 import threading
 
-from autotrade.events.event_types import EventType, Event
+from autotrade.events.event_types import EVENT_PRIORITIES, NORMAL_PRIORITY, EventType, Event
+
+class DispatchPolicy(NamedTuple):
+    """
+    How calls to one event handler are scheduled. max_running is how many calls may run at
+    once, None for no limit. A value arriving while max_running calls are busy waits in the
+    handler's buffer of at most max_pending values, when it is full the oldest is dropped.
+    """
+    max_running: Optional[int] = None
+    max_pending: Optional[int] = None
+
+# a task per event, the default
+CONCURRENT = DispatchPolicy()
+# one call at a time, every value handled in order
+SERIAL = DispatchPolicy(max_running=1)
+# one call at a time, values arriving meanwhile are replaced by the newest
+LATEST = DispatchPolicy(max_running=1, max_pending=1)
+
+def bounded(max_running: int, max_pending: Optional[int] = None) -> DispatchPolicy:
+    if max_running < 1:
+        raise ValueError("max_running must be at least 1")
+    return DispatchPolicy(max_running, max_pending)
+
+class HandlerDispatcher():
+    """Runs one handler under its DispatchPolicy, busy calls pick up buffered values instead of starting new tasks."""
+
+    def __init__(self, id: str, handler, policy: DispatchPolicy):
+        self.id = id
+        self.handler = handler
+        self.policy = policy
+        self.running = 0
+        self.pending: Deque = deque()
+        self.dropped = 0
+        self.tasks: Set[asyncio.Task] = set()
+
+    def submit(self, value):
+        if self.policy.max_running is None or self.running < self.policy.max_running:
+            self.running += 1
+            task = asyncio.create_task(self._run(value))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            return
+
+        if self.policy.max_pending is not None and len(self.pending) >= self.policy.max_pending:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(value)
+
+    async def _run(self, value):
+        try:
+            await self._call(value)
+            while self.pending:
+                await self._call(self.pending.popleft())
+        finally:
+            self.running -= 1
+
+    async def _call(self, value):
+        try:
+            await self.handler(value)
+        except Exception:
+            logging.exception(f"[events] handler {self.id} failed")
 
 class EventHandler():
     def __init__(self, event_name: EventType):
         self.event_name = event_name
-        self.handlers = {}
+        self.handlers: Dict[str, HandlerDispatcher] = {}
         pass
 
-    def add_handler(self, id: str, handler: str):
+    def add_handler(self, id: str, handler, policy: DispatchPolicy = CONCURRENT):
         if id not in self.handlers:
             logging.info(f"[events] adding event handler {self.event_name} {id}")
-            self.handlers[id] = handler
+            self.handlers[id] = HandlerDispatcher(id, handler, policy)
 
     def remove_handler(self, id: str):
         if id not in self.handlers:
@@ -26,43 +88,138 @@ class EventHandler():
         del self.handlers[id]
 
     def trigger(self, value):
-        for handler in self.handlers.values():
-            asyncio.create_task(handler(value))
+        for dispatcher in self.handlers.values():
+            dispatcher.submit(value)
+
+    async def run(self, value):
+        """Await each handler in the order they were added, dispatch policies do not apply."""
+        for dispatcher in list(self.handlers.values()):
+            await dispatcher.handler(value)
+
+class CoalescingChannel():
+    """
+    Holds only the newest value of one event type. A value replaced before it was taken is
+    stale, it is dropped and counted, and dropped_counter (e.g. a prometheus counter child)
+    is incremented if given.
+    """
+
+    def __init__(self, event_type: EventType, dropped_counter=None):
+        self.event_type = event_type
+        self.dropped_counter = dropped_counter
+        self.value = None
+        self.full = False
+        self.dropped = 0
+
+    def put(self, value) -> bool:
+        """Store value, returns True if the channel was empty and so needs to be scheduled."""
+        if self.full:
+            self.dropped += 1
+            if self.dropped_counter is not None:
+                self.dropped_counter.inc()
+            self.value = value
+            return False
+
+        self.value = value
+        self.full = True
+        return True
+
+    def take(self):
+        value, self.value = self.value, None
+        self.full = False
+        return value
 
 class Events():
 
-    def __init__(self):
+    def __init__(self, synchronous: bool = False, priorities: Mapping[EventType, int] = EVENT_PRIORITIES):
+        """
+        The consumer blocks on the queue and, once woken, triggers every event already queued
+        before waiting again, so an event is dispatched as soon as the loop gets to it.
+
+        Queued events are taken lowest priority first, in trigger order within a priority, so
+        fills and cancels skip ahead of any backlog of market data. Event types missing from
+        priorities get NORMAL_PRIORITY.
+
+        In synchronous mode triggered events are held until drain() is awaited, which runs
+        their handlers to completion in trigger order, there is no queue, consumer task or priority.
+        """
         self.handlers: Dict[str, EventHandler] = {}
         self.threads = 1
+        self.synchronous = synchronous
+        self.pending: Deque[Event] = deque()
+        self.channels: Dict[EventType, CoalescingChannel] = {}
+        self.priorities = dict(priorities)
+        self.sequence = itertools.count()
 
     async def _event_loop(self):
         while True:
-            try:
-                event = self.queue.get_nowait()  # Receive data from the channel
+            _, _, event = await self.queue.get()  # Wait for data from the channel
+            while True:
+                self._dispatch(event)
+                try:
+                    _, _, event = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
 
-                if event.event_type not in self.handlers:
-                    logging.error(f"[events] tried to call non existant event {event.name}")
-                    continue
+    def _dispatch(self, event: Event):
+        # take the value before anything else, a channel left full would fold every later trigger into it
+        channel = self.channels.get(event.event_type)
+        value = channel.take() if channel is not None else event.value
 
-                handler = self.handlers[event.event_type]
-                handler.trigger(event.value)
+        if event.event_type not in self.handlers:
+            logging.error(f"[events] tried to call non existant event {event.event_type}")
+            return
 
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.1)
-                continue
+        self.handlers[event.event_type].trigger(value)
 
-    def add_handler(self, id: str, event: EventType, handler):
+    def add_handler(self, id: str, event: EventType, handler, policy: DispatchPolicy = CONCURRENT):
+        """
+        policy decides how calls to handler are scheduled when events arrive faster than it
+        finishes, CONCURRENT, SERIAL, LATEST or bounded(n).
+        """
         if event not in self.handlers:
             self.handlers[event] = EventHandler(event)
 
-        self.handlers[event].add_handler(id, handler)
+        self.handlers[event].add_handler(id, handler, policy)
+
+    def coalesce(self, event: EventType, dropped_counter=None) -> CoalescingChannel:
+        """
+        Queue at most one event of this type, triggering it again before it is handled replaces
+        its value, so handlers only see the newest. Call before start(). Synchronous mode drains
+        every event anyway and does not coalesce.
+        """
+        channel = CoalescingChannel(event, dropped_counter)
+        self.channels[event] = channel
+        return channel
 
     def trigger_event(self, event_name: EventType, value):
-        event = Event(event_name, value)
-        self.queue.put_nowait(event)
+        if self.synchronous:
+            self.pending.append(Event(event_name, value))
+            return
+
+        channel = self.channels.get(event_name)
+        if channel is not None:
+            if not channel.put(value):
+                # the queued event will pick up this value
+                return
+            value = None
+
+        priority = self.priorities.get(event_name, NORMAL_PRIORITY)
+        self.queue.put_nowait((priority, next(self.sequence), Event(event_name, value)))
+
+    async def drain(self):
+        """Synchronous mode: handle every pending event, including any triggered by the handlers themselves."""
+        while self.pending:
+            event = self.pending.popleft()
+
+            if event.event_type not in self.handlers:
+                logging.error(f"[events] tried to call non existant event {event.event_type}")
+                continue
+
+            await self.handlers[event.event_type].run(event.value)
 
     async def start(self):
-        loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=400000, loop=loop)
+        if self.synchronous:
+            return
+        self.queue = asyncio.PriorityQueue(maxsize=400000)
         consumers = [asyncio.create_task(self._event_loop()) for i in range(self.threads)]
         await asyncio.gather(*consumers)
\ No newline at end of file
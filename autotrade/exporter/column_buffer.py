@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Any, Dict, Mapping, Set
+
+import numpy as np
+import pandas as pd
+
+# int64 value of NaT, used for datetimes missing from a row
+MISSING_TIME = pd.NaT.value
+
+
+class ColumnBuffer:
+    """
+    Append-only table kept as preallocated typed column arrays, O(1) per row.
+
+    Numbers go into float64 columns, datetimes into int64 unix nanosecond columns and
+    anything else into object columns. A column first seen part way through is back filled,
+    and a column missing from a row is filled, with NaN / NaT / None.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 1)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.time_columns: Set[str] = set()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, row: Mapping[str, Any]):
+        if self.size == self.capacity:
+            self._grow()
+
+        index = self.size
+        for name, value in row.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self._add_column(name, value)
+
+            if name in self.time_columns:
+                column[index] = MISSING_TIME if value is None else pd.Timestamp(value).value
+            else:
+                column[index] = value
+
+        if len(row) != len(self.columns):
+            for name, column in self.columns.items():
+                if name not in row:
+                    column[index] = self._missing(name, column)
+
+        self.size += 1
+
+    def extend(self, columns: Mapping[str, Any], count: int):
+        """
+        Append count rows at once from columns of count values each. A value that is not a
+        list / array is repeated for every row, e.g. the timestamp shared by an L2 update.
+        """
+        if count == 0:
+            return
+        while self.size + count > self.capacity:
+            self._grow()
+
+        start, end = self.size, self.size + count
+        for name, values in columns.items():
+            is_column = isinstance(values, (list, tuple, np.ndarray))
+            column = self.columns.get(name)
+            if column is None:
+                column = self._add_column(name, values[0] if is_column else values)
+
+            if name in self.time_columns:
+                values = [pd.Timestamp(value).value for value in values] if is_column else pd.Timestamp(values).value
+            column[start:end] = values
+
+        if len(columns) != len(self.columns):
+            for name, column in self.columns.items():
+                if name not in columns:
+                    column[start:end] = self._missing(name, column)
+
+        self.size = end
+
+    def take(self) -> Dict[str, np.ndarray]:
+        """
+        Hand over the rows appended so far and start again with fresh arrays, nothing is copied.
+        Datetime columns are returned as UTC datetime64[ns].
+        """
+        columns = {}
+        for name, column in self.columns.items():
+            column = column[:self.size]
+            columns[name] = column.view("datetime64[ns]") if name in self.time_columns else column
+
+        self.columns = {}
+        self.time_columns = set()
+        self.size = 0
+        return columns
+
+    def _add_column(self, name: str, value: Any) -> np.ndarray:
+        if isinstance(value, datetime):
+            column = np.empty(self.capacity, dtype=np.int64)
+            self.time_columns.add(name)
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+            column = np.empty(self.capacity, dtype=np.float64)
+        else:
+            column = np.empty(self.capacity, dtype=object)
+
+        column[:self.size] = self._missing(name, column)
+        self.columns[name] = column
+        return column
+
+    def _missing(self, name: str, column: np.ndarray):
+        if name in self.time_columns:
+            return MISSING_TIME
+        if column.dtype == np.float64:
+            return np.nan
+        return None
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(self.capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
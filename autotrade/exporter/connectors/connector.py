@@ -6,4 +6,26 @@ class Connector(ABC):
 
     @abstractmethod
     async def export(self, file_path: str, exported_metric: str, output_name: str):
-        pass
\ No newline at end of file
+        pass
+
+class ExportStream(ABC):
+    """An export being written piece by piece, nothing is visible at the destination until close()."""
+
+    @abstractmethod
+    def write(self, data: bytes):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    @abstractmethod
+    def abort(self):
+        pass
+
+class StreamingConnector(ABC):
+    """A connector exports can be written straight into as they are flushed, without a local file."""
+
+    @abstractmethod
+    def open_stream(self, exported_metric: str, output_name: str) -> ExportStream:
+        pass
@@ -7,6 +7,8 @@ class LocalFileConnector:
         os.makedirs(output_path, exist_ok=True) 
 
     def export(self, file_path: str, exported_metric: str, output_name: str):
-        new_file_path = os.path.join(self.output_path, f'{output_name}.csv')
+        # keep the extension of the exported format
+        extension = os.path.splitext(file_path)[1]
+        new_file_path = os.path.join(self.output_path, f'{output_name}{extension}')
         shutil.copy(file_path, new_file_path)
         print(f"{file_path} copied to: {new_file_path}")
\ No newline at end of file
@@ -1,18 +1,77 @@
 import boto3
 import datetime
+import os
+
+from autotrade.exporter.connectors.connector import ExportStream, StreamingConnector
+
+# every part of a multipart upload apart from the last has to be at least 5MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
 
 class S3Connector:
-    def __init__(self, bucket_name: str, split_by_day: bool = False):
+    def __init__(self, bucket_name: str, split_by_day: bool = False, client=None):
         self.bucket_name = bucket_name
         self.split_by_day = split_by_day
-        self.s3 = boto3.client('s3')
+        self.s3 = client or boto3.client('s3')
 
-    def export(self, file_path: str, exported_metric: str, output_name: str):
-        full_out_path = f"{exported_metric}/{output_name}"
-        
+    def key(self, exported_metric: str, output_name: str) -> str:
         if self.split_by_day:
-            full_out_path = f"{exported_metric}/{datetime.datetime.now().strftime('%Y-%m-%d')}/{output_name}"
+            return f"{exported_metric}/{datetime.datetime.now().strftime('%Y-%m-%d')}/{output_name}"
+        return f"{exported_metric}/{output_name}"
+
+    def export(self, file_path: str, exported_metric: str, output_name: str):
+        # csv exports keep their existing extension-less keys, other formats are suffixed so they can be told apart
+        extension = os.path.splitext(file_path)[1]
+        if extension != ".csv":
+            output_name = f"{output_name}{extension}"
+
+        full_out_path = self.key(exported_metric, output_name)
 
         with open(file_path, "rb") as f:
             self.s3.put_object(Bucket=self.bucket_name, Key=full_out_path, Body=f)
-        print(f"{file_path} uploaded to: {self.bucket_name}/{exported_metric}/{full_out_path}")
\ No newline at end of file
+        print(f"{file_path} uploaded to: {self.bucket_name}/{exported_metric}/{full_out_path}")
+
+class S3MultipartStream(ExportStream):
+    """
+    Writes into an S3 multipart upload, holding back at most part_size bytes before sending
+    them as the next part. The object appears once close() completes the upload.
+    """
+
+    def __init__(self, client, bucket_name: str, key: str, part_size: int = MIN_PART_SIZE):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = client.create_multipart_upload(Bucket=bucket_name, Key=key)["UploadId"]
+        self.parts = []
+        self.buffer = bytearray()
+
+    def write(self, data: bytes):
+        self.buffer += data
+        if len(self.buffer) >= self.part_size:
+            self._upload_part()
+
+    def _upload_part(self):
+        part_number = len(self.parts) + 1
+        resp = self.client.upload_part(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=bytes(self.buffer))
+        self.parts.append({"ETag": resp["ETag"], "PartNumber": part_number})
+        self.buffer = bytearray()
+
+    def close(self):
+        # the last part may be smaller than part_size, an upload needs at least one part
+        if self.buffer or not self.parts:
+            self._upload_part()
+        self.client.complete_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts})
+        print(f"multipart upload of {len(self.parts)} parts completed: {self.bucket_name}/{self.key}")
+
+    def abort(self):
+        self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+
+class S3StreamingConnector(S3Connector, StreamingConnector):
+    """S3Connector whose exports are streamed into multipart uploads instead of staged in a temp file."""
+
+    def __init__(self, bucket_name: str, split_by_day: bool = False, client=None, part_size: int = MIN_PART_SIZE):
+        super().__init__(bucket_name, split_by_day, client)
+        self.part_size = part_size
+
+    def open_stream(self, exported_metric: str, output_name: str) -> S3MultipartStream:
+        return S3MultipartStream(self.s3, self.bucket_name, self.key(exported_metric, output_name), self.part_size)
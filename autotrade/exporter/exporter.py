@@ -1,29 +1,62 @@
 import asyncio
+import logging
 import threading
-import pandas as pd
-import dateutil
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 import tempfile
 import os
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
-from autotrade.exporter.connectors.connector import Connector
+from autotrade.exporter.column_buffer import ColumnBuffer
+from autotrade.exporter.connectors.connector import Connector, ExportStream, StreamingConnector
+from autotrade.exporter.file_formats import CSV_FORMAT, FILE_FORMATS, NPZ_FORMAT, gzip_csv_chunk, write_csv, write_npz
+from autotrade.utils.utils import to_datetime
 
 class Exporter:
-    def __init__(self, name: str, observations_limit: int, time_limit: timedelta, connector: Connector):
+    def __init__(self, name: str, observations_limit: int, time_limit: timedelta, connector: Union[Connector, StreamingConnector], file_format: str = CSV_FORMAT, chunk_observations: int = 5000):
+        """
+        file_format is CSV_FORMAT or NPZ_FORMAT, a compressed archive of typed columns the backtests load much faster.
+
+        Writing and uploading an export happens on a single background thread, so a slow disk or
+        upload never holds up the caller. The next batch keeps filling a fresh buffer while the
+        previous one is written. Only one export is in flight at a time, one that is due meanwhile
+        is held back as the pending export and the caller awaits ready() before adding more, so
+        buffers never pile up and the event loop keeps running while it waits.
+
+        With a StreamingConnector there is no temp file: every chunk_observations observations are
+        written to the connector's stream as a gzipped csv chunk, so only one chunk is held in
+        memory, and the stream is closed when the export is due. The output is named .csv.gz.
+        """
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"unknown export file format {file_format}")
+        self.streaming = isinstance(connector, StreamingConnector)
+        if self.streaming and file_format != CSV_FORMAT:
+            raise ValueError("streamed exports are written as gzipped csv")
         self.name = name
-        self.data_frame = pd.DataFrame()
+        self.file_format = file_format
+        self.chunk_observations = chunk_observations
+        # observations are appended to typed columns and only turned into a file on export
+        self.buffer = ColumnBuffer(chunk_observations if self.streaming else observations_limit)
+        # chunks handed over for the current file, and the stream they go to (export thread only)
+        self.file_chunks = 0
+        self.stream: Optional[ExportStream] = None
         self.observations = 0
         self.observations_limit = observations_limit
         self.connector = connector
         self.time_limit = time_limit
         self.file_name = ""
         self.start_time = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"exporter-{name}")
+        self.last_export: Optional[Future] = None
+        # the export held back while last_export is in flight, as (fn, args)
+        self.pending: Optional[Tuple[Callable, tuple]] = None
         pass
 
     def update_dataframe(self, **kwargs):
         if "metric_name" in kwargs:
             del kwargs["metric_name"]
-        update_time = dateutil.parser.parse(kwargs.get("time"))
+        update_time = to_datetime(kwargs.get("time"))
 
         if self.file_name == "":
             self.file_name = f"{self.name}_{int(update_time.timestamp())}"
@@ -31,14 +64,28 @@ class Exporter:
         if self.start_time is None:
             self.start_time = datetime.now()
 
-        row = pd.Series({**kwargs, "time": update_time})
-        self.data_frame = pd.concat([
-                self.data_frame, 
-                pd.DataFrame([row], columns=row.index)]
-           ).reset_index(drop=True)
-        
+        self.buffer.append({**kwargs, "time": update_time})
         self.observations += 1
+        self.check_limits()
+
+    def update_columns(self, time, columns: Dict[str, Any]):
+        """Add a block of observations sharing one timestamp, columns holds a list of values per field."""
+        update_time = to_datetime(time)
+        count = len(next(iter(columns.values()), []))
+        if count == 0:
+            return
+
+        if self.file_name == "":
+            self.file_name = f"{self.name}_{int(update_time.timestamp())}"
+
+        if self.start_time is None:
+            self.start_time = datetime.now()
 
+        self.buffer.extend({"time": update_time, **columns}, count)
+        self.observations += count
+        self.check_limits()
+
+    def check_limits(self):
         if datetime.now() - self.start_time > self.time_limit:
             self.export()
             return
@@ -47,19 +94,127 @@ class Exporter:
             self.export()
             return
 
+        if self.streaming and len(self.buffer) >= self.chunk_observations:
+            self.submit(self.write_chunk, self.buffer.take(), self.file_name, self.file_chunks == 0)
+            self.file_chunks += 1
+
+    def exporting(self) -> bool:
+        return self.last_export is not None and not self.last_export.done()
+
+    def submit(self, fn, *args):
+        if self.pending is not None:
+            # nobody awaited ready() for the pending export, so wait for the one in flight here
+            logging.warning(f"[exporter] previous {self.name} export still running, waiting for it to finish")
+            self.last_export.exception()
+            self._hand_over_pending()
+
+        if self.exporting():
+            self.pending = (fn, args)
+            return
+        self._hand_over(fn, *args)
+
+    async def ready(self):
+        """Wait, without blocking the event loop, for the export in flight and hand over the pending one."""
+        if self.pending is None:
+            return
+        try:
+            await asyncio.wrap_future(self.last_export)
+        except Exception:
+            # already logged by _log_export_error
+            pass
+        self._hand_over_pending()
+
+    def _hand_over(self, fn, *args):
+        self.last_export = self.executor.submit(fn, *args)
+        self.last_export.add_done_callback(self._log_export_error)
+
+    def _hand_over_pending(self):
+        fn, args = self.pending
+        self.pending = None
+        self._hand_over(fn, *args)
+
     def export(self):
-        temp_filename = self.save_to_temporary_file()
-        self.data_frame = pd.DataFrame()
+        if self.streaming:
+            columns = self.buffer.take() if len(self.buffer) > 0 else None
+            self.submit(self.finish_stream, columns, self.file_name, self.file_chunks == 0)
+            self.file_chunks = 0
+        else:
+            self.submit(self.write_and_upload, self.buffer.take(), self.file_name)
         self.observations = 0
-        self.connector.export(temp_filename, self.name, self.file_name)
-        os.remove(temp_filename)
         self.file_name = ""
         self.start_time = datetime.now()
 
-    def save_to_temporary_file(self) -> str:
+    def write_chunk(self, columns: Dict[str, np.ndarray], file_name: str, first: bool):
+        """Runs on the export thread."""
+        if first:
+            self.stream = self.connector.open_stream(self.name, f"{file_name}.csv.gz")
+        if self.stream is None:
+            # opening or writing this file's stream failed earlier, the rest of it is dropped
+            return
+        try:
+            self.stream.write(gzip_csv_chunk(columns, header=first))
+        except Exception:
+            self.stream.abort()
+            self.stream = None
+            raise
+
+    def finish_stream(self, columns: Optional[Dict[str, np.ndarray]], file_name: str, first: bool):
+        """Runs on the export thread."""
+        if columns is not None:
+            self.write_chunk(columns, file_name, first)
+        self.close_stream()
+
+    def close_stream(self):
+        """Runs on the export thread."""
+        if self.stream is None:
+            return
+        stream, self.stream = self.stream, None
+        try:
+            stream.close()
+        except Exception:
+            stream.abort()
+            raise
+
+    def write_and_upload(self, columns: Dict[str, np.ndarray], file_name: str):
+        """Runs on the export thread."""
+        temp_filename = self.save_to_temporary_file(columns)
+        try:
+            self.connector.export(temp_filename, self.name, file_name)
+        finally:
+            os.remove(temp_filename)
+
+    def _log_export_error(self, future: Future):
+        if future.exception() is not None:
+            logging.error(f"[exporter] failed to export {self.name}: {future.exception()}")
+
+    def wait(self):
+        """Block until every export handed over so far has been written and uploaded."""
+        if self.pending is not None:
+            self.last_export.exception()
+            self._hand_over_pending()
+        if self.last_export is not None:
+            # exports run one at a time in order, so the last one finishing means they all have
+            self.last_export.exception()
+
+    def close(self):
+        """Export whatever is buffered and wait for all exports to finish."""
+        if self.observations > 0:
+            self.export()
+        self.wait()
+        self.executor.shutdown(wait=True)
+
+    def save_to_temporary_file(self, columns: Dict[str, np.ndarray]) -> str:
+        if self.file_format == NPZ_FORMAT:
+            with tempfile.NamedTemporaryFile(mode='wb', suffix='.npz', delete=False) as temp_file:
+                temp_filename = temp_file.name
+                write_npz(temp_file, columns)
+                print(f"Temporary file created: {temp_filename}")
+
+            return temp_filename
+
         with tempfile.NamedTemporaryFile(mode='w+', suffix='.csv', delete=False) as temp_file:
             temp_filename = temp_file.name  # Get the filename
-            self.data_frame.to_csv(temp_file, index=False)  # Write DataFrame to CSV
+            write_csv(temp_file, columns)  # Write the columns as CSV
             temp_file.seek(0)  # Move to the beginning of the file
             print(f"Temporary file created: {temp_filename}")
 
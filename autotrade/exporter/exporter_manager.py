@@ -1,6 +1,6 @@
 import asyncio
 import threading
-from typing import Dict
+from typing import Dict, Optional
 
 from autotrade.exporter.exporter import Exporter
 
@@ -8,6 +8,8 @@ class ExporterManager:
     def __init__(self, enabled: bool = True):
         self.exporters : Dict[str, Exporter] = {}
         self.threads = 1
+        # observations handled per wake up before yielding, exporting is never urgent
+        self.batch_size = 1000
         self.started = False
         self.enabled = enabled
         pass
@@ -23,36 +25,71 @@ class ExporterManager:
             print(f"{self.name} queue full")
             pass
 
+    def add_observations(self, metric_name: str, time, columns: Dict[str, list]):
+        """
+        Queue a block of observations sharing one timestamp, e.g. every level of an L2 update,
+        as a single item. columns maps each field to its list of values.
+        """
+        if not self.enabled:
+            return
+        if not self.started:
+            return
+        try:
+            self.queue.put_nowait({"metric_name": metric_name, "time": time, "columns": columns})
+        except asyncio.QueueFull:
+            print(f"{metric_name} queue full")
+            pass
+
     async def _handle_update(self):
         while True:
-            try:
-                kwargs = self.queue.get_nowait()
-                self.update_exporter(**kwargs)
+            kwargs = await self.queue.get()
+            exporter = self.update_exporter(**kwargs)
+            self.queue.task_done()
+            if exporter is not None and exporter.pending is not None:
+                # an export is due while the last is still running, wait for it without blocking the loop
+                await exporter.ready()
+
+            for _ in range(self.batch_size - 1):
+                try:
+                    kwargs = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                exporter = self.update_exporter(**kwargs)
                 self.queue.task_done()
+                if exporter is not None and exporter.pending is not None:
+                    await exporter.ready()
 
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.1)
-                continue
+            # let the trading path run between batches when there is a backlog
+            await asyncio.sleep(0)
 
 
-    def update_exporter(self, **kwargs):
+    def update_exporter(self, **kwargs) -> Optional[Exporter]:
         metric_name = kwargs.get("metric_name")
-        if self.exporters.get(metric_name) is not None:
-            self.exporters[metric_name].update_dataframe(**kwargs)
-            return
+        exporter = self.exporters.get(metric_name)
+        if exporter is not None:
+            if "columns" in kwargs:
+                exporter.update_columns(kwargs["time"], kwargs["columns"])
+                return exporter
+            exporter.update_dataframe(**kwargs)
+            return exporter
         
         print(f"Exporter for metric {metric_name} not found")
+        return None
 
     def add_exporter(self, metric_name: str, exporter: Exporter):
         self.exporters[metric_name] = exporter
         pass
 
+    def close(self):
+        """Flush every exporter and wait for their uploads to finish."""
+        for exporter in self.exporters.values():
+            exporter.close()
+
     async def start(self):
         if not self.enabled:
             return
         self.started = True
-        loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=400000, loop=loop)
+        self.queue = asyncio.Queue(maxsize=400000)
         consumers = [asyncio.create_task(self._handle_update()) for i in range(self.threads)]
         await asyncio.gather(*consumers)
 
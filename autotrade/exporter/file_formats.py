@@ -0,0 +1,49 @@
+import gzip
+from typing import IO, Dict
+
+import numpy as np
+import pandas as pd
+
+CSV_FORMAT = "csv"
+# compressed numpy archive with one typed array per column, time stored as int64 unix nanoseconds
+NPZ_FORMAT = "npz"
+
+FILE_FORMATS = (CSV_FORMAT, NPZ_FORMAT)
+
+
+def to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """DataFrame of columns taken from a ColumnBuffer, datetimes as UTC."""
+    return pd.DataFrame({
+        name: pd.to_datetime(column, utc=True) if column.dtype.kind == "M" else column
+        for name, column in columns.items()
+    })
+
+
+def write_csv(file: IO[str], columns: Dict[str, np.ndarray]):
+    to_frame(columns).to_csv(file, index=False)
+
+
+def gzip_csv_chunk(columns: Dict[str, np.ndarray], header: bool) -> bytes:
+    """
+    One gzip member of CSV rows. Members written one after another form a valid .csv.gz, so
+    only the first chunk of a file carries the header.
+    """
+    return gzip.compress(to_frame(columns).to_csv(index=False, header=header).encode())
+
+
+def write_npz(file: IO[bytes], columns: Dict[str, np.ndarray]):
+    typed = {}
+    for name, column in columns.items():
+        if column.dtype.kind == "M":
+            typed[name] = column.astype("datetime64[ns]").view(np.int64)
+        elif column.dtype == object:
+            # fixed width unicode so the archive loads without pickling
+            typed[name] = column.astype(str)
+        else:
+            typed[name] = column
+    np.savez_compressed(file, **typed)
+
+
+def read_npz(file_path: str) -> Dict[str, np.ndarray]:
+    with np.load(file_path, allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
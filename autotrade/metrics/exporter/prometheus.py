@@ -36,6 +36,7 @@ class PrometheusExporter():
         self.guage_action_volume = MemoryGauge("action_volume", "volume of the action taken", labelnames=["product"], store_history=store_history)
         self.guage_action_value = MemoryGauge("action_value", "value of the action taken", labelnames=["product"], store_history=store_history)
 
+        self.counter_coalesced_events = Counter("coalesced_events", "events replaced by a newer value before being handled", labelnames=["product", "event_type"])
         self.summary_recieved_messages = Summary("recieved_messages", "summary of websocket messages recieved", labelnames=["product", "channel"])
         pass
 
@@ -1,5 +1,4 @@
 from collections import deque
-import dateutil.parser
 import datetime
 import asyncio
 
@@ -10,13 +9,16 @@ from autotrade.metrics.exporter.prometheus import PrometheusExporter
 from autotrade.exporter.exporter_manager import exporter_manager
 from autotrade.events.events import Events
 from autotrade.events.event_types import EventType
+from autotrade.utils.utils import to_datetime
+from autotrade.utils.clock import Clock, wall_clock
 
 class MarketPrice(MetricValue):
-    def __init__(self, product: str, metrics_exporter: PrometheusExporter, events: Events):
+    def __init__(self, product: str, metrics_exporter: PrometheusExporter, events: Events, clock: Clock = wall_clock):
         super().__init__()
         self.product = product
         self.metrics_exporter = metrics_exporter
         self.events = events
+        self.clock = clock
         self.value = PriceMetrics()
         self.value_lock = asyncio.Lock()
         self.long_buffer = TimeBuffer(capacity=1000000, max_age=600)  # Buffer to store the last 1000 prices for averaging
@@ -30,12 +32,12 @@ class MarketPrice(MetricValue):
     async def update(self, queue_depth: int, **kwargs):
         async with self.value_lock:
             price = kwargs["price"]
-            update_time = dateutil.parser.parse(kwargs.get("time"))
+            update_time = to_datetime(kwargs.get("time"))
             recieved_time = kwargs.get("recieved")
 
-            now = datetime.datetime.now(tz=datetime.timezone.utc)
-            recieved_lag = now.microsecond - recieved_time
-            update_lag = (now - update_time).microseconds
+            # queue lag is wall time spent in our queues, update lag is measured against the clock
+            recieved_lag = datetime.datetime.now().microsecond - recieved_time
+            update_lag = (self.clock.now() - update_time).microseconds
 
             exporter_manager.add_observation(**{"metric_name": "market_price", "time": kwargs.get("time"), "value": price})
 
@@ -43,10 +45,12 @@ class MarketPrice(MetricValue):
             self.short_buffer.push(price, update_time)
             self.atr_buffer.append(price)
 
-            self.value.price = price
-            self.value.long_moving_average = self.long_buffer.get_average(update_time) 
-            self.value.short_moving_average = self.short_buffer.get_average(update_time)  
-            self.value.average_true_range = self._calc_atr()
+            self.value = PriceMetrics(
+                price=price,
+                long_moving_average=self.long_buffer.get_average(update_time),
+                short_moving_average=self.short_buffer.get_average(update_time),
+                average_true_range=self._calc_atr(),
+            )
 
             self.metrics_exporter.guage_market_price.set(self.value.price, [self.product], update_time)
             self.metrics_exporter.guage_market_price_long_moving_average.set(self.value.long_moving_average, [self.product], update_time)
@@ -1,149 +1,100 @@
-import dateutil.parser
 import datetime
 import asyncio
-import numpy as np
+from typing import List, Union
 
 from autotrade.types.order_metrics import OrderMetrics
+from autotrade.types.order_book import OrderBook
 from autotrade.metrics.metric_values.main import MetricValue
 from autotrade.metrics.exporter.prometheus import PrometheusExporter
-from autotrade.settings.config import config
+from autotrade.settings.config import ConfigGetter, config
 from autotrade.exporter.exporter_manager import exporter_manager
 from autotrade.events.events import Events
 from autotrade.events.event_types import EventType
+from autotrade.types.market_data import L2Update
+from autotrade.utils.utils import to_datetime
+from autotrade.utils.clock import Clock, wall_clock
 
 # 2025-01-12T14:59:32.032976Z
 class Orders(MetricValue):
-    def __init__(self, product: str, tick_size: float, metrics_exporter: PrometheusExporter, events: Events):
+    def __init__(self, product: str, tick_size: float, metrics_exporter: PrometheusExporter, events: Events, clock: Clock = wall_clock, config_getter: ConfigGetter = config):
         super().__init__()
         self.product = product
         self.tick_size = tick_size  
         self.metrics_exporter = metrics_exporter
         self.events = events
+        self.clock = clock
+        # the thresholds come from the run's config, a backtest or sweep run passes its own
+        self.config_getter = config_getter
         self.value = OrderMetrics(buy_volume=0, sell_volume=0, spread=0, imbalance=0, max_buy=0, min_buy=0, max_sell=0, min_sell=0)
-        self.order_buys = {}
-        self.order_sells = {}
+        self.book = OrderBook()
         self.value_lock = asyncio.Lock()
-        self.buys_lock = asyncio.Lock()
-        self.sells_lock = asyncio.Lock()
 
     async def get_value(self) -> OrderMetrics:
         async with self.value_lock:
             return self.value
     
-    async def update_orders(self, updates, time):
-        for update in updates:
-            side=update["side"]
-            price=float(update["price_level"])
-            volume=float(update["new_quantity"])
-            # buy
-            if side == "bid":
-                exporter_manager.add_observation(**{"metric_name":"orders", "side": side, "time":time, "price": price, "volume": volume})
-                # we can delete the entry if there is zero volume
-                if volume == 0:
-                    if price in self.order_buys:
-                        async with self.buys_lock:
-                            if price == self.value.min_buy:
-                                self.value.min_buy = 0
-                            if price == self.value.max_buy:
-                                self.value.max_buy = 0
-                            del self.order_buys[price]
-                        continue
-                    continue
-                async with self.buys_lock:
-                    self.order_buys[price] = volume
-                continue
-            
-            exporter_manager.add_observation(**{"metric_name":"orders", "side": side, "time": time, "price": price, "volume": volume})
-            # we can delete the entry if there is zero volume
-            if volume == 0:
-                if price in self.order_sells:
-                    async with self.sells_lock:
-                        if price == self.value.min_sell:
-                            self.value.min_sell = 0
-                        if price == self.value.max_sell:
-                            self.value.max_sell = 0
-                        del self.order_sells[price]
-                    continue
-                continue
-            async with self.sells_lock:
-                self.order_sells[price] = volume
-            continue
+    def update_orders(self, updates: Union[L2Update, List[dict]], time):
+        if isinstance(updates, L2Update):
+            sides, prices, volumes = updates.sides, updates.prices, updates.volumes
+        else:
+            sides = [update["side"] for update in updates]
+            prices = [float(update["price_level"]) for update in updates]
+            volumes = [float(update["new_quantity"]) for update in updates]
+
+        # the whole update goes to the exporter as one block
+        exporter_manager.add_observations("orders", time, {"side": sides, "price": prices, "volume": volumes})
+
+        for side, price, volume in zip(sides, prices, volumes):
+            # a zero volume removes the level from the book
+            self.book.update(side, price, volume)
 
     
     async def update(self,  queue_depth: int, **kwargs):
         async with self.value_lock:
             # print("orders update" + str(kwargs.get("time")))
             orders = kwargs.get("order_updates")
-            update_time = dateutil.parser.parse(kwargs.get("time"))
+            update_time = to_datetime(kwargs.get("time"))
             recieved_time = kwargs.get("recieved")
 
-            self.min_buy = 0
-            self.max_buy = 0
-            self.min_sell = 0
-            self.max_sell = 0
-
-            await self.update_orders(orders, kwargs.get("time"))
+            self.update_orders(orders, kwargs.get("time"))
 
-            config_value = await config.get_config()
+            config_value = await self.config_getter.get_config()
             price_distance_threshold = config_value.price_distance_threshold
             order_size_threshold = config_value.order_size_threshold
 
-            buys = 0
-            sells = 0
-            buys_copy = {}
-            sells_copy = {}
-
-            async with self.buys_lock:    
-                buys_copy =  self.order_buys.copy()
-
-            async with self.sells_lock:    
-                sells_copy =  self.order_sells.copy()
-
-            np.percentile(list(sells_copy.values()) + list(buys_copy.values()), 50)
-
-            for k, v in buys_copy.items():
-                if k < self.value.min_buy or self.value.min_buy == 0:
-                    self.value.min_buy = k
-                if k > self.value.max_buy:
-                    self.value.max_buy = k
-            for k, v in sells_copy.items():
-                if k < self.value.min_sell or self.value.min_sell == 0:
-                    self.value.min_sell = k
-                if k > self.value.max_sell:
-                    self.value.max_sell = k
-
-            mid_price = (self.value.min_sell + self.value.max_buy) / 2
-
-            for k, v in buys_copy.items():
-                ticks_from_mid = abs(k - mid_price) / self.tick_size
-                if ticks_from_mid > price_distance_threshold:
-                    continue
-                if v > order_size_threshold:
-                    continue
-                buys += k * v
-
-            for k, v in sells_copy.items():
-                ticks_from_mid = abs(k - mid_price) / self.tick_size
-                if ticks_from_mid > price_distance_threshold:
-                    continue
-                if v > order_size_threshold:
-                    continue
-                sells += k * v
-
-            # Check for distance from mid price
+            min_buy = self.book.buys.min_price()
+            max_buy = self.book.buys.max_price()
+            min_sell = self.book.sells.min_price()
+            max_sell = self.book.sells.max_price()
+
+            mid_price = (min_sell + max_buy) / 2
+
+            # only levels within price_distance_threshold ticks of mid count towards the imbalance
+            band = price_distance_threshold * self.tick_size
+            if config_value.imbalance_mode == "incremental":
+                buys, sells = self.book.band_notional(mid_price - band, mid_price + band, order_size_threshold)
+            else:
+                buys = self.book.buys.notional_between(mid_price - band, mid_price + band, order_size_threshold)
+                sells = self.book.sells.notional_between(mid_price - band, mid_price + band, order_size_threshold)
 
             if float(buys + sells) == 0:
                 print("no orders")
+                self.value = self.value._replace(min_buy=min_buy, max_buy=max_buy, min_sell=min_sell, max_sell=max_sell)
                 return
 
-            self.value.buy_volume = buys
-            self.value.sell_volume = sells
-            self.value.imbalance = float(buys - sells) / float(buys + sells)
-            self.value.spread = self.value.min_sell - self.value.max_buy
+            self.value = OrderMetrics(
+                buy_volume=buys,
+                sell_volume=sells,
+                min_buy=min_buy,
+                max_buy=max_buy,
+                min_sell=min_sell,
+                max_sell=max_sell,
+                spread=min_sell - max_buy,
+                imbalance=float(buys - sells) / float(buys + sells),
+            )
 
-        now = datetime.datetime.now(tz=datetime.timezone.utc)
-        recieved_lag = now.microsecond - recieved_time
-        update_lag = (now - update_time).microseconds
+        recieved_lag = datetime.datetime.now().microsecond - recieved_time
+        update_lag = (self.clock.now() - update_time).microseconds
 
         self.metrics_exporter.gauge_buy_orders.labels(self.product).set(buys)
         self.metrics_exporter.gauge_sell_orders.labels(self.product).set(sells)
@@ -154,4 +105,4 @@ class Orders(MetricValue):
         # exporter_manager.add_observation(**{"metric_name":"order_buys", "time": kwargs.get("time"), "value": buys})
         # exporter_manager.add_observation(**{"metric_name":"order_sells", "time": kwargs.get("time"), "value": sells})
         self.events.trigger_event(EventType.ORDER_UPDATE, self.value)
-        self.events.trigger_event(EventType.ORDER_BOOK_UPDATE, {'buys': buys_copy, 'sells': sells_copy})
\ No newline at end of file
+        self.events.trigger_event(EventType.ORDER_BOOK_UPDATE, self.book.view())
\ No newline at end of file
@@ -5,63 +5,81 @@ from autotrade.metrics.metric_values.orders import Orders
 from autotrade.metrics.metric_values.recieved_messages import Recieved_Messages
 from autotrade.metrics.metric_values.main import MetricValue
 from autotrade.metrics.plotter.plotter import Plotter
+from autotrade.settings.config import ConfigGetter, config
 from autotrade.types.order_metrics import OrderMetrics, PriceMetrics
+from autotrade.utils.clock import Clock, wall_clock
 
 import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Deque, Union
 
 
 class Metric():
-    def __init__(self, name: str, value: MetricValue, threads: int):
+    def __init__(self, name: str, value: MetricValue, threads: int, synchronous: bool = False):
         self.name = name
         self.value = value
         self.threads = threads
+        # in synchronous mode updates wait in pending until drain() is awaited
+        self.synchronous = synchronous
+        self.pending: Deque[dict] = deque()
         pass
 
     async def _handle_update(self):
         while True:
-            try:
-                kwargs = self.queue.get_nowait()
+            # block until an update arrives, then apply everything queued behind it before waiting again
+            kwargs = await self.queue.get()
+            while True:
                 await self.value.update(self.queue.qsize(), **kwargs)
                 self.queue.task_done()
-
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.1)
-                continue
+                try:
+                    kwargs = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
 
     def update(self, **kwargs):
+        if self.synchronous:
+            self.pending.append(kwargs)
+            return
         try:
             self.queue.put_nowait(kwargs)
         except asyncio.QueueFull:
             print(f"{self.name} queue full")
             pass
 
+    async def drain(self):
+        while self.pending:
+            kwargs = self.pending.popleft()
+            await self.value.update(len(self.pending), **kwargs)
+
     async def get_value(self):
         return await self.value.get_value()
 
     async def start(self):
+        if self.synchronous:
+            return
         print(f"Starting metric {self.name}")
-        loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=400000, loop=loop)
+        self.queue = asyncio.Queue(maxsize=400000)
         consumers = [asyncio.create_task(self._handle_update()) for i in range(self.threads)]
         await asyncio.gather(*consumers)
 
 
 
 class Metrics():
-    def __init__(self, product: str, metrics_exporter: PrometheusExporter, events: Events):
+    def __init__(self, product: str, metrics_exporter: PrometheusExporter, events: Events, clock: Clock = wall_clock, synchronous: bool = False, config_getter: ConfigGetter = config):
         self.product = product
         self.metrics_exporter = metrics_exporter
-        self.orders = Metric("orders", Orders(product,0.01, metrics_exporter, events), 1)
-        self.market_price = Metric("price", MarketPrice(product, metrics_exporter, events), 1)
-        self.recieved_messages = Metric("message_info", Recieved_Messages(product, metrics_exporter), 1)
+        self.orders = Metric("orders", Orders(product,0.01, metrics_exporter, events, clock, config_getter), 1, synchronous)
+        self.market_price = Metric("price", MarketPrice(product, metrics_exporter, events, clock), 1, synchronous)
+        self.recieved_messages = Metric("message_info", Recieved_Messages(product, metrics_exporter), 1, synchronous)
 
-    def update_order(self, order_updates, time: str, recieved: int):
+    def update_order(self, order_updates, time: Union[str, datetime], recieved: int):
         self.orders.update(**{"order_updates":order_updates, "time":time, "recieved": recieved})
 
     async def get_order_metrics(self) -> OrderMetrics:
         return await self.orders.get_value()
 
-    def update_market_price(self, price: float, time: str, recieved: int):
+    def update_market_price(self, price: float, time: Union[str, datetime], recieved: int):
         self.market_price.update(**{"price":price, "time":time, "recieved": recieved})
 
     async def get_price_metrics(self) -> PriceMetrics:
@@ -70,13 +88,20 @@ class Metrics():
     def update_recieved_messages(self, channel: str, update_count: int):
         self.recieved_messages.update(**{"channel": channel, "update_count": update_count})
 
+    async def drain(self):
+        """Synchronous mode: apply every pending update."""
+        await self.orders.drain()
+        await self.market_price.drain()
+        await self.recieved_messages.drain()
+
     async def start(self):
         await asyncio.gather(self.orders.start(), self.market_price.start(), self.recieved_messages.start())
 
 class MetricsManager():
-    def __init__(self, product: str, events: Events, store_history: bool):
+    def __init__(self, product: str, events: Events, store_history: bool, clock: Clock = wall_clock, synchronous: bool = False, config_getter: ConfigGetter = config):
         self.metrics_exporter = PrometheusExporter(store_history=store_history)
-        self.metrics = Metrics(product, self.metrics_exporter, events)
+        self.metrics = Metrics(product, self.metrics_exporter, events, clock, synchronous, config_getter)
+        self.plotter = None
 
         if store_history:
             self.plotter = Plotter(product)
@@ -85,10 +110,10 @@ class MetricsManager():
             self.plotter.add_plot(self.metrics_exporter.guage_market_price_long_moving_average.get_values, 'r')
 
 
-    def update_order(self, order_updates, time: str, recieved: int):
+    def update_order(self, order_updates, time: Union[str, datetime], recieved: int):
         self.metrics.update_order(order_updates, time, recieved)
 
-    def update_market_price(self, price: float, time: str, recieved: int):
+    def update_market_price(self, price: float, time: Union[str, datetime], recieved: int):
         self.metrics.update_market_price(price, time, recieved)
 
     def update_recieved_messages(self, channel: str, update_count: int):
@@ -97,6 +122,9 @@ class MetricsManager():
     def start_metrics_exporter(self):
         self.metrics_exporter.start()
 
+    async def drain(self):
+        await self.metrics.drain()
+
     async def start(self):
         await self.metrics.start()
 
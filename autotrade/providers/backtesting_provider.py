@@ -1,91 +1,212 @@
 from abc import ABC, abstractmethod
+import copy
 from typing import Callable
 import asyncio
 from datetime import datetime, timedelta, timezone
 import os
+import math
+import numpy as np
 import pandas as pd
 import json
 import logging
-from typing import Dict
+from typing import Awaitable, Dict, List, Optional, Tuple, Union
+
+from autotrade.exporter.file_formats import read_npz
+from autotrade.types.market_data import L2Update, TickerUpdate
+from autotrade.utils.clock import SimulatedClock
 
 pd.options.mode.copy_on_write = True
 
 
+def to_unix_nanos(time: datetime) -> int:
+    return pd.Timestamp(time).value
+
+
+def unix_nanos_column(column: pd.Series) -> np.ndarray:
+    return pd.DatetimeIndex(column).as_unit('ns').asi8
+
+
+def to_message(update: Union[TickerUpdate, L2Update]) -> str:
+    """Encode an update the way the coinbase websocket would deliver it."""
+    if isinstance(update, TickerUpdate):
+        dict_out = {"channel": "ticker", "events": [{"tickers": [{"price": str(update.price)}]}]}
+    else:
+        order_updates = []
+        for side, price, volume in zip(update.sides, update.prices, update.volumes):
+            order_updates.append({"side": side, "price_level": str(price), "new_quantity": str(volume)})
+        dict_out = {"channel": "l2_data", "events": [{"type": "snapshot", "updates": order_updates}]}
+
+    dict_out["timestamp"] = update.time.isoformat()
+    return json.dumps(dict_out)
+
+
+def from_unix_nanos(nanos: int) -> pd.Timestamp:
+    return pd.Timestamp(int(nanos), tz='UTC')
+
+
+def first_cursor(times: np.ndarray) -> int:
+    """Cursor for a freshly loaded file, rows at the very first timestamp count as already replayed."""
+    return int(np.searchsorted(times, times[0], side='right')) if len(times) else 0
+
+
+def encode_sides(column: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """Sorted distinct side names and the index of each row's side into them."""
+    names, codes = np.unique(np.asarray(column).astype(str), return_inverse=True)
+    return names.tolist(), codes.astype(np.int8)
+
+
+def load_time_sorted(file_path: str) -> pd.DataFrame:
+    data = pd.read_csv(file_path, parse_dates=['time'], index_col=None)
+    data.sort_values(by='time', inplace=True, kind='stable')
+    data.reset_index(drop=True, inplace=True)
+    return data
+
+
+def load_columns(file_path: str) -> Dict[str, np.ndarray]:
+    """
+    The columns of an exported csv (optionally gzipped) or npz file sorted by time, with time as int64 unix nanoseconds.
+    npz files are already typed so they skip the csv and date parsing entirely.
+    """
+    if file_path.endswith('.npz'):
+        columns = read_npz(file_path)
+        order = np.argsort(columns['time'], kind='stable')
+        return {name: column[order] for name, column in columns.items()}
+
+    data = load_time_sorted(file_path)
+    columns = {name: data[name].to_numpy() for name in data.columns if name != 'time'}
+    columns['time'] = unix_nanos_column(data['time'])
+    return columns
+
+
 class BacktestingMarketPrice:
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self.data: pd.DataFrame = pd.DataFrame()
         self.current_time: datetime
         self.start_time: datetime
+        # rows are sorted by time, rows before the cursor have already been replayed
+        self.times: np.ndarray = np.empty(0, dtype=np.int64)
+        self.values: np.ndarray = np.empty(0)
+        self.cursor = 0
+
+    @classmethod
+    def from_columns(cls, file_path: str, times: np.ndarray, values: np.ndarray) -> "BacktestingMarketPrice":
+        """Build from already parsed, time sorted columns, which may be memory mapped."""
+        file = cls(file_path)
+        file.set_columns(times, values)
+        return file
 
     def load_data(self):
-        self.data = pd.read_csv(self.file_path, parse_dates=['time'], index_col=None)
-        self.data.sort_values(by='time', inplace=True)
-        self.start_time = self.data['time'].min()
-        self.current_time = self.data['time'].min()
-        self.end_time = self.data['time'].max()
+        columns = load_columns(self.file_path)
+        self.set_columns(columns['time'], columns['value'])
         print("loaded file", self.file_path, "start", self.start_time, "end", self.end_time, "current", self.current_time)
 
-    def get_next_values(self, time: datetime) -> tuple[str, bool]:
+    def set_columns(self, times: np.ndarray, values: np.ndarray):
+        self.times = times
+        self.values = values
+        self.start_time = from_unix_nanos(times[0])
+        self.current_time = self.start_time
+        self.end_time = from_unix_nanos(times[-1])
+        self.cursor = first_cursor(times)
+
+    def rewound(self) -> "BacktestingMarketPrice":
+        """Copy sharing the loaded columns with the cursor back at the start of the file."""
+        return rewind(self)
+
+    def get_next_update(self, time: datetime) -> tuple[TickerUpdate, bool]:
         if time > self.end_time:
             return None, True
 
-        filtered = self.data[(self.data['time'] > self.current_time) & (self.data['time'] <= time)]
-        if filtered.empty:
+        end = int(np.searchsorted(self.times, to_unix_nanos(time), side='right'))
+        if end <= self.cursor:
             return None, False
         
-        self.current_time = filtered['time'].max()
-        
-        filtered.sort_values(by='time', inplace=True, ascending=False)
+        self.cursor = end
+        self.current_time = from_unix_nanos(self.times[end - 1])
         
-        price = filtered['value'].iloc[0]
+        # the latest price in the window
+        return TickerUpdate(price=float(self.values[end - 1]), time=time), False
 
-        dict_out = {"channel": "ticker", "events": [{"tickers": []}]}
-        
-        dict_out["events"][0]["tickers"].append({"price": str(price)})
-        dict_out["timestamp"] = time.isoformat()
-        
-        return json.dumps(dict_out), False
+    def get_next_values(self, time: datetime) -> tuple[str, bool]:
+        update, end = self.get_next_update(time)
+        if update is None:
+            return None, end
+        return to_message(update), end
 
 class BacktestingFileOrders:
     def __init__(self, file_path: str):
         self.file_path = file_path
-        self.data: pd.DataFrame = pd.DataFrame()
         self.current_time: datetime
         self.start_time: datetime
+        # rows are sorted by time, rows before the cursor have already been replayed
+        self.times: np.ndarray = np.empty(0, dtype=np.int64)
+        # sides are stored as indexes into the sorted side_names
+        self.side_codes: np.ndarray = np.empty(0, dtype=np.int8)
+        self.side_names: List[str] = []
+        self.prices: np.ndarray = np.empty(0)
+        self.volumes: np.ndarray = np.empty(0)
+        self.cursor = 0
+
+    @classmethod
+    def from_columns(cls, file_path: str, times: np.ndarray, side_codes: np.ndarray, side_names: List[str], prices: np.ndarray, volumes: np.ndarray) -> "BacktestingFileOrders":
+        """Build from already parsed, time sorted columns, which may be memory mapped."""
+        file = cls(file_path)
+        file.set_columns(times, side_codes, side_names, prices, volumes)
+        return file
     
     def load_data(self):
-        self.data =  pd.read_csv(self.file_path, parse_dates=['time'], index_col=None)
-        self.data.sort_values(by='time', inplace=True)
-        self.start_time = self.data['time'].min()
-        self.current_time = self.data['time'].min()
-        self.end_time = self.data['time'].max()
+        columns = load_columns(self.file_path)
+        side_names, side_codes = encode_sides(columns['side'])
+        self.set_columns(columns['time'], side_codes, side_names, columns['price'], columns['volume'])
         print("loaded file", self.file_path, "start", self.start_time, "end", self.end_time, "current", self.current_time)
 
-    def get_next_values(self, time: datetime) -> tuple[str, bool]:
+    def set_columns(self, times: np.ndarray, side_codes: np.ndarray, side_names: List[str], prices: np.ndarray, volumes: np.ndarray):
+        self.times = times
+        self.side_codes = side_codes
+        self.side_names = side_names
+        self.prices = prices
+        self.volumes = volumes
+        self.start_time = from_unix_nanos(times[0])
+        self.current_time = self.start_time
+        self.end_time = from_unix_nanos(times[-1])
+        self.cursor = first_cursor(times)
+
+    def rewound(self) -> "BacktestingFileOrders":
+        """Copy sharing the loaded columns with the cursor back at the start of the file."""
+        return rewind(self)
+
+    def get_next_update(self, time: datetime) -> tuple[L2Update, bool]:
         if time > self.end_time:
             return None, True
         
-        filtered = self.data[(self.data['time'] > self.current_time) & (self.data['time'] <= time)]
-        if filtered.empty:
+        start = self.cursor
+        end = int(np.searchsorted(self.times, to_unix_nanos(time), side='right'))
+        if end <= start:
             self.current_time = time
             return None, False
         
-        self.current_time = filtered['time'].max()
-        
-        dict_out = {"channel": "l2_data", "events":[{"type": "snapshot"}]}
-        filtered = filtered.groupby(['price', 'side']).agg({'volume': 'sum'}).reset_index()
-        
+        self.cursor = end
+        self.current_time = from_unix_nanos(self.times[end - 1])
 
-        order_updates = []
+        # sum the volume per (price, side) over the rows in the window
+        volumes = {}
+        for side, price, volume in zip(self.side_codes[start:end].tolist(), self.prices[start:end].tolist(), self.volumes[start:end].tolist()):
+            volumes.setdefault((price, side), []).append(volume)
 
-        for index, row in filtered.iterrows():
-            order_updates.append({"side": row['side'], "price_level": str(row['price']), "new_quantity": str(row['volume'])})
+        update = L2Update(sides=[], prices=[], volumes=[], time=time, is_snapshot=True)
 
-        dict_out["events"][0]["updates"] = order_updates
-        dict_out["timestamp"] = time.isoformat()
-        
-        return json.dumps(dict_out), False
+        # side codes sort in the same order as the side names
+        for price, side in sorted(volumes):
+            update.sides.append(self.side_names[side])
+            update.prices.append(price)
+            update.volumes.append(math.fsum(volumes[(price, side)]))
+
+        return update, False
+
+    def get_next_values(self, time: datetime) -> tuple[str, bool]:
+        update, end = self.get_next_update(time)
+        if update is None:
+            return None, end
+        return to_message(update), end
 
 class BacktestingFile:
     def __init__(self, file_path: str, current_time: datetime):
@@ -95,59 +216,146 @@ class BacktestingFile:
     def load_data(self):
         pass
 
+    @abstractmethod
+    def get_next_update(self, time: datetime) -> tuple[Union[TickerUpdate, L2Update], bool]:
+        pass
+
     @abstractmethod
     def get_next_values(self, time: datetime) -> str:
         pass
 
-class BacktestingProvider:
-    def __init__(self, start_time: datetime, end_time: datetime, interval: timedelta, real_time_factor: float, folder_path: str, on_message: Callable):
-        self.start_time = start_time
-        self.end_time = end_time
-        self.interval = interval
-        self.current_time = start_time
-        self.folder_path = folder_path
-        self.data = []
-        self.current_files: Dict[str, BacktestingFile] = {}
-        self.files: Dict[str, str] = {}
-        self.on_message = on_message
-        self.real_time_factor = real_time_factor
+    @abstractmethod
+    def rewound(self) -> "BacktestingFile":
+        pass
 
-    def prepare_files(self):
-        # Load data from files in the folder_path
 
-        file_prefixes = ['market_price', 'orders']
-       
-        files = os.listdir(self.folder_path)
-        for file in files:
-            if not file.endswith('.csv'):
-                continue
-            metric_type = ""
+FILE_PREFIXES = ['market_price', 'orders']
+# when a period was exported in several formats the first of these is replayed, fastest to load first
+FILE_EXTENSIONS = ['.npz', '.csv', '.csv.gz']
 
-            for prefix in file_prefixes:
-                if file.startswith(prefix):
-                    metric_type = prefix
-                    break
 
-            if metric_type == "":
-                continue
+def extension_rank(file: str) -> int:
+    return next(rank for rank, extension in enumerate(FILE_EXTENSIONS) if file.endswith(extension))
 
-            unix_time = file.split(f"{metric_type}_")[1].split(".")[0]
 
-            if len(unix_time) != 10:
-                continue
+def find_backtest_files(folder_path: str, start_time: datetime) -> Dict[str, Dict[datetime, str]]:
+    """Exported files in folder_path starting at or after start_time, by metric type and file start time."""
+    files = {}
 
-            start_time = datetime.fromtimestamp(int(unix_time), tz=timezone.utc)
+    for file in os.listdir(folder_path):
+        if not file.endswith(tuple(FILE_EXTENSIONS)):
+            continue
+        metric_type = ""
 
-            if start_time < self.start_time:
-                continue
+        for prefix in FILE_PREFIXES:
+            if file.startswith(prefix):
+                metric_type = prefix
+                break
+
+        if metric_type == "":
+            continue
+
+        unix_time = file.split(f"{metric_type}_")[1].split(".")[0]
+
+        if len(unix_time) != 10:
+            continue
+
+        file_start_time = datetime.fromtimestamp(int(unix_time), tz=timezone.utc)
+
+        if file_start_time < start_time:
+            continue
+
+        if metric_type not in files:
+            files[metric_type] = {}
+
+        # pick by FILE_EXTENSIONS rather than by the order the folder happens to list the files in
+        existing = files[metric_type].get(file_start_time)
+        if existing is not None and extension_rank(existing) <= extension_rank(file):
+            continue
+
+        files[metric_type][file_start_time] = os.path.join(folder_path, file)
+
+    return files
+
+
+def load_backtest_file(metric_type: str, file_path: str) -> BacktestingFile:
+    if metric_type == 'market_price':
+        file = BacktestingMarketPrice(file_path)
+    else:
+        file = BacktestingFileOrders(file_path)
+
+    file.load_data()
+    return file
+
+
+def rewind(file: BacktestingFile) -> BacktestingFile:
+    rewound = copy.copy(file)
+    rewound.cursor = first_cursor(file.times)
+    rewound.current_time = file.start_time
+    return rewound
+
+
+class BacktestDataset:
+    """
+    Every exported file in a folder parsed once up front. Providers built with the dataset
+    replay rewound copies of the loaded files, so the CSVs are not read again per backtest.
+    """
+
+    def __init__(self, folder_path: str, start_time: datetime):
+        self.folder_path = folder_path
+        self.start_time = start_time
+        self.files: Dict[str, Dict[datetime, BacktestingFile]] = {}
 
-            filepath = os.path.join(self.folder_path, file)
+    def load(self) -> "BacktestDataset":
+        for metric_type, paths in find_backtest_files(self.folder_path, self.start_time).items():
+            self.files[metric_type] = {start_time: load_backtest_file(metric_type, path) for start_time, path in paths.items()}
+        return self
 
-            if metric_type not in self.files:
-                self.files[metric_type] = {}
+    def file_paths(self, start_time: datetime) -> Dict[str, Dict[datetime, str]]:
+        """Same shape as find_backtest_files, for the loaded files starting at or after start_time."""
+        return {
+            metric_type: {file_start: file.file_path for file_start, file in files.items() if file_start >= start_time}
+            for metric_type, files in self.files.items()
+        }
 
-            self.files[metric_type][start_time] = filepath
+    def get_file(self, metric_type: str, start_time: datetime) -> BacktestingFile:
+        return self.files[metric_type][start_time].rewound()
 
+class BacktestingProvider:
+    def __init__(self, start_time: datetime, end_time: datetime, interval: timedelta, real_time_factor: Optional[float], folder_path: str, on_message: Callable, on_event: Optional[Callable] = None, clock: Optional[SimulatedClock] = None, dataset: Optional["BacktestDataset"] = None):
+        """
+        on_message receives each update JSON encoded like the coinbase websocket would send it.
+        When on_event is set updates are delivered to it directly as TickerUpdate / L2Update
+        instead, skipping the encode / decode round trip.
+
+        When a clock is given it is advanced to the replayed time as the backtest progresses.
+        A real_time_factor of None runs the replay as fast as possible instead of sleeping
+        interval / real_time_factor between steps.
+
+        A preloaded dataset replaces reading the files in folder_path, so repeated backtests
+        over the same data only parse it once.
+        """
+        self.start_time = start_time
+        self.end_time = end_time
+        self.interval = interval
+        self.current_time = start_time
+        self.folder_path = folder_path
+        self.data = []
+        self.current_files: Dict[str, BacktestingFile] = {}
+        self.files: Dict[str, Dict[datetime, str]] = {}
+        self.on_message = on_message
+        self.on_event = on_event
+        self.real_time_factor = real_time_factor
+        self.clock = clock
+        self.dataset = dataset
+        # set once a metric runs out of files
+        self.finished = False
+
+    def prepare_files(self):
+        if self.dataset is not None:
+            self.files = self.dataset.file_paths(self.start_time)
+            return
+        self.files = find_backtest_files(self.folder_path, self.start_time)
 
     def get_next_file_for_metric(self, metric_type: str) -> BacktestingFile:
         matched_date = None
@@ -161,14 +369,11 @@ class BacktestingProvider:
         
         if matched_file == "":
             return None
-        
-        if metric_type == 'market_price':
-            file = BacktestingMarketPrice(matched_file)
-        else:
-            file = BacktestingFileOrders(matched_file)
 
-        file.load_data()
-        return file
+        if self.dataset is not None:
+            return self.dataset.get_file(metric_type, matched_date)
+
+        return load_backtest_file(metric_type, matched_file)
     
     def initialise_files(self):
         min_start_time = None
@@ -182,26 +387,30 @@ class BacktestingProvider:
                 
         logging.info("setting start time to " + str(min_start_time))
         self.current_time = min_start_time
+        if self.clock:
+            self.clock.advance_to(self.current_time)
     
-    def get_next_event(self):
+    def get_next_event(self) -> Union[TickerUpdate, L2Update, None]:
         for metric_type in ['market_price', 'orders']:
             if metric_type not in self.current_files:
                 current_file = self.get_next_file_for_metric(metric_type)
                 if not current_file:
                     print(f"No more data for {metric_type} at {self.current_time + self.interval}")
+                    self.finished = True
                     return None
                 self.current_files[metric_type] = current_file
-            data, end = self.current_files[metric_type].get_next_values(self.current_time + self.interval)
+            data, end = self.current_files[metric_type].get_next_update(self.current_time + self.interval)
             while end:
                 print("trying to get next file for metric:", metric_type)
                 current_file = self.get_next_file_for_metric(metric_type)
                 if not current_file:
                     print(f"No more data for {metric_type} at {self.current_time + self.interval}")
+                    self.finished = True
                     return None
                 
                 self.current_files[metric_type] = current_file
                 
-                data, end = self.current_files[metric_type].get_next_values(self.current_time + self.interval)
+                data, end = self.current_files[metric_type].get_next_update(self.current_time + self.interval)
 
             if data is not None:
                 return data
@@ -219,15 +428,47 @@ class BacktestingProvider:
         # print(f"Current time: {self.current_time.isoformat()}")
         event = self.get_next_event()
         if event is not None:
-            self.on_message(event)
+            if self.clock:
+                self.clock.advance_to(event.time)
+            if self.on_event is not None:
+                self.on_event(event)
+            else:
+                self.on_message(to_message(event))
             return
         self.current_time = self.current_time + self.interval
+        if self.clock:
+            self.clock.advance_to(self.current_time)
+
+        if not self.real_time_factor:
+            # unthrottled, just give the rest of the loop a chance to run
+            await asyncio.sleep(0)
+            return
         await asyncio.sleep(self.interval.total_seconds()/self.real_time_factor)
 
     async def _run_interval_loop(self):
         while True:
             await self._do_one_iteration()
 
+    async def replay(self, on_event: Callable[[Union[TickerUpdate, L2Update]], Awaitable[None]]):
+        """
+        Run the whole backtest without sleeping, awaiting on_event for each update before the
+        next one is read. Returns once the data or the end_time is reached.
+        """
+        self.prepare_files()
+        self.initialise_files()
+
+        while not self.finished and (self.end_time is None or self.current_time < self.end_time):
+            event = self.get_next_event()
+            if event is None:
+                self.current_time = self.current_time + self.interval
+                if self.clock:
+                    self.clock.advance_to(self.current_time)
+                continue
+
+            if self.clock:
+                self.clock.advance_to(event.time)
+            await on_event(event)
+
 
 def get_start_time_for_file(filepath: str):
     file = BacktestingMarketPrice(filepath)
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from autotrade.providers.backtesting_provider import (
+    BacktestingFile,
+    BacktestingFileOrders,
+    BacktestingMarketPrice,
+    encode_sides,
+    find_backtest_files,
+    load_columns,
+)
+
+MANIFEST = "manifest.json"
+
+
+class MappedDataset:
+    """
+    Exported backtest data parsed once into per-column .npy files under cache_path and
+    opened memory mapped, read only. Every process that opens the same cache shares the
+    pages through the OS page cache, so memory scales with the size of the dataset rather
+    than with the number of processes replaying it.
+
+    Has the same file_paths / get_file interface as BacktestDataset. Pickling only sends the
+    cache path, the receiving process maps the columns itself.
+    """
+
+    def __init__(self, folder_path: str, cache_path: str, entries: List[dict]):
+        self.folder_path = folder_path
+        self.cache_path = cache_path
+        self.entries: Dict[str, Dict[datetime, dict]] = {}
+        self.files: Dict[str, Dict[datetime, BacktestingFile]] = {}
+
+        for entry in entries:
+            start_time = datetime.fromtimestamp(entry["start_time"], tz=timezone.utc)
+            self.entries.setdefault(entry["metric_type"], {})[start_time] = entry
+
+    @classmethod
+    def build(cls, folder_path: str, start_time: datetime, cache_path: str) -> "MappedDataset":
+        """
+        Parse the exported files in folder_path into cache_path, skipping files whose columns
+        are already cached and newer than the export, and open the result.
+        """
+        os.makedirs(cache_path, exist_ok=True)
+        cached = {entry["file_path"]: entry for entry in read_manifest(cache_path)}
+        entries = []
+
+        for metric_type, paths in find_backtest_files(folder_path, start_time).items():
+            for file_start, file_path in paths.items():
+                entry = cached.get(file_path)
+                if entry is None or entry["source_mtime"] < os.path.getmtime(file_path):
+                    entry = write_columns(metric_type, file_start, file_path, cache_path)
+                entries.append(entry)
+
+        # keep entries for files before start_time so a later build with an earlier start can reuse them,
+        # but not ones for a period a fresh entry covers, e.g. the csv export of a period now also in npz
+        covered = {(entry["metric_type"], entry["start_time"]) for entry in entries}
+        entries.extend(entry for path, entry in cached.items() if (entry["metric_type"], entry["start_time"]) not in covered and os.path.exists(path))
+
+        with open(os.path.join(cache_path, MANIFEST), "w") as f:
+            json.dump(entries, f)
+
+        return cls(folder_path, cache_path, entries)
+
+    @classmethod
+    def open(cls, folder_path: str, cache_path: str) -> "MappedDataset":
+        return cls(folder_path, cache_path, read_manifest(cache_path))
+
+    def __reduce__(self):
+        return (MappedDataset.open, (self.folder_path, self.cache_path))
+
+    def file_paths(self, start_time: datetime) -> Dict[str, Dict[datetime, str]]:
+        """Same shape as find_backtest_files, for the cached files starting at or after start_time."""
+        return {
+            metric_type: {file_start: entry["file_path"] for file_start, entry in entries.items() if file_start >= start_time}
+            for metric_type, entries in self.entries.items()
+        }
+
+    def get_file(self, metric_type: str, start_time: datetime) -> BacktestingFile:
+        files = self.files.setdefault(metric_type, {})
+        if start_time not in files:
+            files[start_time] = self.map_file(self.entries[metric_type][start_time])
+        return files[start_time].rewound()
+
+    def map_file(self, entry: dict) -> BacktestingFile:
+        def column(name: str) -> np.ndarray:
+            return np.load(os.path.join(self.cache_path, entry["name"], f"{name}.npy"), mmap_mode="r")
+
+        if entry["metric_type"] == "market_price":
+            return BacktestingMarketPrice.from_columns(entry["file_path"], column("times"), column("values"))
+        return BacktestingFileOrders.from_columns(entry["file_path"], column("times"), column("side_codes"), entry["side_names"], column("prices"), column("volumes"))
+
+
+def read_manifest(cache_path: str) -> List[dict]:
+    try:
+        with open(os.path.join(cache_path, MANIFEST), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def write_columns(metric_type: str, start_time: datetime, file_path: str, cache_path: str) -> dict:
+    """Parse one exported file and save its time sorted columns, returns its manifest entry."""
+    # the full file name, the csv and npz exports of a period each get their own directory
+    name = os.path.basename(file_path)
+    directory = os.path.join(cache_path, name)
+    os.makedirs(directory, exist_ok=True)
+
+    logging.info(f"caching columns of {file_path} in {directory}")
+    source_mtime = os.path.getmtime(file_path)
+    columns = load_columns(file_path)
+    entry = {
+        "metric_type": metric_type,
+        "start_time": int(start_time.timestamp()),
+        "file_path": file_path,
+        "name": name,
+        "source_mtime": source_mtime,
+    }
+
+    np.save(os.path.join(directory, "times.npy"), columns["time"])
+    if metric_type == "market_price":
+        np.save(os.path.join(directory, "values.npy"), columns["value"].astype(np.float64))
+    else:
+        side_names, side_codes = encode_sides(columns["side"])
+        entry["side_names"] = side_names
+        np.save(os.path.join(directory, "side_codes.npy"), side_codes)
+        np.save(os.path.join(directory, "prices.npy"), columns["price"].astype(np.float64))
+        np.save(os.path.join(directory, "volumes.npy"), columns["volume"].astype(np.float64))
+
+    return entry
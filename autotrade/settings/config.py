@@ -1,6 +1,7 @@
 import logging
 import asyncio 
 from abc import ABC, abstractmethod
+from typing import Literal
 
 from pydantic import BaseModel
 
@@ -20,6 +21,7 @@ class Config(BaseModel):
     strategy: str = "moving_average"
     order_type: str = "market"
     min_confidence_for_action: float = 0.5
+    imbalance_mode: Literal["incremental", "rescan"] = "incremental"
 
 class ConfigGetter(ABC):
     def __init__(self):
@@ -30,6 +32,22 @@ class ConfigGetter(ABC):
         """Gets the current configuration."""
         pass
 
+class StaticConfig(ConfigGetter):
+    """A fixed configuration, for backtests that must not pick up changes to the config file."""
+    def __init__(self, config: Config):
+        self.config = config
+
+    async def get_config(self) -> Config:
+        return self.config
+
+    @classmethod
+    def with_overrides(cls, base: Config, **overrides) -> "StaticConfig":
+        """Copy of base with the given fields replaced, validated like a config file would be."""
+        unknown = set(overrides) - set(Config.model_fields)
+        if unknown:
+            raise ValueError(f"unknown config fields {sorted(unknown)}")
+        return cls(Config(**{**base.model_dump(), **overrides}))
+
 class ConfigReloader():
     def __init__(self, filepath: str):
         self.filepath = filepath
@@ -64,13 +82,11 @@ class ConfigReloader():
             await asyncio.sleep(self.interval)
 
     async def _start(self):
-        loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=100000, loop=loop)
+        self.queue = asyncio.Queue(maxsize=100000)
         await self._reload_periodically()
 
     async def start(self):
-        loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue(maxsize=400000, loop=loop)
+        self.queue = asyncio.Queue(maxsize=400000)
         consumers = [asyncio.create_task(self._reload_periodically()) for i in range(self.threads)]
         await asyncio.gather(*consumers)
 
@@ -1,12 +1,14 @@
+import asyncio
+
 from autotrade.broker.api_broker import APIBroker
 
 broker = APIBroker("BTC-GBP")
 
 if __name__ == "__main__":
-    # orders = broker.list_orders()
+    # orders = asyncio.run(broker.list_orders())
     # print(orders)
 
-    # client_order_id, order_id, err = broker.create_market_order("BTC-USD", "SELL", "0.01", "1")
-    # broker.create_limit_order("BTC-USD", "SELL", "0.01", "1", 10000)
+    # client_order_id, order_id, err = asyncio.run(broker.create_market_order("0.01", "1"))
+    # asyncio.run(broker.create_limit_order("-0.01", "10000", 10))
 
-    print(broker.get_product_details())
\ No newline at end of file
+    print(asyncio.run(broker.get_product_details()))
@@ -6,18 +6,29 @@ from autotrade.settings.contants import ORDER_BUY, ORDER_SELL
 
 class OrderTracker():
     def __init__(self, product: str, metrics_exporter: PrometheusExporter):
+        """
+        The pending position and cost are kept as running totals, updated as orders are added,
+        partially filled and removed, so reading them does not depend on the number of orders.
+        """
         self.product = product  
         self.orders: Dict[str, PendingOrder]= {}
+        # what each order currently adds to the totals, signed by side
+        self.pending: Dict[str, Tuple[float, float]] = {}
+        self.pending_position = 0
+        self.pending_cost = 0
         self.metrics_exporter = metrics_exporter
 
     def add_order(self, pending_order: PendingOrder):
+        self._remove_pending(pending_order.client_order_id)
         self.orders[pending_order.client_order_id] = pending_order
+        self._add_pending(pending_order.client_order_id, pending_order.side, pending_order.volume, pending_order.price)
 
         self.update_metrics()
 
     def remove_order(self, client_order_id):
         if client_order_id in self.orders:
             del self.orders[client_order_id]
+            self._remove_pending(client_order_id)
 
         self.update_metrics()    
 
@@ -40,23 +51,45 @@ class OrderTracker():
 
         self.update_metrics()
 
+    def partially_fill_order(self, client_order_id: str, filled_size: float):
+        """
+        Only the unfilled volume of the order stays pending, filled_size is the total filled so far.
+
+        The filled volume is not in the position until the order finishes, so in between the
+        pending position understates the exposure. That is only safe because the trader has at
+        most one order open, it places nothing while anything is pending.
+        """
+        order = self.get_order(client_order_id)
+        if not order:
+            return
+
+        self._remove_pending(client_order_id)
+        self._add_pending(client_order_id, order.side, max(order.volume - filled_size, 0), order.price)
+
+        self.update_metrics()
+
     def get_pending_position(self) -> Tuple[float, float]:
-        pending_position = 0
-        for order in self.orders.values():
-            if order.side == ORDER_BUY:
-                pending_position += order.volume
-            else:
-                pending_position -= order.volume
-
-        pending_cost = 0
-        for order in self.orders.values():
-            if order.side == ORDER_BUY:
-                pending_cost += order.volume * order.price
-            else:
-                pending_cost -= order.volume * order.price
-
-        return pending_position, pending_cost
+        return self.pending_position, self.pending_cost
+
+    def _add_pending(self, client_order_id: str, side: str, volume: float, price: float):
+        position = volume if side == ORDER_BUY else -volume
+        cost = volume * price if side == ORDER_BUY else -volume * price
+
+        self.pending[client_order_id] = (position, cost)
+        self.pending_position += position
+        self.pending_cost += cost
+
+    def _remove_pending(self, client_order_id: str):
+        position, cost = self.pending.pop(client_order_id, (0, 0))
+        if not self.pending:
+            # start again from exactly zero so float error can not leave a phantom pending position
+            self.pending_position = 0
+            self.pending_cost = 0
+            return
+
+        self.pending_position -= position
+        self.pending_cost -= cost
     
     def update_metrics(self):
         pending_position, pending_cost = self.get_pending_position()
-        self.metrics_exporter.guage_pending_position.labels(self.product).set(pending_position) 
\ No newline at end of file
+        self.metrics_exporter.guage_pending_position.labels(self.product).set(pending_position) 
@@ -1,11 +1,11 @@
 import math
 import logging
-from typing import Tuple
+from typing import Tuple, Union
 
 from autotrade.metrics.exporter.prometheus import PrometheusExporter     
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL   
 from autotrade.trader.order_tracker import OrderTracker
-from autotrade.types.pending_order import PendingOrder
+from autotrade.types.pending_order import OrderSnapshot, PendingOrder
 from autotrade.settings.config import ConfigGetter
 
 class PositionTracker:
@@ -153,7 +153,7 @@ class PositionTracker:
         return adj_position_delta, False
 
 
-    def handle_order_filled(self, order: PendingOrder):
+    def handle_order_filled(self, order: Union[PendingOrder, OrderSnapshot]):
         position_before = self.position
         cash_before = self.cash
         volume = order.filled_size
@@ -8,7 +8,7 @@ from autotrade.settings.config import ConfigGetter
 from autotrade.types.broker_error import EXISTING_ORDER_ERROR, INSUFFICIENT_FUNDS_ERROR, INSUFFICIENT_PRODUCT_ERROR
 from autotrade.trader.position_tracker import PositionTracker
 from autotrade.trader.order_tracker import OrderTracker
-from autotrade.types.pending_order import PendingOrder
+from autotrade.types.pending_order import OrderSnapshot, PendingOrder
 from autotrade.trader.strategies.strategy_mux import StrategyMux
 from autotrade.trader.strategies.order_imbalance import OrderImbalanceStrategy
 from autotrade.trader.strategies.moving_average import MovingAverageStrategy
@@ -38,13 +38,15 @@ class Trader:
         price_metrics = await self.metrics.get_price_metrics()
         await self.handle_update(order_metrics, price_metrics)
 
-    async def handle_order_filled(self, pending_order: dict):
-        order = PendingOrder(**pending_order)
+    async def handle_order_filled(self, order: OrderSnapshot):
         self.PositionTracker.handle_order_filled(order)
         self.order_tracker.fill_order(order.client_order_id)
 
-    async def handle_order_cancelled(self, pending_order: dict):
-        order = PendingOrder(**pending_order)
+    async def handle_order_partially_filled(self, order: OrderSnapshot):
+        # the position is only booked once the order is filled or cancelled, until then just less of it is pending
+        self.order_tracker.partially_fill_order(order.client_order_id, order.filled_size)
+
+    async def handle_order_cancelled(self, order: OrderSnapshot):
         if order.filled_size > 0:
             self.PositionTracker.handle_order_filled(order)
         self.order_tracker.remove_order(order.client_order_id)
@@ -92,6 +94,7 @@ class Trader:
 
         async with self.decision_lock:
 
+            # one order at a time, partially filled orders rely on it (see OrderTracker.partially_fill_order)
             if self.order_tracker.get_pending_position()[0] != 0:
                 return
 
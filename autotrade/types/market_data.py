@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import List, NamedTuple
+
+
+class TickerUpdate(NamedTuple):
+    """A ticker price, already parsed, as delivered by providers that don't speak JSON."""
+    price: float
+    time: datetime
+
+
+class L2Update(NamedTuple):
+    """A batch of L2 level updates sharing one timestamp, held as columns."""
+    sides: List[str]
+    prices: List[float]
+    volumes: List[float]
+    time: datetime
+    is_snapshot: bool = False
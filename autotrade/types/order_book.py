@@ -0,0 +1,316 @@
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+BID_SIDE = "bid"
+
+
+class BandNotional:
+    """
+    Running sum of price * volume over the levels of a side priced within [low, high]
+    whose volume is at most max_volume.
+
+    Level updates adjust the total in O(1), moving the band only visits the levels
+    that enter or leave it. The total is rebuilt from the ladder every resync_interval
+    level updates so floating point drift can't accumulate.
+    """
+
+    def __init__(self, side: "OrderBookSide", resync_interval: int = 10000):
+        self.side = side
+        self.resync_interval = resync_interval
+        self.low = 0.0
+        self.high = -1.0  # empty until the first move
+        self.max_volume = 0.0
+        self.total = 0.0
+        self.updates_since_resync = 0
+        self.initialised = False
+
+    def on_level_update(self, price: float, previous: float, volume: float) -> None:
+        """Adjust the total for a single level update. O(1)."""
+        self.updates_since_resync += 1
+        if price < self.low or price > self.high:
+            return
+        if previous and previous <= self.max_volume:
+            self.total -= price * previous
+        if volume and volume <= self.max_volume:
+            self.total += price * volume
+
+    def move(self, low: float, high: float, max_volume: float) -> float:
+        """
+        Move the band to [low, high] and return the new total.
+        O(log n + k) where k = levels entering or leaving the band.
+        """
+        side = self.side
+        overlaps = low <= self.high and high >= self.low
+
+        if (not self.initialised or not overlaps or max_volume != self.max_volume
+                or self.updates_since_resync >= self.resync_interval):
+            self.total = side.notional_between(low, high, max_volume)
+            self.updates_since_resync = 0
+            self.initialised = True
+        else:
+            prices = side.prices
+            # levels leaving the band from below / above
+            if low > self.low:
+                self.total -= side.notional_in(bisect_left(prices, self.low), bisect_left(prices, low), max_volume)
+            if high < self.high:
+                self.total -= side.notional_in(bisect_right(prices, high), bisect_right(prices, self.high), max_volume)
+            # levels entering the band from below / above
+            if low < self.low:
+                self.total += side.notional_in(bisect_left(prices, low), bisect_left(prices, self.low), max_volume)
+            if high > self.high:
+                self.total += side.notional_in(bisect_right(prices, self.high), bisect_right(prices, high), max_volume)
+
+        self.low = low
+        self.high = high
+        self.max_volume = max_volume
+        return self.total
+
+
+class LevelWatch:
+    """
+    The price levels of an OrderBookSide one consumer watches, and which of them have been
+    updated since it last looked. Every subscriber has its own, so consumers never take each
+    other's changes.
+    """
+    __slots__ = ("side", "watched", "changed")
+
+    def __init__(self, side: "OrderBookSide"):
+        self.side = side
+        # watch counts per price level
+        self.watched: Dict[float, int] = {}
+        self.changed: Set[float] = set()
+
+    def watch(self, price: float) -> None:
+        """Collect updates to this price level for take_changed, watches are counted."""
+        self.watched[price] = self.watched.get(price, 0) + 1
+
+    def unwatch(self, price: float) -> None:
+        count = self.watched.get(price, 0) - 1
+        if count > 0:
+            self.watched[price] = count
+            return
+        self.watched.pop(price, None)
+        self.changed.discard(price)
+
+    def take_changed(self) -> Set[float]:
+        """Watched price levels updated since the last call."""
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def close(self) -> None:
+        """Stop collecting updates from the side."""
+        if self in self.side.watches:
+            self.side.watches.remove(self)
+
+
+class OrderBookSide:
+    """One side of an L2 order book kept as a sorted price ladder."""
+
+    def __init__(self):
+        self.levels: Dict[float, float] = {}
+        self.prices: List[float] = []  # ascending
+        self.band: Optional[BandNotional] = None
+        # one per subscriber
+        self.watches: List[LevelWatch] = []
+
+    def track_band(self) -> BandNotional:
+        """Start maintaining an incremental in-band notional total for this side."""
+        if self.band is None:
+            self.band = BandNotional(self)
+        return self.band
+
+    def update(self, price: float, volume: float) -> float:
+        """
+        Set the volume resting at a price level, removing the level when volume is 0.
+        O(log n) to locate the level, returns the volume previously at the level.
+        """
+        previous = self.levels.get(price, 0.0)
+
+        if volume == 0:
+            if price in self.levels:
+                del self.levels[price]
+                del self.prices[bisect_left(self.prices, price)]
+        else:
+            if price not in self.levels:
+                insort(self.prices, price)
+            self.levels[price] = volume
+
+        if self.band is not None:
+            self.band.on_level_update(price, previous, volume)
+        for watch in self.watches:
+            if price in watch.watched:
+                watch.changed.add(price)
+        return previous
+
+    def subscribe(self) -> LevelWatch:
+        """A new LevelWatch of the caller's own on this side, close() it when done."""
+        watch = LevelWatch(self)
+        self.watches.append(watch)
+        return watch
+
+    def get(self, price: float) -> float:
+        """Volume at a price level, 0 if there is none. O(1)."""
+        return self.levels.get(price, 0.0)
+
+    def min_price(self) -> float:
+        """Lowest price level, 0 if the side is empty. O(1)."""
+        return self.prices[0] if self.prices else 0
+
+    def max_price(self) -> float:
+        """Highest price level, 0 if the side is empty. O(1)."""
+        return self.prices[-1] if self.prices else 0
+
+    def notional_between(self, low: float, high: float, max_volume: float) -> float:
+        """
+        Sum of price * volume for levels priced within [low, high] whose volume is at most max_volume.
+        O(log n + k) where k = levels inside the range.
+        """
+        return self.notional_in(bisect_left(self.prices, low), bisect_right(self.prices, high), max_volume)
+
+    def notional_in(self, start: int, end: int, max_volume: float) -> float:
+        """Sum of price * volume for the ladder positions [start, end) whose volume is at most max_volume. O(k)."""
+        total = 0
+        levels = self.levels
+        for price in self.prices[start:end]:
+            volume = levels[price]
+            if volume > max_volume:
+                continue
+            total += price * volume
+        return total
+
+    def clear(self) -> None:
+        self.levels.clear()
+        self.prices.clear()
+        if self.band is not None:
+            self.band.initialised = False
+        for watch in self.watches:
+            watch.changed.update(watch.watched)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __contains__(self, price: float) -> bool:
+        return price in self.levels
+
+
+class OrderBookSideView(Mapping):
+    """
+    Read-only price -> volume view of an OrderBookSide, iterating prices in ascending order.
+    Reads go straight to the live side, nothing is copied. The view holds no state of its own,
+    a consumer that wants to know which levels changed subscribes for a LevelWatch.
+    """
+    __slots__ = ("_side",)
+
+    def __init__(self, side: OrderBookSide):
+        self._side = side
+
+    def __getitem__(self, price: float) -> float:
+        return self._side.levels[price]
+
+    def __iter__(self) -> Iterator[float]:
+        return iter(self._side.prices)
+
+    def __reversed__(self) -> Iterator[float]:
+        return reversed(self._side.prices)
+
+    def __len__(self) -> int:
+        return len(self._side.prices)
+
+    def __contains__(self, price) -> bool:
+        return price in self._side.levels
+
+    def __repr__(self) -> str:
+        return f"OrderBookSideView({self._side.levels!r})"
+
+    def min_price(self) -> float:
+        return self._side.min_price()
+
+    def max_price(self) -> float:
+        return self._side.max_price()
+
+    def subscribe(self) -> LevelWatch:
+        return self._side.subscribe()
+
+
+class OrderBookView(Mapping):
+    """
+    Generation-stamped, read-only view of an OrderBook, published with ORDER_BOOK_UPDATE
+    in place of copies of both sides. It is not a snapshot.
+
+    The "buys" / "sells" views read through to the live book, so a view that is held on to
+    always shows the latest levels, not the ones at the update it was published for.
+    generation is the book's generation at publish time. is_stale() tells a consumer the book
+    has moved on since, e.g. that a newer view is on its way or was already handled, and
+    copy() materialises the levels when a frozen copy is genuinely needed.
+    """
+    __slots__ = ("book", "generation", "buys", "sells")
+
+    def __init__(self, book: "OrderBook"):
+        self.book = book
+        self.generation = book.generation
+        self.buys = book.buys_view
+        self.sells = book.sells_view
+
+    def __getitem__(self, key: str) -> OrderBookSideView:
+        if key == "buys":
+            return self.buys
+        if key == "sells":
+            return self.sells
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(("buys", "sells"))
+
+    def __len__(self) -> int:
+        return 2
+
+    def is_stale(self) -> bool:
+        return self.generation != self.book.generation
+
+    def copy(self) -> Dict[str, Dict[float, float]]:
+        return {"buys": dict(self.book.buys.levels), "sells": dict(self.book.sells.levels)}
+
+
+class OrderBook:
+    """L2 order book with O(1) best bid / best ask lookups."""
+
+    def __init__(self):
+        self.buys = OrderBookSide()
+        self.sells = OrderBookSide()
+        self.buys_view = OrderBookSideView(self.buys)
+        self.sells_view = OrderBookSideView(self.sells)
+        # bumped on every level update so views can tell when they are out of date
+        self.generation = 0
+
+    def view(self) -> OrderBookView:
+        """Read-only live view of the book stamped with the current generation. O(1), nothing is copied."""
+        return OrderBookView(self)
+
+    def update(self, side: str, price: float, volume: float) -> float:
+        """Apply a single L2 level update, returns the volume previously at the level."""
+        self.generation += 1
+        if side == BID_SIDE:
+            return self.buys.update(price, volume)
+        return self.sells.update(price, volume)
+
+    def best_bid(self) -> float:
+        return self.buys.max_price()
+
+    def best_ask(self) -> float:
+        return self.sells.min_price()
+
+    def mid_price(self) -> float:
+        return (self.best_ask() + self.best_bid()) / 2
+
+    def spread(self) -> float:
+        return self.best_ask() - self.best_bid()
+
+    def band_notional(self, low: float, high: float, max_volume: float) -> Tuple[float, float]:
+        """
+        Incrementally maintained (buys, sells) notional for levels priced within [low, high]
+        with volume at most max_volume.
+        """
+        buys = self.buys.track_band().move(low, high, max_volume)
+        sells = self.sells.track_band().move(low, high, max_volume)
+        return buys, sells
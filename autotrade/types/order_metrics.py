@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from typing import NamedTuple
 
-class OrderMetrics(BaseModel):
+# Immutable snapshots published with every update, a handler running later still sees the
+# values it was triggered with. Use _replace to derive a changed copy.
+
+class OrderMetrics(NamedTuple):
     buy_volume: float
     sell_volume: float
     min_buy: float
@@ -10,8 +13,8 @@ class OrderMetrics(BaseModel):
     spread: float
     imbalance: float
 
-class PriceMetrics(BaseModel):
+class PriceMetrics(NamedTuple):
     price: float = 0
     long_moving_average: float = 0
     short_moving_average: float = 0
-    average_true_range: float = 0
\ No newline at end of file
+    average_true_range: float = 0
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Union
+from typing import NamedTuple, Union
 from datetime import datetime
 from enum import Enum
 
@@ -8,6 +8,21 @@ class OrderType(Enum):
     LIMIT = "limit"
 
 
+class OrderSnapshot(NamedTuple):
+    """Immutable copy of a PendingOrder, sent with ORDER_FILLED and ORDER_CANCELLED."""
+    order_type: OrderType
+    side: str
+    volume: float
+    price: float
+    order_id: str
+    client_order_id: str
+    status: str
+    timeout_at: Union[datetime, None] = None
+    filled_size: float = 0
+    avg_filled_price: float = 0
+    confidence: float = 0
+
+
 class PendingOrder(BaseModel):
     order_type: OrderType  # e.g., "market", "limit"
     side: str
@@ -19,4 +34,20 @@ class PendingOrder(BaseModel):
     timeout_at: Union[datetime, None] = None
     filled_size: float = 0
     avg_filled_price: float = 0
-    confidence: float = 0
\ No newline at end of file
+    confidence: float = 0
+
+    def snapshot(self) -> OrderSnapshot:
+        """The order as it is now, without the validation of a model_dump / PendingOrder(**) round trip."""
+        return OrderSnapshot(
+            self.order_type,
+            self.side,
+            self.volume,
+            self.price,
+            self.order_id,
+            self.client_order_id,
+            self.status,
+            self.timeout_at,
+            self.filled_size,
+            self.avg_filled_price,
+            self.confidence,
+        )
@@ -0,0 +1,114 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Protocol, Tuple
+
+
+class Timer(Protocol):
+    def cancel(self) -> None:
+        """Stop the callback from running, a no-op once it has run."""
+        pass
+
+
+class Clock(Protocol):
+    def now(self) -> datetime:
+        """Current time, timezone aware UTC."""
+        pass
+
+    async def sleep(self, seconds: float) -> None:
+        """Suspend the caller for the given number of seconds of this clock's time."""
+        pass
+
+    def call_at(self, when: datetime, callback: Callable[[], None]) -> Timer:
+        """Run callback once this clock reaches when, right away if it already has."""
+        pass
+
+
+class WallClock:
+    """Real time, what everything runs on when trading live."""
+
+    def now(self) -> datetime:
+        return datetime.now(tz=timezone.utc)
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+    def call_at(self, when: datetime, callback: Callable[[], None]) -> Timer:
+        # the event loop keeps its own timer heap and only wakes when the earliest one is due
+        delay = (when - self.now()).total_seconds()
+        return asyncio.get_running_loop().call_later(max(delay, 0), callback)
+
+
+class SimulatedTimer:
+    __slots__ = ("callback", "cancelled")
+
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class SimulatedClock:
+    """
+    Event time for backtests. Time only moves when the provider calls advance_to, so
+    sleepers wake up and timers fire in simulated time no matter how fast the replay runs.
+    Timers are kept in a heap and fire in deadline order, each with the clock set to its
+    deadline.
+    """
+
+    def __init__(self, start: Optional[datetime] = None):
+        self.current = start or datetime.fromtimestamp(0, tz=timezone.utc)
+        self._timers: List[Tuple[datetime, int, SimulatedTimer]] = []
+        self._sequence = itertools.count()
+
+    def now(self) -> datetime:
+        return self.current
+
+    def advance_to(self, time: datetime) -> None:
+        """Move time forward, firing every timer whose deadline has been reached. Never moves backwards."""
+        if time <= self.current:
+            return
+
+        while self._timers and self._timers[0][0] <= time:
+            when, _, timer = heapq.heappop(self._timers)
+            if timer.cancelled:
+                continue
+            self.current = max(self.current, when)
+            timer.callback()
+
+        self.current = time
+
+    def call_at(self, when: datetime, callback: Callable[[], None]) -> Timer:
+        timer = SimulatedTimer(callback)
+        if when <= self.current:
+            asyncio.get_running_loop().call_soon(self._fire, timer)
+        else:
+            heapq.heappush(self._timers, (when, next(self._sequence), timer))
+        return timer
+
+    def _fire(self, timer: SimulatedTimer) -> None:
+        if not timer.cancelled:
+            timer.callback()
+
+    async def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+
+        def wake():
+            if not waiter.done():
+                waiter.set_result(None)
+
+        timer = self.call_at(self.current + timedelta(seconds=seconds), wake)
+        try:
+            await waiter
+        finally:
+            timer.cancel()
+
+
+wall_clock = WallClock()
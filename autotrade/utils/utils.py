@@ -1,2 +1,13 @@
+from datetime import datetime
+from typing import Union
+
+import dateutil.parser
+
 def str_to_float(s: str) -> float:
-    return float(s)
\ No newline at end of file
+    return float(s)
+
+def to_datetime(value: Union[str, datetime]) -> datetime:
+    """Parse an ISO timestamp, values that are already datetimes are passed through."""
+    if isinstance(value, datetime):
+        return value
+    return dateutil.parser.parse(value)
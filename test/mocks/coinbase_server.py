@@ -0,0 +1,152 @@
+import datetime
+import ipaddress
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from coinbase.rest import RESTClient
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+API_PREFIX = "/api/v3/brokerage"
+
+
+def _pem(key) -> bytes:
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+
+
+class CoinbaseStandIn:
+    """
+    Local HTTPS stand-in for the parts of the Coinbase Advanced Trade API the APIBroker uses:
+    accounts, creating, getting and cancelling orders. Every response is held back by delay
+    seconds and the client ports seen are recorded, so tests can see how many connections
+    were opened.
+    """
+
+    def __init__(self, balances: dict, delay: float = 0.0):
+        self.delay = delay
+        self.accounts = {currency: {"uuid": uuid.uuid4().hex, "currency": currency, "available_balance": {"value": str(value), "currency": currency}} for currency, value in balances.items()}
+        self.orders = {}
+        self.connections = set()
+        self.requests = []
+        self.lock = threading.Lock()
+        self.dir = tempfile.mkdtemp()
+        self.cert_file = os.path.join(self.dir, "cert.pem")
+        self._write_certificate()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stand_in._handle(self, "GET")
+
+            def do_POST(self):
+                stand_in._handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_file, os.path.join(self.dir, "key.pem"))
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.base_url = f"127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> "CoinbaseStandIn":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self) -> RESTClient:
+        api_secret = _pem(ec.generate_private_key(ec.SECP256R1())).decode()
+        client = RESTClient("organizations/test/apiKeys/test", api_secret, base_url=self.base_url)
+        client.session.verify = self.cert_file
+        # a CA bundle or proxy from the environment would override the stand-in's certificate
+        client.session.trust_env = False
+        return client
+
+    def _write_certificate(self):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        certificate = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+            .sign(key, hashes.SHA256())
+        )
+        with open(self.cert_file, "wb") as f:
+            f.write(certificate.public_bytes(serialization.Encoding.PEM))
+        with open(os.path.join(self.dir, "key.pem"), "wb") as f:
+            f.write(_pem(key))
+
+    def _handle(self, request: BaseHTTPRequestHandler, method: str):
+        length = int(request.headers.get("Content-Length") or 0)
+        body = json.loads(request.rfile.read(length) or b"{}")
+        path = request.path.split("?")[0]
+        with self.lock:
+            self.connections.add(request.client_address[1])
+            self.requests.append((method, path))
+
+        time.sleep(self.delay)
+        status, response = self._route(method, path, body)
+
+        data = json.dumps(response).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _route(self, method: str, path: str, body: dict):
+        if method == "GET" and path == f"{API_PREFIX}/accounts":
+            return 200, {"accounts": list(self.accounts.values()), "has_next": False}
+
+        if method == "GET" and path.startswith(f"{API_PREFIX}/accounts/"):
+            account_id = path.rsplit("/", 1)[1]
+            for account in self.accounts.values():
+                if account["uuid"] == account_id:
+                    return 200, {"account": account}
+            return 404, {"error": "NOT_FOUND"}
+
+        if method == "POST" and path == f"{API_PREFIX}/orders":
+            order_id = uuid.uuid4().hex
+            self.orders[order_id] = {"order_id": order_id, "product_id": body["product_id"], "side": body["side"], "status": "OPEN", "filled_size": "0", "average_filled_price": "0"}
+            return 200, {"success": True, "success_response": {"order_id": order_id, "product_id": body["product_id"], "side": body["side"], "client_order_id": body["client_order_id"]}}
+
+        if method == "GET" and path.startswith(f"{API_PREFIX}/orders/historical/"):
+            order = self.orders.get(path.rsplit("/", 1)[1])
+            if order is None:
+                return 404, {"error": "NOT_FOUND"}
+            return 200, {"order": order}
+
+        if method == "POST" and path == f"{API_PREFIX}/orders/batch_cancel":
+            results = []
+            for order_id in body["order_ids"]:
+                order = self.orders.get(order_id)
+                if order is None or order["status"] != "OPEN":
+                    results.append({"success": False, "failure_reason": "UNKNOWN_CANCEL_ORDER", "order_id": order_id})
+                    continue
+                order["status"] = "CANCELED"
+                results.append({"success": True, "order_id": order_id})
+            return 200, {"results": results}
+
+        return 404, {"error": "NOT_FOUND"}
@@ -0,0 +1,81 @@
+import hashlib
+import io
+import os
+import shutil
+import uuid
+
+from autotrade.exporter.connectors.s3_connector import MIN_PART_SIZE
+
+
+class FilesystemS3Client:
+    """
+    Stand-in for the boto3 S3 client methods the connectors use, keeping objects as files
+    under root/<bucket>/<key>. Multipart uploads follow the S3 rules that matter to a writer:
+    parts are assembled in part number order and every part but the last must be at least
+    min_part_size bytes.
+    """
+
+    def __init__(self, root: str, min_part_size: int = MIN_PART_SIZE):
+        self.root = root
+        self.min_part_size = min_part_size
+
+    def _object_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def _upload_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, ".uploads", upload_id)
+
+    def put_object(self, Bucket: str, Key: str, Body):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        path = self._object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return {"ETag": hashlib.md5(data).hexdigest()}
+
+    def get_object(self, Bucket: str, Key: str):
+        with open(self._object_path(Bucket, Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+
+    def create_multipart_upload(self, Bucket: str, Key: str):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._upload_path(upload_id))
+        return {"UploadId": upload_id, "Bucket": Bucket, "Key": Key}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        with open(os.path.join(self._upload_path(UploadId), str(PartNumber)), "wb") as f:
+            f.write(data)
+        return {"ETag": hashlib.md5(data).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict):
+        upload_path = self._upload_path(UploadId)
+        parts = sorted(MultipartUpload["Parts"], key=lambda part: part["PartNumber"])
+        if not parts:
+            raise ValueError("MalformedXML: a multipart upload needs at least one part")
+
+        for i, part in enumerate(parts):
+            part_path = os.path.join(upload_path, str(part["PartNumber"]))
+            with open(part_path, "rb") as f:
+                if hashlib.md5(f.read()).hexdigest() != part["ETag"]:
+                    raise ValueError(f"InvalidPart: part {part['PartNumber']} does not match its ETag")
+            if i < len(parts) - 1 and os.path.getsize(part_path) < self.min_part_size:
+                raise ValueError(f"EntityTooSmall: part {part['PartNumber']} is {os.path.getsize(part_path)} bytes")
+
+        path = self._object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for part in parts:
+                with open(os.path.join(upload_path, str(part["PartNumber"])), "rb") as f:
+                    shutil.copyfileobj(f, out)
+
+        shutil.rmtree(upload_path)
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str):
+        shutil.rmtree(self._upload_path(UploadId), ignore_errors=True)
+
+    def list_multipart_uploads(self, Bucket: str):
+        uploads_path = os.path.join(self.root, ".uploads")
+        uploads = os.listdir(uploads_path) if os.path.exists(uploads_path) else []
+        return {"Uploads": [{"UploadId": upload_id} for upload_id in uploads]}
@@ -0,0 +1,4 @@
+from autotrade.metrics.exporter.prometheus import PrometheusExporter
+
+# prometheus metrics are registered globally, so the test modules share a single exporter
+pe = PrometheusExporter(False)
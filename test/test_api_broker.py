@@ -0,0 +1,130 @@
+import asyncio
+import time
+import pytest
+
+from autotrade.broker.api_broker import APIBroker
+from autotrade.types.broker_error import REQUEST_ERROR
+from test.mocks.coinbase_server import CoinbaseStandIn
+
+
+@pytest.fixture
+def stand_in():
+    server = CoinbaseStandIn({"BTC": 0.5, "USD": 1000}).start()
+
+    yield server
+
+    server.stop()
+
+
+def make_broker(server: CoinbaseStandIn, **kwargs) -> APIBroker:
+    return APIBroker("BTC-USD", client=server.client(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_api_broker_limit_order_and_cancel(stand_in):
+    broker = make_broker(stand_in)
+    assert broker.balance == 0.5
+    assert broker.cash_balance == 1000
+
+    client_order_id, order_id, err = await broker.create_limit_order("0.01", "10000", 10)
+    assert err is None
+    assert client_order_id is not None
+    assert broker.active_order == order_id
+    assert stand_in.orders[order_id]["side"] == "BUY"
+
+    _, _, err = await broker.create_limit_order("0.01", "10000", 10)
+    assert err is not None
+
+    err = await broker.cancel_current_order()
+    assert err is None
+    assert broker.active_order is None
+    assert stand_in.orders[order_id]["status"] == "CANCELED"
+
+    # every request went over the one kept alive connection
+    assert len(stand_in.requests) == 3
+    assert len(stand_in.connections) == 1
+
+    broker.close()
+
+
+@pytest.mark.asyncio
+async def test_api_broker_fetches_balances_concurrently(stand_in):
+    broker = make_broker(stand_in)
+    stand_in.accounts["BTC"]["available_balance"]["value"] = "0.25"
+    stand_in.accounts["USD"]["available_balance"]["value"] = "500"
+    stand_in.delay = 0.3
+
+    started = time.perf_counter()
+    err = await broker.update_balances()
+    elapsed = time.perf_counter() - started
+
+    assert err is None
+    assert broker.balance == 0.25
+    assert broker.cash_balance == 500
+    assert elapsed < 0.5
+
+    broker.close()
+
+
+@pytest.mark.asyncio
+async def test_api_broker_request_timeout(stand_in):
+    broker = make_broker(stand_in, request_timeout=0.1)
+    stand_in.delay = 0.5
+
+    started = time.perf_counter()
+    order, err = await broker.get_order("missing")
+    elapsed = time.perf_counter() - started
+
+    assert order is None
+    assert err.type == REQUEST_ERROR
+    assert elapsed < 0.4
+
+    broker.close()
+
+
+@pytest.mark.asyncio
+async def test_api_broker_order_placement_does_not_block_the_loop(stand_in):
+    broker = make_broker(stand_in)
+    stand_in.delay = 0.3
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    _, order_id, err = await broker.create_limit_order("0.01", "10000", 10)
+    task.cancel()
+
+    assert err is None
+    assert order_id is not None
+    assert ticks > 10
+
+    broker.close()
+
+
+@pytest.mark.asyncio
+async def test_api_broker_polls_active_order_until_filled(stand_in):
+    broker = make_broker(stand_in, poll_interval=0.05)
+    checker = asyncio.create_task(broker.start())
+    await asyncio.sleep(0)
+
+    _, order_id, err = await broker.create_limit_order("0.01", "10000", 10)
+    assert err is None
+
+    stand_in.accounts["BTC"]["available_balance"]["value"] = "0.51"
+    stand_in.orders[order_id].update(status="FILLED", filled_size="0.01", average_filled_price="10000")
+
+    # balances are fetched once the fill has been seen
+    for _ in range(50):
+        if broker.balance == 0.51:
+            break
+        await asyncio.sleep(0.02)
+
+    assert broker.active_order is None
+    assert broker.balance == 0.51
+
+    checker.cancel()
+    broker.close()
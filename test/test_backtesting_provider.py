@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta, timezone
 import json
+import os
 import pytest
 
-from autotrade.providers.backtesting_provider import BacktestingProvider, BacktestingFileOrders, BacktestingMarketPrice
+from autotrade.providers.backtesting_provider import BacktestingProvider, BacktestingFileOrders, BacktestingMarketPrice, find_backtest_files, to_message
+from autotrade.types.market_data import L2Update, TickerUpdate
 
 # def test_prepare_files():
 #     # Test the prepare_files method of BacktestingProvider
@@ -132,4 +134,99 @@ async def test_backtesting_provider_end_all():
 
     await provider._do_one_iteration()
     
-    assert expected_msgs == ['{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "78451.41", "new_quantity": "0.01149928"}]}], "timestamp": "2025-05-11T15:28:59.832710+00:00"}', '{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "78451.4", "new_quantity": "0.01916547"}]}], "timestamp": "2025-05-11T15:29:00.832710+00:00"}', '{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "500.41", "new_quantity": "0.025"}]}], "timestamp": "2025-05-11T15:29:05.832710+00:00"}']
\ No newline at end of file
+    assert expected_msgs == ['{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "78451.41", "new_quantity": "0.01149928"}]}], "timestamp": "2025-05-11T15:28:59.832710+00:00"}', '{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "78451.4", "new_quantity": "0.01916547"}]}], "timestamp": "2025-05-11T15:29:00.832710+00:00"}', '{"channel": "l2_data", "events": [{"type": "snapshot", "updates": [{"side": "buys", "price_level": "500.41", "new_quantity": "0.025"}]}], "timestamp": "2025-05-11T15:29:05.832710+00:00"}']
+def write_backtest_files(folder):
+    with open(folder / "orders_1746977300.csv", "w") as f:
+        f.write("metric_name,side,time,price,volume\n")
+        f.write("orders,bid,2025-05-11 15:28:59.000000+00:00,100.0,1.0\n")
+        f.write("orders,bid,2025-05-11 15:29:00.200000+00:00,99.0,0.5\n")
+        f.write("orders,offer,2025-05-11 15:29:00.400000+00:00,101.0,0.25\n")
+        f.write("orders,bid,2025-05-11 15:29:00.600000+00:00,99.0,0.25\n")
+    with open(folder / "market_price_1746977300.csv", "w") as f:
+        f.write("metric_name,time,value\n")
+        f.write("market_price,2025-05-11 15:28:59.000000+00:00,100.0\n")
+        f.write("market_price,2025-05-11 15:29:00.300000+00:00,100.5\n")
+        f.write("market_price,2025-05-11 15:29:00.700000+00:00,100.75\n")
+
+def test_backtesting_orders_next_update(tmp_path):
+    write_backtest_files(tmp_path)
+    fo = BacktestingFileOrders(str(tmp_path / "orders_1746977300.csv"))
+    fo.load_data()
+
+    update, is_end = fo.get_next_update(datetime.fromisoformat("2025-05-11 15:29:00.600000+00:00"))
+
+    assert not is_end
+    assert update.sides == ["bid", "offer"]
+    assert update.prices == [99.0, 101.0]
+    assert update.volumes == [0.75, 0.25]
+    assert update.is_snapshot
+
+    # the cursor has moved past every row
+    update, is_end = fo.get_next_update(datetime.fromisoformat("2025-05-11 15:29:00.600000+00:00"))
+    assert update is None
+    assert not is_end
+
+    update, is_end = fo.get_next_update(datetime.fromisoformat("2025-05-11 15:29:00.800000+00:00"))
+    assert update is None
+    assert is_end
+
+@pytest.mark.asyncio
+async def test_backtesting_provider_direct_dispatch(tmp_path):
+    write_backtest_files(tmp_path)
+    start_time = datetime(2025, 5, 11, 15, 28, 0, tzinfo=timezone.utc)
+
+    messages = []
+    events = []
+
+    encoded = BacktestingProvider(start_time, None, timedelta(seconds=0.5), 1000, str(tmp_path), messages.append)
+    direct = BacktestingProvider(start_time, None, timedelta(seconds=0.5), 1000, str(tmp_path), messages.append, events.append)
+
+    for provider in [encoded, direct]:
+        provider.prepare_files()
+        provider.initialise_files()
+        for _ in range(8):
+            await provider._do_one_iteration()
+
+    assert len(events) == 2
+    assert isinstance(events[0], TickerUpdate)
+    assert events[0].price == 100.5
+    assert isinstance(events[1], L2Update)
+    assert events[1].sides == ["bid", "offer"]
+    assert events[1].volumes == [0.5, 0.25]
+    assert messages == [to_message(event) for event in events]
+
+@pytest.mark.asyncio
+async def test_backtesting_provider_replay(tmp_path):
+    write_backtest_files(tmp_path)
+    start_time = datetime(2025, 5, 11, 15, 28, 0, tzinfo=timezone.utc)
+
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    provider = BacktestingProvider(start_time, None, timedelta(seconds=0.5), None, str(tmp_path), None)
+    await provider.replay(on_event)
+
+    # replay runs until the data is exhausted and delivers the same updates as the interval loop
+    assert provider.finished
+    assert len(events) == 2
+    assert isinstance(events[0], TickerUpdate)
+    assert events[0].price == 100.5
+    assert isinstance(events[1], L2Update)
+    assert events[1].volumes == [0.5, 0.25]
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_find_backtest_files_prefers_formats_in_order(tmp_path, monkeypatch, reverse):
+    for name in ["orders_1746977300.csv", "orders_1746977300.csv.gz", "orders_1746977300.npz", "orders_1746977400.csv", "orders_1746977400.csv.gz"]:
+        (tmp_path / name).touch()
+    # the choice must not depend on the order the folder lists its files in
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: sorted(listdir(path), reverse=reverse))
+
+    files = find_backtest_files(str(tmp_path), datetime.fromtimestamp(1746977300, tz=timezone.utc))
+
+    assert files["orders"] == {
+        datetime.fromtimestamp(1746977300, tz=timezone.utc): str(tmp_path / "orders_1746977300.npz"),
+        datetime.fromtimestamp(1746977400, tz=timezone.utc): str(tmp_path / "orders_1746977400.csv"),
+    }
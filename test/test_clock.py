@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from autotrade.utils.clock import SimulatedClock
+
+START = datetime(2025, 5, 11, 15, 0, 0, tzinfo=timezone.utc)
+
+@pytest.mark.asyncio
+async def test_simulated_clock_sleep_wakes_on_advance():
+    clock = SimulatedClock(START)
+    woken = []
+
+    async def sleeper(seconds: float):
+        await clock.sleep(seconds)
+        woken.append((seconds, clock.now()))
+
+    tasks = [asyncio.create_task(sleeper(s)) for s in [2, 1, 5]]
+    await asyncio.sleep(0)
+
+    clock.advance_to(START + timedelta(seconds=1.5))
+    await asyncio.sleep(0)
+    assert woken == [(1, START + timedelta(seconds=1.5))]
+
+    clock.advance_to(START + timedelta(seconds=10))
+    await asyncio.gather(*tasks)
+    assert [s for s, _ in woken] == [1, 2, 5]
+
+def test_simulated_clock_never_moves_backwards():
+    clock = SimulatedClock(START)
+
+    clock.advance_to(START + timedelta(seconds=5))
+    clock.advance_to(START)
+
+    assert clock.now() == START + timedelta(seconds=5)
+
+@pytest.mark.asyncio
+async def test_simulated_clock_cancelled_sleeper():
+    clock = SimulatedClock(START)
+
+    task = asyncio.create_task(clock.sleep(1))
+    await asyncio.sleep(0)
+    task.cancel()
+
+    # advancing past a cancelled sleeper is fine
+    clock.advance_to(START + timedelta(seconds=2))
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+@pytest.mark.asyncio
+async def test_simulated_clock_timers_fire_at_their_deadline():
+    clock = SimulatedClock(START)
+    fired = []
+
+    clock.call_at(START + timedelta(seconds=3), lambda: fired.append((3, clock.now())))
+    clock.call_at(START + timedelta(seconds=1), lambda: fired.append((1, clock.now())))
+    cancelled = clock.call_at(START + timedelta(seconds=2), lambda: fired.append((2, clock.now())))
+    cancelled.cancel()
+
+    clock.advance_to(START + timedelta(seconds=1))
+    assert fired == [(1, START + timedelta(seconds=1))]
+
+    # timers passed over by a jump still see their own deadline
+    clock.advance_to(START + timedelta(seconds=10))
+    assert fired == [(1, START + timedelta(seconds=1)), (3, START + timedelta(seconds=3))]
+    assert clock.now() == START + timedelta(seconds=10)
+
+    # a deadline already reached runs on the next loop iteration
+    clock.call_at(START, lambda: fired.append((0, clock.now())))
+    await asyncio.sleep(0)
+    assert fired[-1] == (0, START + timedelta(seconds=10))
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+import numpy as np
+
+from autotrade.exporter.column_buffer import ColumnBuffer
+from autotrade.exporter.file_formats import to_frame
+
+
+def test_column_buffer_typed_columns():
+    buffer = ColumnBuffer(4)
+    time = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+    buffer.append({"side": "bid", "time": time, "price": 100.0, "volume": 1})
+    buffer.append({"side": "offer", "time": time, "price": 101.0, "volume": 0.5})
+
+    columns = buffer.take()
+
+    assert list(columns) == ["side", "time", "price", "volume"]
+    assert columns["price"].dtype == np.float64
+    assert columns["volume"].tolist() == [1.0, 0.5]
+    assert columns["side"].tolist() == ["bid", "offer"]
+    assert to_frame(columns)["time"].tolist() == [time, time]
+
+def test_column_buffer_missing_values():
+    buffer = ColumnBuffer(4)
+    buffer.append({"price": 100.0})
+    buffer.append({"price": 101.0, "side": "bid"})
+    buffer.append({"side": "offer"})
+
+    columns = buffer.take()
+
+    assert columns["side"].tolist() == [None, "bid", "offer"]
+    assert np.isnan(columns["price"][2])
+
+def test_column_buffer_grows_and_restarts():
+    buffer = ColumnBuffer(2)
+    for i in range(5):
+        buffer.append({"value": float(i)})
+
+    columns = buffer.take()
+    assert columns["value"].tolist() == [0, 1, 2, 3, 4]
+
+    # taking hands the arrays over, later appends go to fresh ones
+    buffer.append({"value": 10.0})
+    assert len(buffer) == 1
+    assert columns["value"].tolist() == [0, 1, 2, 3, 4]
+    assert buffer.take()["value"].tolist() == [10.0]
+
+def test_column_buffer_extend_block():
+    buffer = ColumnBuffer(2)
+    time = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+    buffer.append({"time": time, "side": "bid", "price": 99.0})
+
+    # the timestamp is shared by every row of the block
+    buffer.extend({"time": time, "side": ["bid", "offer", "offer"], "price": [98.0, 101.0, 102.0]}, 3)
+
+    columns = buffer.take()
+    assert columns["side"].tolist() == ["bid", "bid", "offer", "offer"]
+    assert columns["price"].tolist() == [99.0, 98.0, 101.0, 102.0]
+    assert to_frame(columns)["time"].tolist() == [time] * 4
@@ -0,0 +1,265 @@
+import asyncio
+import pytest
+
+from autotrade.events.events import CONCURRENT, LATEST, SERIAL, Events, bounded
+from autotrade.events.event_types import EventType
+
+
+@pytest.mark.asyncio
+async def test_events_synchronous_drain_order():
+    events = Events(synchronous=True)
+    calls = []
+
+    async def on_price(value):
+        calls.append(("price", value))
+        # events triggered by a handler are handled in the same drain
+        events.trigger_event(EventType.ORDER_FILLED, value * 10)
+
+    async def on_price_second(value):
+        calls.append(("price_second", value))
+
+    async def on_filled(value):
+        calls.append(("filled", value))
+
+    events.add_handler("price", EventType.PRICE_UPDATE, on_price)
+    events.add_handler("price_second", EventType.PRICE_UPDATE, on_price_second)
+    events.add_handler("filled", EventType.ORDER_FILLED, on_filled)
+
+    events.trigger_event(EventType.PRICE_UPDATE, 1)
+    events.trigger_event(EventType.PRICE_UPDATE, 2)
+
+    # nothing runs until the events are drained
+    assert calls == []
+
+    await events.drain()
+
+    assert calls == [
+        ("price", 1), ("price_second", 1),
+        ("price", 2), ("price_second", 2),
+        ("filled", 10), ("filled", 20),
+    ]
+    assert len(events.pending) == 0
+
+@pytest.mark.asyncio
+async def test_events_synchronous_unknown_event():
+    events = Events(synchronous=True)
+    events.trigger_event(EventType.ORDER_CANCELLED, 1)
+
+    await events.drain()
+
+    assert len(events.pending) == 0
+
+@pytest.mark.asyncio
+async def test_events_queued_dispatch_without_polling():
+    events = Events()
+    received = []
+    done = asyncio.Event()
+
+    async def on_price(value):
+        received.append(value)
+        if len(received) == 3:
+            done.set()
+
+    events.add_handler("price", EventType.PRICE_UPDATE, on_price)
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    for value in (1, 2, 3):
+        events.trigger_event(EventType.PRICE_UPDATE, value)
+
+    # the consumer is woken by the queue, well inside what a single 100ms poll would take
+    await asyncio.wait_for(done.wait(), timeout=0.05)
+    assert received == [1, 2, 3]
+
+    consumer.cancel()
+
+async def run_burst(policy, values, release_after=0):
+    """Trigger values while the first call is blocked, returns the values the handler saw and the peak concurrency."""
+    events = Events()
+    seen = []
+    running = 0
+    peak = 0
+    release = asyncio.Event()
+
+    async def handler(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        seen.append(value)
+        running -= 1
+
+    events.add_handler("handler", EventType.ORDER_UPDATE, handler, policy)
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    for value in values:
+        events.trigger_event(EventType.ORDER_UPDATE, value)
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    release.set()
+    for _ in range(len(values) + 5):
+        await asyncio.sleep(0)
+
+    consumer.cancel()
+    dispatcher = events.handlers[EventType.ORDER_UPDATE].handlers["handler"]
+    return seen, peak, dispatcher
+
+@pytest.mark.asyncio
+async def test_events_dispatch_policies():
+    seen, peak, _ = await run_burst(CONCURRENT, range(10))
+    assert sorted(seen) == list(range(10))
+    assert peak == 10
+
+    seen, peak, dispatcher = await run_burst(SERIAL, range(10))
+    assert seen == list(range(10))
+    assert peak == 1
+    assert dispatcher.dropped == 0
+
+    seen, peak, dispatcher = await run_burst(bounded(3), range(10))
+    assert sorted(seen) == list(range(10))
+    assert peak == 3
+    assert dispatcher.running == 0
+
+    # only the call already running and the newest value are handled
+    seen, peak, dispatcher = await run_burst(LATEST, range(10))
+    assert seen == [0, 9]
+    assert peak == 1
+    assert dispatcher.dropped == 8
+
+    seen, peak, dispatcher = await run_burst(bounded(2, max_pending=3), range(10))
+    assert sorted(seen) == [0, 1, 7, 8, 9]
+    assert dispatcher.dropped == 5
+
+@pytest.mark.asyncio
+async def test_events_dispatch_survives_handler_error():
+    events = Events()
+    seen = []
+
+    async def handler(value):
+        if value == 1:
+            raise ValueError("boom")
+        seen.append(value)
+
+    events.add_handler("handler", EventType.ORDER_FILLED, handler, SERIAL)
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    for value in (1, 2, 3):
+        events.trigger_event(EventType.ORDER_FILLED, value)
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    assert seen == [2, 3]
+    consumer.cancel()
+
+class CountingCounter():
+    def __init__(self):
+        self.count = 0
+
+    def inc(self):
+        self.count += 1
+
+@pytest.mark.asyncio
+async def test_events_coalesce_to_latest_value():
+    events = Events()
+    counter = CountingCounter()
+    channel = events.coalesce(EventType.PRICE_UPDATE, counter)
+    prices = []
+    fills = []
+
+    async def on_price(value):
+        prices.append(value)
+
+    async def on_filled(value):
+        fills.append(value)
+
+    events.add_handler("price", EventType.PRICE_UPDATE, on_price)
+    events.add_handler("filled", EventType.ORDER_FILLED, on_filled)
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    # a burst arriving before the consumer runs is handled once, with the newest value
+    for value in range(5):
+        events.trigger_event(EventType.PRICE_UPDATE, value)
+        events.trigger_event(EventType.ORDER_FILLED, value)
+    assert events.queue.qsize() == 6
+
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    assert prices == [4]
+    assert fills == [0, 1, 2, 3, 4]
+    assert channel.dropped == 4
+    assert counter.count == 4
+
+    # once handled the next value is queued again
+    events.trigger_event(EventType.PRICE_UPDATE, 5)
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert prices == [4, 5]
+    assert channel.dropped == 4
+
+    consumer.cancel()
+
+@pytest.mark.asyncio
+async def test_events_coalesced_event_before_handler():
+    events = Events()
+    channel = events.coalesce(EventType.PRICE_UPDATE)
+    prices = []
+
+    async def on_price(value):
+        prices.append(value)
+
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    # nobody handles the first trigger, it must not leave the channel full
+    events.trigger_event(EventType.PRICE_UPDATE, 1)
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert not channel.full
+
+    events.add_handler("price", EventType.PRICE_UPDATE, on_price)
+    events.trigger_event(EventType.PRICE_UPDATE, 2)
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert prices == [2]
+
+    consumer.cancel()
+
+@pytest.mark.asyncio
+async def test_events_fills_skip_market_data_backlog():
+    events = Events()
+    calls = []
+
+    async def on_book(value):
+        calls.append(("book", value))
+
+    async def on_filled(value):
+        calls.append(("filled", value))
+
+    async def on_cancelled(value):
+        calls.append(("cancelled", value))
+
+    events.add_handler("book", EventType.ORDER_BOOK_UPDATE, on_book, SERIAL)
+    events.add_handler("filled", EventType.ORDER_FILLED, on_filled, SERIAL)
+    events.add_handler("cancelled", EventType.ORDER_CANCELLED, on_cancelled, SERIAL)
+    consumer = asyncio.create_task(events.start())
+    await asyncio.sleep(0)
+
+    for value in range(100):
+        events.trigger_event(EventType.ORDER_BOOK_UPDATE, value)
+    events.trigger_event(EventType.ORDER_FILLED, "a")
+    events.trigger_event(EventType.ORDER_CANCELLED, "b")
+    events.trigger_event(EventType.ORDER_FILLED, "c")
+
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+    # order events are handled before any of the market data queued ahead of them
+    assert sorted(calls[:3]) == [("cancelled", "b"), ("filled", "a"), ("filled", "c")]
+    assert calls[3:] == [("book", value) for value in range(100)]
+
+    consumer.cancel()
@@ -0,0 +1,182 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import threading
+import pandas as pd
+import pytest
+
+from autotrade.exporter.exporter import Exporter
+from autotrade.exporter.exporter_manager import ExporterManager
+from autotrade.exporter.connectors.localfile_connector import LocalFileConnector
+from autotrade.exporter.connectors.s3_connector import S3StreamingConnector
+from autotrade.exporter.file_formats import CSV_FORMAT, NPZ_FORMAT
+from autotrade.providers.backtesting_provider import BacktestingFileOrders, BacktestingMarketPrice
+from test.mocks.filesystem_s3_client import FilesystemS3Client
+
+
+def export_orders(output_path, file_format):
+    exporter = Exporter("orders", 4, timedelta(hours=1), LocalFileConnector(str(output_path)), file_format)
+    start = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+    observations = [
+        ("bid", start, 100.0, 1.0),
+        ("offer", start + timedelta(seconds=1), 101.0, 0.5),
+        ("bid", start + timedelta(seconds=1), 99.5, 0.25),
+        ("bid", start + timedelta(seconds=2), 100.0, 0.0),
+    ]
+    for side, time, price, volume in observations:
+        exporter.update_dataframe(metric_name="orders", side=side, time=time.isoformat(), price=price, volume=volume)
+    exporter.close()
+
+def test_exporter_npz_round_trip(tmp_path):
+    export_orders(tmp_path / "csv", CSV_FORMAT)
+    export_orders(tmp_path / "npz", NPZ_FORMAT)
+
+    assert os.listdir(tmp_path / "csv") == ["orders_1746977339.csv"]
+    assert os.listdir(tmp_path / "npz") == ["orders_1746977339.npz"]
+
+    from_csv = BacktestingFileOrders(str(tmp_path / "csv" / "orders_1746977339.csv"))
+    from_npz = BacktestingFileOrders(str(tmp_path / "npz" / "orders_1746977339.npz"))
+    from_csv.load_data()
+    from_npz.load_data()
+
+    assert from_npz.start_time == from_csv.start_time
+    assert from_npz.end_time == from_csv.end_time
+    assert from_npz.side_names == ["bid", "offer"]
+
+    for seconds in [1, 2]:
+        time = from_csv.start_time + timedelta(seconds=seconds)
+        assert from_npz.get_next_update(time) == from_csv.get_next_update(time)
+
+def test_exporter_npz_market_price(tmp_path):
+    exporter = Exporter("market_price", 2, timedelta(hours=1), LocalFileConnector(str(tmp_path)), NPZ_FORMAT)
+    start = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+    exporter.update_dataframe(metric_name="market_price", time=start.isoformat(), value=100.0)
+    exporter.update_dataframe(metric_name="market_price", time=(start + timedelta(seconds=1)).isoformat(), value=100.5)
+    exporter.wait()
+
+    file = BacktestingMarketPrice(str(tmp_path / "market_price_1746977339.npz"))
+    file.load_data()
+
+    update, end = file.get_next_update(start + timedelta(seconds=1))
+    assert not end
+    assert update.price == 100.5
+
+def test_exporter_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        Exporter("orders", 4, timedelta(hours=1), LocalFileConnector(str(tmp_path)), "parquet")
+
+class BlockingConnector:
+    def __init__(self):
+        self.release = threading.Event()
+        self.exported = []
+
+    def export(self, file_path: str, exported_metric: str, output_name: str):
+        self.release.wait(5)
+        with open(file_path) as f:
+            self.exported.append((output_name, f.read().count("\n") - 1))
+
+@pytest.mark.asyncio
+async def test_exporter_exports_off_the_loop():
+    connector = BlockingConnector()
+    manager = ExporterManager()
+    exporter = Exporter("market_price", 2, timedelta(hours=1), connector)
+    manager.add_exporter("market_price", exporter)
+    start = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+    manager_task = asyncio.create_task(manager.start())
+    await asyncio.sleep(0)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    for i in range(5):
+        manager.add_observation(metric_name="market_price", time=(start + timedelta(seconds=i)).isoformat(), value=100.0 + i)
+    await asyncio.sleep(0.2)
+
+    # the first export is stuck in the connector and the second is held back behind it,
+    # the manager stops taking observations but the loop keeps running
+    assert connector.exported == []
+    assert exporter.pending is not None
+    assert manager.queue.qsize() == 1
+    assert ticks > 10
+
+    connector.release.set()
+    await manager.queue.join()
+    assert exporter.pending is None
+    assert exporter.observations == 1
+
+    ticker_task.cancel()
+    manager_task.cancel()
+    exporter.close()
+
+    assert connector.exported == [("market_price_1746977339", 2), ("market_price_1746977341", 2), ("market_price_1746977343", 1)]
+
+def test_exporter_streams_gzipped_csv_to_s3(tmp_path):
+    client = FilesystemS3Client(str(tmp_path / "s3"), min_part_size=64)
+    connector = S3StreamingConnector("bucket", client=client, part_size=64)
+    exporter = Exporter("orders", 10, timedelta(hours=1), connector, chunk_observations=3)
+    start = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+
+    for i in range(12):
+        exporter.update_dataframe(metric_name="orders", side="bid" if i % 2 else "offer", time=(start + timedelta(seconds=i)).isoformat(), price=100.0 + i, volume=1.0)
+    exporter.close()
+
+    # no temp file round trip, each file is assembled from the uploaded parts
+    assert client.list_multipart_uploads(Bucket="bucket")["Uploads"] == []
+    first = pd.read_csv(client.get_object(Bucket="bucket", Key="orders/orders_1746977339.csv.gz")["Body"], compression="gzip", parse_dates=["time"])
+    second = pd.read_csv(client.get_object(Bucket="bucket", Key="orders/orders_1746977349.csv.gz")["Body"], compression="gzip", parse_dates=["time"])
+
+    assert list(first.columns) == ["side", "time", "price", "volume"]
+    assert first["price"].tolist() == [100.0 + i for i in range(10)]
+    assert second["price"].tolist() == [110.0, 111.0]
+    assert first["time"].iloc[0] == start
+
+    # the backtests read the downloaded file like any other export
+    os.makedirs(tmp_path / "data")
+    with open(tmp_path / "data" / "orders_1746977339.csv.gz", "wb") as f:
+        f.write(client.get_object(Bucket="bucket", Key="orders/orders_1746977339.csv.gz")["Body"].read())
+    orders = BacktestingFileOrders(str(tmp_path / "data" / "orders_1746977339.csv.gz"))
+    orders.load_data()
+    assert orders.prices.tolist() == [100.0 + i for i in range(10)]
+
+def test_s3_stream_holds_back_small_parts(tmp_path):
+    client = FilesystemS3Client(str(tmp_path / "s3"))
+    stream = S3StreamingConnector("bucket", client=client).open_stream("orders", "orders_1.csv.gz")
+
+    for _ in range(3):
+        stream.write(b"x" * 1024)
+    stream.close()
+
+    # smaller than a part, so everything went up as the single final part
+    assert len(stream.parts) == 1
+    assert client.get_object(Bucket="bucket", Key="orders/orders_1.csv.gz")["Body"].read() == b"x" * 3072
+
+def test_s3_stream_abort(tmp_path):
+    client = FilesystemS3Client(str(tmp_path / "s3"))
+    stream = S3StreamingConnector("bucket", client=client).open_stream("orders", "orders_1.csv.gz")
+    stream.write(b"x")
+    stream.abort()
+
+    assert client.list_multipart_uploads(Bucket="bucket")["Uploads"] == []
+    assert not os.path.exists(tmp_path / "s3" / "bucket" / "orders" / "orders_1.csv.gz")
+
+def test_exporter_manager_block_of_observations(tmp_path):
+    manager = ExporterManager()
+    exporter = Exporter("orders", 3, timedelta(hours=1), LocalFileConnector(str(tmp_path)))
+    manager.add_exporter("orders", exporter)
+    start = datetime(2025, 5, 11, 15, 28, 59, tzinfo=timezone.utc)
+
+    manager.update_exporter(metric_name="orders", time=start.isoformat(), columns={"side": ["bid", "offer"], "price": [99.0, 101.0], "volume": [1.0, 0.5]})
+    assert exporter.observations == 2
+    # the block that reaches the limit triggers the export
+    manager.update_exporter(metric_name="orders", time=(start + timedelta(seconds=1)).isoformat(), columns={"side": ["bid"], "price": [99.5], "volume": [0.25]})
+    manager.close()
+
+    orders = BacktestingFileOrders(str(tmp_path / "orders_1746977339.csv"))
+    orders.load_data()
+    assert orders.prices.tolist() == [99.0, 101.0, 99.5]
+    assert orders.side_names == ["bid", "offer"]
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+import os
+import pickle
+import numpy as np
+import pytest
+
+from autotrade.exporter.file_formats import write_npz
+from autotrade.providers.backtesting_provider import BacktestingProvider, load_columns
+from autotrade.providers.mapped_dataset import MappedDataset
+from test.test_backtesting_provider import write_backtest_files
+
+START_TIME = datetime(2025, 5, 11, 15, 28, 0, tzinfo=timezone.utc)
+
+
+async def replay(folder, dataset=None):
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    provider = BacktestingProvider(START_TIME, None, timedelta(seconds=0.5), None, str(folder), None, dataset=dataset)
+    await provider.replay(on_event)
+    return events
+
+@pytest.mark.asyncio
+async def test_mapped_dataset_replays_like_csv(tmp_path):
+    write_backtest_files(tmp_path)
+    dataset = MappedDataset.build(str(tmp_path), START_TIME, str(tmp_path / "cache"))
+
+    from_csv = await replay(tmp_path)
+    from_mapped = await replay(tmp_path, dataset)
+    # a second replay starts from the beginning of the files again
+    from_mapped_again = await replay(tmp_path, dataset)
+
+    assert len(from_csv) == 2
+    assert from_mapped == from_csv
+    assert from_mapped_again == from_csv
+
+def test_mapped_dataset_columns_are_memory_mapped(tmp_path):
+    write_backtest_files(tmp_path)
+    dataset = MappedDataset.build(str(tmp_path), START_TIME, str(tmp_path / "cache"))
+
+    file = dataset.get_file("orders", datetime.fromtimestamp(1746977300, tz=timezone.utc))
+
+    assert isinstance(file.prices, np.memmap)
+    assert file.side_names == ["bid", "offer"]
+
+def test_mapped_dataset_pickles_by_path(tmp_path):
+    write_backtest_files(tmp_path)
+    dataset = MappedDataset.build(str(tmp_path), START_TIME, str(tmp_path / "cache"))
+    dataset.get_file("orders", datetime.fromtimestamp(1746977300, tz=timezone.utc))
+
+    pickled = pickle.dumps(dataset)
+    # only the paths are sent, not the mapped columns
+    assert len(pickled) < 1000
+
+    opened = pickle.loads(pickled)
+    assert opened.file_paths(START_TIME) == dataset.file_paths(START_TIME)
+
+def test_mapped_dataset_build_reuses_cache(tmp_path):
+    write_backtest_files(tmp_path)
+    cache = tmp_path / "cache"
+    MappedDataset.build(str(tmp_path), START_TIME, str(cache))
+    cached_at = os.path.getmtime(cache / "orders_1746977300.csv" / "times.npy")
+
+    dataset = MappedDataset.build(str(tmp_path), START_TIME, str(cache))
+
+    assert os.path.getmtime(cache / "orders_1746977300.csv" / "times.npy") == cached_at
+    assert set(dataset.file_paths(START_TIME)) == {"orders", "market_price"}
+
+def test_mapped_dataset_fresh_export_replaces_cached_period(tmp_path):
+    write_backtest_files(tmp_path)
+    cache = tmp_path / "cache"
+    MappedDataset.build(str(tmp_path), START_TIME, str(cache))
+
+    # the same period exported again as npz, with different prices
+    columns = load_columns(str(tmp_path / "orders_1746977300.csv"))
+    columns["price"] = columns["price"] + 1
+    with open(tmp_path / "orders_1746977300.npz", "wb") as f:
+        write_npz(f, columns)
+
+    dataset = MappedDataset.build(str(tmp_path), START_TIME, str(cache))
+    file = dataset.get_file("orders", datetime.fromtimestamp(1746977300, tz=timezone.utc))
+
+    assert file.file_path == str(tmp_path / "orders_1746977300.npz")
+    assert file.prices.tolist() == [101.0, 100.0, 102.0, 100.0]
+    # the csv columns were not overwritten by the npz ones
+    assert np.load(cache / "orders_1746977300.csv" / "prices.npy").tolist() == [100.0, 99.0, 101.0, 99.0]
@@ -0,0 +1,184 @@
+from autotrade.types.order_book import OrderBook, OrderBookSide
+
+
+def test_order_book_side_keeps_prices_sorted():
+    side = OrderBookSide()
+    side.update(101, 1)
+    side.update(99, 2)
+    side.update(100, 3)
+
+    assert side.prices == [99, 100, 101]
+    assert side.min_price() == 99
+    assert side.max_price() == 101
+    assert side.get(100) == 3
+
+def test_order_book_side_zero_volume_removes_level():
+    side = OrderBookSide()
+    side.update(100, 1)
+    side.update(101, 1)
+
+    previous = side.update(100, 0)
+
+    assert previous == 1
+    assert side.prices == [101]
+    assert 100 not in side
+
+    # removing a level we dont have is a no-op
+    assert side.update(50, 0) == 0
+    assert side.prices == [101]
+
+def test_order_book_side_update_existing_level():
+    side = OrderBookSide()
+    side.update(100, 1)
+
+    previous = side.update(100, 5)
+
+    assert previous == 1
+    assert side.prices == [100]
+    assert side.get(100) == 5
+
+def test_order_book_side_notional_between():
+    side = OrderBookSide()
+    side.update(98, 1)
+    side.update(99, 2)
+    side.update(100, 10)
+    side.update(101, 1)
+
+    # 100 is excluded by the volume threshold, 98 is outside the range
+    assert side.notional_between(99, 101, 5) == 99 * 2 + 101 * 1
+
+def test_order_book_best_prices():
+    book = OrderBook()
+    book.update("bid", 98, 1)
+    book.update("bid", 99, 1)
+    book.update("offer", 101, 1)
+    book.update("offer", 102, 1)
+
+    assert book.best_bid() == 99
+    assert book.best_ask() == 101
+    assert book.mid_price() == 100
+    assert book.spread() == 2
+
+    book.update("bid", 99, 0)
+    book.update("offer", 101, 0)
+
+    assert book.best_bid() == 98
+    assert book.best_ask() == 102
+
+def test_order_book_empty():
+    book = OrderBook()
+
+    assert book.best_bid() == 0
+    assert book.best_ask() == 0
+    assert book.spread() == 0
+
+def test_order_book_band_notional_level_updates():
+    book = OrderBook()
+    book.update("bid", 99, 1)
+    book.update("offer", 101, 1)
+
+    assert book.band_notional(95, 105, 5) == (99, 101)
+
+    # updates inside the band adjust the totals
+    book.update("bid", 99, 2)
+    book.update("bid", 98, 1)
+    # updates outside the band or over the volume threshold are ignored
+    book.update("bid", 50, 1)
+    book.update("offer", 102, 10)
+
+    assert book.band_notional(95, 105, 5) == (99 * 2 + 98, 101)
+
+    book.update("bid", 99, 0)
+    book.update("offer", 102, 1)
+
+    assert book.band_notional(95, 105, 5) == (98, 101 + 102)
+
+def test_order_book_band_notional_moving_band():
+    book = OrderBook()
+    for price in range(90, 100):
+        book.update("bid", price, 1)
+    for price in range(101, 111):
+        book.update("offer", price, 1)
+
+    for low, high in [(95, 105), (97, 107), (92, 102), (93, 104), (0, 200), (120, 130), (95, 105)]:
+        buys, sells = book.band_notional(low, high, 5)
+        assert buys == book.buys.notional_between(low, high, 5)
+        assert sells == book.sells.notional_between(low, high, 5)
+
+def test_order_book_band_notional_volume_threshold_change():
+    book = OrderBook()
+    book.update("bid", 99, 1)
+    book.update("bid", 98, 3)
+
+    assert book.band_notional(95, 105, 5) == (99 + 98 * 3, 0)
+    assert book.band_notional(95, 105, 2) == (99, 0)
+
+def test_order_book_views():
+    book = OrderBook()
+    book.update("bid", 99, 1)
+    book.update("bid", 98, 2)
+    book.update("offer", 101, 1)
+
+    view = book.view()
+
+    assert view.get("buys") is view.buys
+    assert list(view["buys"].keys()) == [98, 99]
+    assert view["buys"][98] == 2
+    assert dict(view["sells"]) == {101: 1}
+    assert not view.is_stale()
+
+def test_order_book_view_generation():
+    book = OrderBook()
+    book.update("bid", 99, 1)
+
+    view = book.view()
+    frozen = view.copy()
+
+    book.update("bid", 99, 0)
+    book.update("bid", 97, 1)
+
+    # the views read through to the live book
+    assert view.is_stale()
+    assert list(view["buys"].keys()) == [97]
+    assert frozen == {"buys": {99: 1}, "sells": {}}
+    assert book.view().generation == view.generation + 2
+
+def test_order_book_side_watched_levels():
+    side = OrderBookSide()
+    watch = side.subscribe()
+    watch.watch(99)
+    watch.watch(99)
+
+    side.update(99, 1)
+    side.update(98, 1)
+    assert watch.take_changed() == {99}
+    assert watch.take_changed() == set()
+
+    # watches are counted, the level stays watched until the last unwatch
+    watch.unwatch(99)
+    side.update(99, 0)
+    assert watch.take_changed() == {99}
+
+    watch.unwatch(99)
+    side.update(99, 2)
+    assert watch.take_changed() == set()
+
+def test_order_book_side_subscribers_are_independent():
+    book = OrderBook()
+    first = book.buys_view.subscribe()
+    second = book.buys_view.subscribe()
+    first.watch(99)
+    second.watch(99)
+    second.watch(98)
+
+    book.update("bid", 99, 1)
+    assert first.take_changed() == {99}
+    # the first subscriber taking its changes leaves the second's alone
+    book.update("bid", 98, 1)
+    assert second.take_changed() == {98, 99}
+    assert first.take_changed() == set()
+
+    first.close()
+    book.update("bid", 99, 2)
+    assert first.take_changed() == set()
+    assert second.take_changed() == {99}
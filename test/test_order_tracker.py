@@ -1,13 +1,14 @@
+import pytest
+
 from autotrade.trader.order_tracker import OrderTracker
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL
-from autotrade.types.pending_order import PendingOrder
-from autotrade.metrics.exporter.prometheus import PrometheusExporter
+from autotrade.types.pending_order import OrderType, PendingOrder
+from test.mocks.metrics_exporter import pe
 
-pe = PrometheusExporter()
 
 def test_order_tracker_add_order():
     ot = OrderTracker("BTC-USD", pe)
-    order = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order)
     assert ot.get_order("1234") == order
@@ -15,7 +16,7 @@ def test_order_tracker_add_order():
 
 def test_order_tracker_remove_order():
     ot = OrderTracker("BTC-USD", pe)
-    order = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order)
     ot.remove_order("1234")
@@ -25,7 +26,7 @@ def test_order_tracker_remove_order():
 
 def test_order_tracker_fill_order():
     ot = OrderTracker("BTC-USD", pe)
-    order = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order)
     ot.fill_order("1234")
@@ -35,8 +36,8 @@ def test_order_tracker_fill_order():
 
 def test_order_tracker_get_all_orders():
     ot = OrderTracker("BTC-USD", pe)
-    order1 = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
-    order2 = PendingOrder(side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order1 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order2 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order1)
     ot.add_order(order2)
@@ -52,8 +53,8 @@ def test_order_tracker_get_all_orders():
 
 def test_order_tracker_cancel_all_orders():
     ot = OrderTracker("BTC-USD", pe)
-    order1 = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
-    order2 = PendingOrder(side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order1 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order2 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order1)
     ot.add_order(order2)
@@ -65,8 +66,8 @@ def test_order_tracker_cancel_all_orders():
 
 def test_order_tracker_mixed_orders():
     ot = OrderTracker("BTC-USD", pe)
-    order1 = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
-    order2 = PendingOrder(side=ORDER_SELL, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order1 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order2 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_SELL, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order1)
     ot.add_order(order2)
@@ -77,8 +78,8 @@ def test_order_tracker_mixed_orders():
 
 def test_order_tracker_cancel_correct_order():
     ot = OrderTracker("BTC-USD", pe)
-    order1 = PendingOrder(side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
-    order2 = PendingOrder(side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order1 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.01, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+    order2 = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=0.02, price=20000, client_order_id="5678", order_id="5678", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
     
     ot.add_order(order1)
     ot.add_order(order2)
@@ -87,4 +88,30 @@ def test_order_tracker_cancel_correct_order():
     
     assert ot.get_order("1234") is None
     assert len(ot.get_all_orders()) == 1
-    assert ot.get_order("5678") == order2
\ No newline at end of file
+    assert ot.get_order("5678") == order2
+
+def test_order_tracker_partially_fill_order():
+    ot = OrderTracker("BTC-USD", pe)
+    order = PendingOrder(order_type=OrderType.LIMIT, side=ORDER_SELL, volume=0.04, price=10000, client_order_id="1234", order_id="1234", status="OPEN", timeout_at="2023-10-01T00:00:00Z")
+
+    ot.add_order(order)
+    ot.partially_fill_order("1234", 0.01)
+    assert ot.get_pending_position() == pytest.approx((-0.03, -300))
+
+    # filled_size is the total so far, not the size of this fill
+    ot.partially_fill_order("1234", 0.03)
+    assert ot.get_pending_position() == pytest.approx((-0.01, -100))
+
+    ot.fill_order("1234")
+    assert ot.get_pending_position() == (0, 0)
+
+def test_order_tracker_no_pending_position_left_by_float_error():
+    ot = OrderTracker("BTC-USD", pe)
+    volumes = [0.1, 0.2, 0.3, 0.07, 0.011]
+    for i, volume in enumerate(volumes):
+        ot.add_order(PendingOrder(order_type=OrderType.LIMIT, side=ORDER_BUY, volume=volume, price=10000.01, client_order_id=str(i), order_id=str(i), status="OPEN", timeout_at="2023-10-01T00:00:00Z"))
+
+    for i in range(len(volumes)):
+        ot.remove_order(str(i))
+
+    assert ot.get_pending_position() == (0, 0)
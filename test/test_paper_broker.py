@@ -1,11 +1,14 @@
+import asyncio
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from autotrade.broker.paper_broker import PaperBroker
 from autotrade.events.event_types import EventType, Event
-from autotrade.types.broker_error import INSUFFICIENT_FUNDS_ERROR, INSUFFICIENT_PRODUCT_ERROR
-from autotrade.types.pending_order import PendingOrder
+from autotrade.types.broker_error import EXISTING_ORDER_ERROR, INSUFFICIENT_FUNDS_ERROR, INSUFFICIENT_PRODUCT_ERROR
+from autotrade.types.pending_order import OrderType, PendingOrder
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL
+from autotrade.types.order_book import BID_SIDE, OrderBook
+from autotrade.utils.clock import SimulatedClock
 from test.mocks.events import MockEvents
 
 @pytest.mark.asyncio
@@ -107,6 +110,7 @@ async def test_paper_broker_limit_buy_filled():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         price=10000,
         volume=0.01,
@@ -120,7 +124,7 @@ async def test_paper_broker_limit_buy_filled():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.01
     assert pb.cash_balance == 9900.0
@@ -129,7 +133,8 @@ async def test_paper_broker_limit_buy_filled():
 @pytest.mark.asyncio
 async def test_paper_broker_limit_buy_partial_filled():
     e = MockEvents()
-    pb = PaperBroker("BTC-USD", 10000, e)
+    clock = SimulatedClock(datetime.now(tz=timezone.utc))
+    pb = PaperBroker("BTC-USD", 10000, e, clock)
 
     order, err = await pb.create_limit_order("0.05","10000", 0.75, 5)
     assert err is None
@@ -150,11 +155,12 @@ async def test_paper_broker_limit_buy_partial_filled():
     assert pb.active_order.filled_size == 0.01
     assert pb.active_order.avg_filled_price == 10000
 
-    pb.active_order.timeout_at = datetime.now() - timedelta(seconds=5)
+    clock.advance_to(order.timeout_at + timedelta(seconds=5))
 
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         price=10000,
         volume=0.05,
@@ -168,9 +174,10 @@ async def test_paper_broker_limit_buy_partial_filled():
     )
 
     assert pb.active_order is None
-    assert len(e.queued_events) == 1
+    assert len(e.queued_events) == 2
     print(e.queued_events)
-    assert e.queued_events[EventType.ORDER_CANCELLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_PARTIALLY_FILLED][0].value.filled_size == 0.01
+    assert e.queued_events[EventType.ORDER_CANCELLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.01
     assert pb.cash_balance == 9900.0
@@ -204,6 +211,7 @@ async def test_paper_broker_limit_buy_filled_lower():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         price=10000,
         volume=0.01,
@@ -217,7 +225,7 @@ async def test_paper_broker_limit_buy_filled_lower():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.01
     assert pb.cash_balance == 9910.0
@@ -250,6 +258,7 @@ async def test_paper_broker_limit_buy_filled_lower():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         price=10000,
         volume=0.01,
@@ -263,7 +272,7 @@ async def test_paper_broker_limit_buy_filled_lower():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.01
     assert pb.cash_balance == 9910.0
@@ -296,6 +305,7 @@ async def test_paper_broker_limit_sell_filled():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_SELL,
         price=10000,
         volume=0.01,
@@ -309,7 +319,7 @@ async def test_paper_broker_limit_sell_filled():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0
     assert pb.cash_balance == 10100.0
@@ -318,7 +328,8 @@ async def test_paper_broker_limit_sell_filled():
 @pytest.mark.asyncio
 async def test_paper_broker_limit_sell_partial_filled():
     e = MockEvents()
-    pb = PaperBroker("BTC-USD", 10000, e)
+    clock = SimulatedClock(datetime.now(tz=timezone.utc))
+    pb = PaperBroker("BTC-USD", 10000, e, clock)
     pb.balance = 0.05
 
     order, err = await pb.create_limit_order("-0.05","10000", 0.75, 5)
@@ -340,11 +351,12 @@ async def test_paper_broker_limit_sell_partial_filled():
     assert pb.active_order.filled_size == 0.01
     assert pb.active_order.avg_filled_price == 10000
 
-    pb.active_order.timeout_at = datetime.now() - timedelta(seconds=5)
+    clock.advance_to(order.timeout_at + timedelta(seconds=5))
 
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_SELL,
         price=10000,
         volume=0.05,
@@ -357,8 +369,9 @@ async def test_paper_broker_limit_sell_partial_filled():
         confidence=0.75
     )
     assert pb.active_order is None
-    assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_CANCELLED][0].value == expected_order.model_dump()
+    assert len(e.queued_events) == 2
+    assert e.queued_events[EventType.ORDER_PARTIALLY_FILLED][0].value.filled_size == 0.01
+    assert e.queued_events[EventType.ORDER_CANCELLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.04
     assert pb.cash_balance == 10100.0
@@ -392,6 +405,7 @@ async def test_paper_broker_limit_sell_filled_higher():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_SELL,
         price=10000,
         volume=0.01,
@@ -405,7 +419,7 @@ async def test_paper_broker_limit_sell_filled_higher():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0
     assert pb.cash_balance == 10110.0
@@ -438,6 +452,7 @@ async def test_paper_broker_limit_buy_order_exists():
     await pb.check_current_order()
 
     expected_order = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         price=10000,
         volume=0.01,
@@ -451,7 +466,267 @@ async def test_paper_broker_limit_buy_order_exists():
     )
     assert pb.active_order is None
     assert len(e.queued_events) == 1
-    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.model_dump()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value == expected_order.snapshot()
 
     assert pb.balance == 0.01
-    assert pb.cash_balance == 9910.0
\ No newline at end of file
+    assert pb.cash_balance == 9910.0
+
+@pytest.mark.asyncio
+async def test_paper_broker_multiple_resting_orders():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 10000, e, max_open_orders=4)
+    pb.balance = 0.02
+
+    low_buy, err = await pb.create_limit_order("0.01", "9000", 0.5, 60)
+    assert err is None
+    high_buy, err = await pb.create_limit_order("0.01", "9500", 0.5, 60)
+    assert err is None
+    sell, err = await pb.create_limit_order("-0.01", "11000", 0.5, 60)
+    assert err is None
+    assert pb.active_order is low_buy
+
+    # only the orders the book makes marketable are matched
+    await pb.update_order_book({"buys": {8000: 1}, "sells": {9400: 1}})
+    assert high_buy.status == "FILLED"
+    assert low_buy.status == "OPEN"
+    assert sell.status == "OPEN"
+
+    await pb.update_order_book({"buys": {11500: 1}, "sells": {12000: 1}})
+    assert sell.status == "FILLED"
+    assert sell.avg_filled_price == 11500
+
+    await pb.check_current_order()
+
+    filled = [event.value.order_id for event in e.queued_events[EventType.ORDER_FILLED]]
+    assert filled == [high_buy.order_id, sell.order_id]
+    assert pb.active_order is low_buy
+    assert pb.balance == pytest.approx(0.02)
+    assert pb.cash_balance == pytest.approx(10000 - 94 + 115)
+
+@pytest.mark.asyncio
+async def test_paper_broker_resting_orders_do_not_overfill():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 10000, e, max_open_orders=2)
+
+    low_buy, err = await pb.create_limit_order("0.01", "9500", 0.5, 60)
+    assert err is None
+    high_buy, err = await pb.create_limit_order("0.01", "9600", 0.5, 60)
+    assert err is None
+
+    # 0.015 on offer across two levels is all the two orders can get between them
+    await pb.update_order_book({"buys": {}, "sells": {9400: 0.005, 9450: 0.01}})
+    await pb.check_current_order()
+
+    assert high_buy.status == "FILLED"
+    assert high_buy.avg_filled_price == pytest.approx(9425)
+    assert low_buy.status == "OPEN"
+    assert low_buy.filled_size == pytest.approx(0.005)
+    assert low_buy.avg_filled_price == 9450
+    assert pb.balance == pytest.approx(0.01)
+
+@pytest.mark.asyncio
+async def test_paper_broker_open_order_limits():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 1000, e, max_open_orders=2)
+
+    _, err = await pb.create_limit_order("0.06", "10000", 0.5, 60)
+    assert err is None
+
+    # cash already set aside for the first order can't be spent again
+    _, err = await pb.create_limit_order("0.05", "10000", 0.5, 60)
+    assert err.type == INSUFFICIENT_FUNDS_ERROR
+
+    second, err = await pb.create_limit_order("0.04", "10000", 0.5, 60)
+    assert err is None
+
+    _, err = await pb.create_limit_order("0.01", "100", 0.5, 60)
+    assert err.type == EXISTING_ORDER_ERROR
+
+    pb.cancel_order(second.order_id)
+    assert len(pb.orders) == 1
+    assert pb.resting_buys[0][0] == 10000
+
+    await pb.cancel_current_order()
+    assert pb.active_order is None
+    assert pb.resting_buys == []
+    assert pb.reserved_cash == 0
+
+@pytest.mark.asyncio
+async def test_paper_broker_queue_position_fills():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 100000, e)
+    book = OrderBook()
+    book.update(BID_SIDE, 9990, 2)
+    book.update("offer", 10000, 1)
+    await pb.update_order_book(book.view())
+
+    # joins the back of the queue at 9990, behind 2 already resting
+    order, err = await pb.create_limit_order("1", "9990", 0.5, 60)
+    assert err is None
+    assert pb.fill_states[order.order_id].queue_ahead == 2
+
+    # volume leaving the level first clears the queue ahead of us
+    book.update(BID_SIDE, 9990, 0.5)
+    await pb.update_order_book(book.view())
+    assert order.filled_size == 0
+    assert pb.fill_states[order.order_id].queue_ahead == 0.5
+
+    # volume joining the level queues behind us
+    book.update(BID_SIDE, 9990, 3)
+    await pb.update_order_book(book.view())
+    assert pb.fill_states[order.order_id].queue_ahead == 0.5
+
+    # what traded past the queue ahead filled us
+    book.update(BID_SIDE, 9990, 2)
+    await pb.update_order_book(book.view())
+    assert order.status == "OPEN"
+    assert order.filled_size == 0.5
+    assert order.avg_filled_price == 9990
+
+    # updates to other levels don't touch the order
+    book.update(BID_SIDE, 9980, 5)
+    await pb.update_order_book(book.view())
+    assert order.filled_size == 0.5
+
+    book.update(BID_SIDE, 9990, 0)
+    await pb.update_order_book(book.view())
+    assert order.status == "FILLED"
+    assert order.filled_size == 1
+
+    await pb.check_current_order()
+    assert e.queued_events[EventType.ORDER_FILLED][0].value.filled_size == 1
+    assert pb.queue_levels == {}
+
+@pytest.mark.asyncio
+async def test_paper_broker_skips_stale_book_views():
+    pb = PaperBroker("BTC-USD", 100000, MockEvents())
+    book = OrderBook()
+    matched = []
+    match_orders = pb.match_orders
+    pb.match_orders = lambda: matched.append(book.generation) or match_orders()
+
+    book.update("offer", 100, 1)
+    first = book.view()
+    book.update("offer", 101, 1)
+    second = book.view()
+
+    # both views read the same live book, only the first to arrive is matched
+    await pb.update_order_book(first)
+    await pb.update_order_book(second)
+    assert matched == [2]
+
+    book.update("offer", 100, 0)
+    await pb.update_order_book(book.view())
+    assert matched == [2, 3]
+
+@pytest.mark.asyncio
+async def test_paper_broker_partial_fill_progresses():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 10000, e)
+
+    order, err = await pb.create_limit_order("0.05", "10000", 0.75, 5)
+    assert err is None
+
+    await pb.update_order_book({"buys": {}, "sells": {10000: 0.01}})
+    assert order.filled_size == 0.01
+
+    # the volume already taken is not taken again
+    await pb.update_order_book({"buys": {}, "sells": {10000: 0.01}})
+    assert order.filled_size == 0.01
+
+    # an update to the level replaces what we had taken from it
+    await pb.update_order_book({"buys": {}, "sells": {10000: 0.03}})
+    assert order.filled_size == pytest.approx(0.04)
+
+    # every fill that leaves the order open is reported with the total filled so far
+    partial_fills = [event.value.filled_size for event in e.queued_events[EventType.ORDER_PARTIALLY_FILLED]]
+    assert partial_fills == [0.01, pytest.approx(0.04)]
+
+    await pb.update_order_book({"buys": {}, "sells": {9900: 0.05, 10000: 0.03}})
+    assert order.status == "FILLED"
+    assert order.filled_size == pytest.approx(0.05)
+    assert order.avg_filled_price == pytest.approx((0.04 * 10000 + 0.01 * 9900) / 0.05)
+
+@pytest.mark.asyncio
+async def test_paper_broker_queue_fills_in_level_order():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 100000, e, max_open_orders=4)
+    await pb.update_order_book({"buys": {97: 1, 98: 1, 99: 1}, "sells": {101: 1, 102: 1}})
+
+    orders = []
+    for volume, price in [("1", "99"), ("1", "97"), ("-1", "102"), ("1", "98")]:
+        if volume.startswith("-"):
+            pb.balance += 1
+        order, err = await pb.create_limit_order(volume, price, 0.5, 60)
+        assert err is None
+        orders.append(order)
+
+    await pb.update_order_book({"buys": {97: 2, 98: 2, 99: 2}, "sells": {101: 1, 102: 2}})
+    # every level we queue at trades out in the same update
+    await pb.update_order_book({"buys": {96: 1}, "sells": {103: 1}})
+    await pb.check_current_order()
+
+    filled = [event.value.price for event in e.queued_events[EventType.ORDER_FILLED]]
+    assert filled == [97, 98, 99, 102]
+
+@pytest.mark.asyncio
+async def test_paper_broker_orders_share_level_liquidity():
+    e = MockEvents()
+    pb = PaperBroker("BTC-USD", 100000, e, max_open_orders=3)
+    book = OrderBook()
+    await pb.update_order_book(book.view())
+
+    first, err = await pb.create_limit_order("1", "101", 0.5, 60)
+    assert err is None
+    second, err = await pb.create_limit_order("1", "101", 0.5, 60)
+    assert err is None
+    third, err = await pb.create_limit_order("0.5", "102", 0.5, 60)
+    assert err is None
+
+    # one unit offered is taken once, by the orders in price then time priority
+    book.update("offer", 100, 1)
+    await pb.update_order_book(book.view())
+    assert third.status == "FILLED"
+    assert first.status == "OPEN"
+    assert first.filled_size == 0.5
+    assert second.filled_size == 0
+
+    await pb.check_current_order()
+    assert pb.balance == 0.5
+    assert pb.cash_balance == 100000 - 50
+    assert pb.taken == {(ORDER_SELL, 100): 1}
+
+    # the feed updating the level makes its volume available again
+    book.update("offer", 100, 2)
+    await pb.update_order_book(book.view())
+    assert first.status == "FILLED"
+    assert second.status == "FILLED"
+    assert pb.taken == {(ORDER_SELL, 100): 1.5}
+
+    await pb.check_current_order()
+    assert pb.balance == 2.5
+    assert pb.cash_balance == 100000 - 250
+
+@pytest.mark.asyncio
+async def test_paper_broker_order_cancelled_at_timeout():
+    e = MockEvents()
+    clock = SimulatedClock(datetime.now(tz=timezone.utc))
+    pb = PaperBroker("BTC-USD", 10000, e, clock)
+    settler = asyncio.create_task(pb.start())
+    await asyncio.sleep(0)
+
+    order, err = await pb.create_limit_order("0.05","10000", 0.75, 5)
+    assert err is None
+
+    clock.advance_to(order.timeout_at - timedelta(microseconds=1))
+    await asyncio.sleep(0)
+    assert pb.active_order.status == "OPEN"
+
+    # cancelled and settled exactly at the deadline, nobody calls check_current_order
+    clock.advance_to(order.timeout_at)
+    await asyncio.sleep(0)
+    assert pb.active_order is None
+    assert e.queued_events[EventType.ORDER_CANCELLED][0].value.order_id == order.order_id
+    assert pb.timers == {}
+
+    settler.cancel()
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+import pytest
+
+from autotrade.engine.sweep import expand_grid, format_runs, run_sweep
+from autotrade.metrics.metrics import Metrics
+from autotrade.settings.config import Config, StaticConfig
+from test.mocks.events import MockEvents
+from test.test_backtesting_provider import write_backtest_files
+
+
+def test_expand_grid():
+    configs = expand_grid({"imbalance_threshold": [0.2, 0.3], "min_signals_for_buy_action": [1]})
+
+    assert configs == [
+        {"imbalance_threshold": 0.2, "min_signals_for_buy_action": 1},
+        {"imbalance_threshold": 0.3, "min_signals_for_buy_action": 1},
+    ]
+
+def test_expand_grid_unknown_field():
+    with pytest.raises(ValueError):
+        expand_grid({"not_a_field": [1]})
+
+def test_static_config_rejects_unknown_imbalance_mode():
+    with pytest.raises(ValueError):
+        StaticConfig.with_overrides(Config(), imbalance_mode="incremntal")
+
+@pytest.mark.asyncio
+async def test_static_config_overrides():
+    config = StaticConfig.with_overrides(Config(), imbalance_threshold=0.1)
+
+    assert (await config.get_config()).imbalance_threshold == 0.1
+    assert (await config.get_config()).strategy == Config().strategy
+
+    with pytest.raises(ValueError):
+        StaticConfig.with_overrides(Config(), not_a_field=1)
+
+@pytest.mark.asyncio
+async def test_order_metrics_use_run_config():
+    updates = [
+        {"side": "bid", "price_level": "99", "new_quantity": "1"},
+        {"side": "bid", "price_level": "98", "new_quantity": "0.2"},
+        {"side": "offer", "price_level": "101", "new_quantity": "0.3"},
+    ]
+    time = datetime(2025, 5, 11, 15, 28, 0, tzinfo=timezone.utc)
+    volumes = []
+
+    # a swept order_size_threshold has to reach the order book metrics, not just the trader
+    for threshold in [0.5, 5]:
+        config = StaticConfig.with_overrides(Config(), order_size_threshold=threshold)
+        metrics = Metrics("BTC-GBP", MagicMock(), MockEvents(), synchronous=True, config_getter=config)
+        metrics.update_order(updates, time, 0)
+        await metrics.drain()
+        volumes.append((await metrics.get_order_metrics()).buy_volume)
+
+    assert volumes == [pytest.approx(98 * 0.2), pytest.approx(99 + 98 * 0.2)]
+
+def test_run_sweep(tmp_path):
+    write_backtest_files(tmp_path)
+    start_time = datetime(2025, 5, 11, 15, 28, 0, tzinfo=timezone.utc)
+
+    runs = run_sweep({"min_signals_for_buy_action": [1, 5]}, str(tmp_path), start_time, product="BTC-GBP", workers=2)
+
+    # runs come back in grid order, each replaying the same data
+    assert [run.params for run in runs] == [{"min_signals_for_buy_action": 1}, {"min_signals_for_buy_action": 5}]
+    assert [run.result.updates for run in runs] == [2, 2]
+    assert "min_signals_for_buy_action" in format_runs(runs).splitlines()[0]
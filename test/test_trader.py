@@ -5,13 +5,12 @@ from datetime import datetime
 from autotrade.broker.paper_broker import PaperBroker
 from autotrade.settings.contants import ORDER_BUY, ORDER_SELL
 from autotrade.metrics.metrics import Metrics
-from autotrade.metrics.exporter.prometheus import PrometheusExporter
 from autotrade.trader.trader import Trader
 from autotrade.types.order_metrics import OrderMetrics
-from autotrade.types.pending_order import PendingOrder
+from autotrade.types.pending_order import OrderType, PendingOrder
 from test.mocks.events import MockEvents
+from test.mocks.metrics_exporter import pe
 
-pe = PrometheusExporter()
 
 @pytest.mark.asyncio
 async def test_trader_calculate_signals_buy(with_config):
@@ -174,6 +173,7 @@ async def test_trader_handle_order_filled(with_config):
     t = Trader("BTC-USD", pb, m, with_config)
 
     pendingOrder = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         order_id="123",
         client_order_id="123",
@@ -188,7 +188,7 @@ async def test_trader_handle_order_filled(with_config):
 
     t.order_tracker.add_order(pendingOrder)
 
-    await t.handle_order_filled(pendingOrder.model_dump())
+    await t.handle_order_filled(pendingOrder.snapshot())
 
     assert t.PositionTracker.position == 1
     assert t.PositionTracker.position_cost == 100
@@ -205,6 +205,7 @@ async def test_trader_handle_order_cancelled(with_config):
     t = Trader("BTC-USD", pb, m, with_config)
 
     pendingOrder = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         order_id="123",
         client_order_id="123",
@@ -219,7 +220,7 @@ async def test_trader_handle_order_cancelled(with_config):
 
     t.order_tracker.add_order(pendingOrder)
 
-    await t.handle_order_cancelled(pendingOrder.model_dump())
+    await t.handle_order_cancelled(pendingOrder.snapshot())
 
     assert t.PositionTracker.position == 0
     assert t.PositionTracker.position_cost == 0
@@ -236,6 +237,7 @@ async def test_trader_handle_order_cancelled_partially_filled(with_config):
     t = Trader("BTC-USD", pb, m, with_config)
 
     pendingOrder = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         order_id="123",
         client_order_id="123",
@@ -250,7 +252,7 @@ async def test_trader_handle_order_cancelled_partially_filled(with_config):
 
     t.order_tracker.add_order(pendingOrder)
 
-    await t.handle_order_cancelled(pendingOrder.model_dump())
+    await t.handle_order_cancelled(pendingOrder.snapshot())
 
     assert t.PositionTracker.position == 0.5
     assert t.PositionTracker.position_cost == 50
@@ -258,7 +260,7 @@ async def test_trader_handle_order_cancelled_partially_filled(with_config):
     assert t.order_tracker.get_pending_position() == (0, 0)
 
 @pytest.mark.asyncio
-async def test_trader_buy_order_into_sell_order(with_config):
+async def test_trader_handle_order_partially_filled(with_config):
     product = "BTC-USD"
     balance = 1000
     e = MockEvents()
@@ -267,10 +269,11 @@ async def test_trader_buy_order_into_sell_order(with_config):
     t = Trader("BTC-USD", pb, m, with_config)
 
     pendingOrder = PendingOrder(
+        order_type=OrderType.LIMIT,
         side=ORDER_BUY,
         order_id="123",
         client_order_id="123",
-        filled_size=1,
+        filled_size=0.25,
         avg_filled_price=100,
         status="OPEN",
         product=product,
@@ -280,13 +283,33 @@ async def test_trader_buy_order_into_sell_order(with_config):
     )
 
     t.order_tracker.add_order(pendingOrder)
-    pb.active_order = pendingOrder
-    pb.active_order.status = "FILLED"
+
+    await t.handle_order_partially_filled(pendingOrder.snapshot())
+
+    # nothing is booked until the order finishes, only the unfilled volume stays pending
+    assert t.PositionTracker.position == 0
+    assert t.PositionTracker.cash == 1000
+    assert t.order_tracker.get_pending_position() == (0.75, 75)
+
+@pytest.mark.asyncio
+async def test_trader_buy_order_into_sell_order(with_config):
+    product = "BTC-USD"
+    balance = 1000
+    e = MockEvents()
+    m = Metrics(product, pe, e) 
+    pb = PaperBroker(product, balance, e)
+    t = Trader("BTC-USD", pb, m, with_config)
+
+    pendingOrder, err = await pb.create_limit_order("1", "100", 0.5, 60)
+    assert err is None
+
+    t.order_tracker.add_order(pendingOrder)
+    await pb.update_order_book({"buys": {}, "sells": {100: 1}})
 
     await pb.check_current_order()
 
     assert pb.active_order == None
-    await t.handle_order_filled(pendingOrder.model_dump())
+    await t.handle_order_filled(pendingOrder.snapshot())
 
     assert t.PositionTracker.position == 1
     assert t.PositionTracker.position_cost == 100
@@ -1,6 +1,9 @@
 from datetime import datetime
 
-from autotrade.types.pending_order import PendingOrder
+import pytest
+
+from autotrade.types.order_metrics import PriceMetrics
+from autotrade.types.pending_order import OrderType, PendingOrder
 
 
 def test_pending_order_marshal_unmarshal():
@@ -20,4 +23,32 @@ def test_pending_order_marshal_unmarshal():
 
     assert p == p2
 
-    
\ No newline at end of file
+
+def test_metrics_snapshots_are_immutable():
+    p = PriceMetrics(price=100, long_moving_average=90)
+
+    with pytest.raises(AttributeError):
+        p.price = 101
+
+    p2 = p._replace(price=101)
+
+    assert p.price == 100
+    assert p2 == PriceMetrics(price=101, long_moving_average=90, short_moving_average=0, average_true_range=0)
+
+def test_pending_order_snapshot():
+    p = PendingOrder(
+        order_type=OrderType.LIMIT,
+        side="buy",
+        volume=0.01,
+        price=10000,
+        client_order_id="1234",
+        order_id="1234",
+        status="OPEN",
+        timeout_at=datetime.now(),
+    )
+
+    snapshot = p.snapshot()
+    p.status = "FILLED"
+
+    assert snapshot.status == "OPEN"
+    assert snapshot._asdict() == {**p.model_dump(), "status": "OPEN"}